@@ -12,23 +12,32 @@ from flask_cors import CORS
     - Flask app creation and configuration
     - Extension initialization (SQLAlchemy database and Socket.IO)
     - Blueprint registration for session and movie routes
+    - In-place database schema upgrades (migrations.py), unless MIGRATE_ON_START=no
+    - Starting background work: the typeahead index and columnar catalog builds,
+      the sort-rank rebuilds, the now-playing refresh and the catalog sync
     - Running the app with Socket.IO support
 '''
 
 
-# Factory function to create and configure the Flask app instance
-def create_app():
+# A bare app bound to the APP_SQL database (used by create_app, and by migrations.py as a deploy step)
+def create_database_app():
     app = Flask(__name__)
-    CORS(app)
-
-    # Configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('APP_SQL','sqlite:////Users/rsamb/Downloads/backend/movies_v2.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+# Factory function to create and configure the Flask app instance
+def create_app():
+    app = create_database_app()
+    # Let browser clients read the pagination cursor and the stale-data flag
+    CORS(app, expose_headers=['X-Next-Cursor', 'X-TMDb-Stale'])
 
+    # Configuration
     app.config['SECRET_KEY'] = 'your_secret_key'
 
     # Initialize extensions with the app instance
-    db.init_app(app)
     socketio.init_app(app, cors_allowed_origins="*")
 
     # Import and register blueprints here (import after app and extensions are set up)
@@ -39,6 +48,46 @@ def create_app():
     app.register_blueprint(session_bp, url_prefix='/session')
     app.register_blueprint(movie_bp, url_prefix='/movies')
 
+    # Bring an existing database up to date with model.py (new tables, columns and indexes),
+    # unless deploys run `python migrations.py` once instead
+    from routes.Config import MIGRATE_ON_START
+    from migrations import upgrade
+    if MIGRATE_ON_START:
+        with app.app_context():
+            added = upgrade()
+            if added:
+                print(f"Database upgraded, added: {', '.join(added)}")
+
+    # Load movie titles into the in-memory autocomplete index without delaying startup
+    from routes.Config import TYPEAHEAD_INDEX
+    from routes.Typeahead import typeahead_index
+    if TYPEAHEAD_INDEX:
+        typeahead_index.start(app)
+
+    # Load the in-memory columnar catalog for paged filter and sort queries (needs numpy)
+    from routes.Config import COLUMNAR_CATALOG
+    from routes.Columnar import columnar_catalog
+    if COLUMNAR_CATALOG:
+        columnar_catalog.start(app)
+
+    # Renumber the sort-rank tables behind /sort_movies_V2 pages whenever the catalog changes
+    from routes.Config import SORT_RANKS_INTERVAL
+    from routes.SortRanks import sort_ranks
+    if SORT_RANKS_INTERVAL > 0:
+        sort_ranks.start(app, SORT_RANKS_INTERVAL)
+
+    # Keep the now-playing snapshot warm in the background for only_in_theater queries
+    from routes.Config import NOW_PLAYING_REFRESH
+    from routes.NowPlaying import now_playing_catalog
+    if NOW_PLAYING_REFRESH > 0:
+        now_playing_catalog.start(NOW_PLAYING_REFRESH)
+
+    # Follow TMDb's change feed so popularity and posters in the movies table stay current
+    from routes.Config import CATALOG_SYNC_INTERVAL
+    from routes.CatalogSync import catalog_sync
+    if CATALOG_SYNC_INTERVAL > 0:
+        catalog_sync.start(app, CATALOG_SYNC_INTERVAL)
+
     return app
 
 # Import Socket.IO event handlers (must be after app creation)
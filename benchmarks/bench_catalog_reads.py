@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+'''
+    bench_catalog_reads.py
+
+    This file compares the two ways of reading catalog lists from the movies table:
+    - ORM: Movie.query ... .all() and one card per Movie instance
+    - Projected: card_select()/fetch_cards() plain rows with only the card columns
+    Both paths are timed end to end, including JSON encoding, on a synthetic table.
+
+    Run it with `python benchmarks/bench_catalog_reads.py --rows 50000`.
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.Serializers import CARD_FIELDS  # noqa: E402
+
+
+def _seed(db, Movie, rows):
+    rng = random.Random(506)
+    genres = ['Action', 'Drama', 'Comedy', 'Horror', 'Romance', 'Science Fiction']
+    batch = []
+    for movie_id in range(1, rows + 1):
+        batch.append({
+            'id': movie_id,
+            'title': f'Movie {rng.randint(0, 10 ** 9)}',
+            'genres': '-'.join(rng.sample(genres, 2)),
+            'original_language': rng.choice(['en', 'fr', 'ja']),
+            'overview': 'Lorem ipsum dolor sit amet. ' * 12,
+            'popularity': rng.uniform(0, 500),
+            'release_date': date(1970, 1, 1) + timedelta(days=rng.randint(0, 20000)),
+            'poster_path': f'/poster{movie_id}.jpg',
+        })
+        if len(batch) == 5000:
+            db.session.execute(Movie.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Movie.__table__.insert(), batch)
+    db.session.commit()
+
+
+#
+# The card the ORM path builds from each Movie instance, as the endpoints did before card_select()
+#
+def _row_to_card(movie):
+    return {name: getattr(movie, name) for name in CARD_FIELDS}
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ORM vs column-projected catalog reads.')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['APP_SQL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+    os.environ.setdefault('SORT_RANKS_INTERVAL', '0')
+    os.environ.setdefault('TMDB_DISK_CACHE', '')
+
+    from app import create_app
+    from extentions import db
+    from model import Movie
+    from routes.Catalog import card_select, fetch_cards
+    from routes.Serializers import json_response
+
+    app = create_app()
+    with app.app_context():
+        _seed(db, Movie, args.rows)
+
+        def orm_path():
+            movies = Movie.query.order_by(Movie.title.asc()).all()
+            json_response([_row_to_card(movie) for movie in movies])
+            db.session.expunge_all()  # a request would start with an empty identity map
+
+        def projected_path():
+            json_response(fetch_cards(card_select().order_by(Movie.title.asc())))
+
+        orm_ms = _timed(orm_path, args.repeat)
+        projected_ms = _timed(projected_path, args.repeat)
+
+    print(f'rows:      {args.rows}')
+    print(f'ORM:       {orm_ms:8.1f} ms')
+    print(f'projected: {projected_ms:8.1f} ms  ({orm_ms / projected_ms:.2f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+'''
+    bench_columnar.py
+
+    This file compares the two ways the paged filter and sort endpoints can answer:
+    - SQL: page_cards() with genre_filter / language / release_year_filter filters
+    - Columnar: the numpy snapshot in routes/Columnar.py, hydrating only the returned page
+    Each query is timed on both paths for a first and a deep page, after checking they return the same cards.
+
+    Run it with `python benchmarks/bench_columnar.py --rows 1000000` (needs numpy).
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = [
+    ('popularity desc', {'sort_by': 'popularity', 'order': 'desc'}),
+    ('title asc', {'sort_by': 'title'}),
+    ('genre', {'genres': ['Horror']}),
+    ('genre, popularity desc', {'genres': ['Horror'], 'sort_by': 'popularity', 'order': 'desc'}),
+    ('language, years, date desc', {'language': 'fr', 'year_range': (1990, 1999),
+                                    'sort_by': 'release_date', 'order': 'desc'}),
+    ('genres, language, years', {'genres': ['Drama', 'Comedy'], 'language': 'ja', 'year_range': (2000, 2010),
+                                 'sort_by': 'popularity', 'order': 'desc'}),
+]
+
+
+def _seed(db, Movie, genre_mask, rows):
+    rng = random.Random(506)
+    genres = ['Action', 'Drama', 'Comedy', 'Horror', 'Romance', 'Science Fiction', 'Western', 'Music']
+    batch = []
+    for movie_id in range(1, rows + 1):
+        movie_genres = '-'.join(rng.sample(genres, 2))
+        batch.append({
+            'id': movie_id,
+            'title': f'Movie {rng.randint(0, 10 ** 9)}',
+            'genres': movie_genres,
+            'genre_mask': genre_mask(movie_genres),
+            'original_language': rng.choice(['en', 'en', 'en', 'fr', 'ja', 'es', 'de', 'ko']),
+            'overview': 'Lorem ipsum dolor sit amet. ' * 4,
+            'popularity': rng.uniform(0, 500),
+            'release_date': date(1970, 1, 1) + timedelta(days=rng.randint(0, 20000)),
+            'poster_path': f'/poster{movie_id}.jpg',
+        })
+        if len(batch) == 10000:
+            db.session.execute(Movie.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Movie.__table__.insert(), batch)
+    db.session.commit()
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the columnar catalog against the SQL paged queries.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--deep-page', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['APP_SQL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+    os.environ.setdefault('SORT_RANKS_INTERVAL', '0')
+    os.environ.setdefault('TMDB_DISK_CACHE', '')
+    os.environ['TYPEAHEAD_INDEX'] = 'no'
+    os.environ['COLUMNAR_CATALOG'] = 'no'  # built below, in the foreground
+
+    from app import create_app
+    from extentions import db
+    from model import Movie
+    from routes.Catalog import genre_filter, genre_mask, page_cards, release_year_filter
+    from routes.Columnar import columnar_catalog
+    from routes.Serializers import CARD_FIELDS
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        _seed(db, Movie, genre_mask, args.rows)
+        print(f'seeded {args.rows} rows in {time.perf_counter() - started:.1f} s')
+
+        columnar_catalog.build()
+        print(f'built columnar catalog in {columnar_catalog.build_seconds:.1f} s')
+
+        for label, query in QUERIES:
+            filters = []
+            if query.get('genres'):
+                filters.append(genre_filter(query['genres']))
+            if query.get('language'):
+                filters.append(Movie.original_language == query['language'])
+            if query.get('year_range'):
+                filters.append(release_year_filter(*query['year_range']))
+            sort = {'sort_by': query.get('sort_by', 'id'), 'order': query.get('order', 'asc')}
+            criteria = {key: query[key] for key in ('genres', 'language', 'year_range') if key in query}
+
+            for page in (1, args.deep_page):
+                def sql():
+                    return page_cards(CARD_FIELDS, filters=filters, page=page, **sort)
+
+                def columnar():
+                    return columnar_catalog.page(CARD_FIELDS, page=page, **criteria, **sort)
+
+                assert columnar() == sql(), label
+                sql_ms = _timed(sql, args.repeat)
+                columnar_ms = _timed(columnar, args.repeat)
+                print(f'{label:28} page {page:<4} sql {sql_ms:8.2f} ms   columnar {columnar_ms:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
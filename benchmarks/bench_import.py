@@ -0,0 +1,80 @@
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+'''
+    bench_import.py
+
+    This file times import_catalog.py on a generated CSV dump.
+    It handles:
+    - Writing a synthetic movies CSV (quoted overviews, dash-joined genres)
+    - Importing it with indexes dropped and rebuilt, and with indexes kept, into fresh databases
+    - Reporting rows per second and the index rebuild time
+
+    Run it with `python benchmarks/bench_import.py --rows 1000000`.
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _write_dump(path, rows):
+    rng = random.Random(506)
+    genres = ['Action', 'Drama', 'Comedy', 'Horror', 'Romance', 'Science Fiction']
+    words = ['night', 'storm', 'river', 'ghost', 'summer', 'city', 'love', 'war', 'secret', 'island']
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['id', 'title', 'genres', 'original_language', 'overview', 'popularity',
+                         'release_date', 'poster_path'])
+        for movie_id in range(1, rows + 1):
+            writer.writerow([
+                movie_id,
+                ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3))).title(),
+                '-'.join(rng.sample(genres, 2)),
+                rng.choice(['en', 'fr', 'ja']),
+                ', '.join(rng.choice(words) for _ in range(20)),
+                round(rng.uniform(0, 500), 3),
+                (date(1970, 1, 1) + timedelta(days=rng.randint(0, 20000))).isoformat(),
+                f'/poster{movie_id}.jpg',
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bulk catalog importer.')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    dump = os.path.join(workdir, 'movies.csv')
+    _write_dump(dump, args.rows)
+    print(f'dump: {args.rows} rows, {os.path.getsize(dump) / 1e6:.0f} MB')
+
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+    os.environ.setdefault('SORT_RANKS_INTERVAL', '0')
+    os.environ.setdefault('TMDB_DISK_CACHE', '')
+    os.environ.setdefault('TYPEAHEAD_INDEX', 'no')
+
+    from flask import Flask
+    from extentions import db
+    from import_catalog import import_catalog
+
+    for drop_indexes in (True, False):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, f'bench_{drop_indexes}.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            import_catalog(dump, drop_indexes=drop_indexes,
+                           log=lambda message: message.startswith('rebuilt') and print(f'  {message}'))
+            elapsed = time.perf_counter() - started
+        label = 'drop + rebuild indexes' if drop_indexes else 'keep indexes'
+        print(f'{label:24} {elapsed:7.1f} s  {args.rows / elapsed:10,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import tempfile
+
+from werkzeug.test import Client
+
+'''
+    bench_response_cache.py
+
+    This file compares three ways a repeated local catalog request can be answered:
+    - Uncached: the view runs its queries and serializes the page (RESPONSE_CACHE off)
+    - Cached: the stored body for the current catalog version is replayed (routes/ResponseCache.py)
+    - Revalidated: the client sends the ETag back in If-None-Match and gets an empty 304
+    Each URL is timed through a WSGI test client, after checking the cached body equals the uncached one.
+
+    Run it with `python benchmarks/bench_response_cache.py --rows 200000`.
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_catalog_reads import _seed, _timed  # noqa: E402
+
+URLS = [
+    '/movies/get_all_movies_V2?page=50',
+    '/movies/sort_movies_V2?sort_by=popularity&order=desc&page=2000',
+    '/movies/filter_movies_V2?genres=Drama&language=fr&page=20',
+    '/movies/search?query=Movie 12',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cached and revalidated catalog responses.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['APP_SQL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+    os.environ.setdefault('SORT_RANKS_INTERVAL', '0')
+    os.environ.setdefault('TMDB_DISK_CACHE', '')
+    os.environ['TYPEAHEAD_INDEX'] = 'no'
+    os.environ['COLUMNAR_CATALOG'] = 'no'
+
+    import routes.ResponseCache as response_cache_module
+    from app import create_app
+    from extentions import db
+    from model import Movie
+
+    app = create_app()
+    with app.app_context():
+        _seed(db, Movie, args.rows)
+    client = Client(app, response_wrapper=app.response_class)
+
+    for url in URLS:
+        response_cache_module.RESPONSE_CACHE = False
+        uncached = client.get(url).data
+        uncached_ms = _timed(lambda: client.get(url), args.repeat)
+
+        response_cache_module.RESPONSE_CACHE = True
+        first = client.get(url)
+        assert first.data == uncached, url
+        cached_ms = _timed(lambda: client.get(url), args.repeat)
+        headers = {'If-None-Match': first.headers['ETag']}
+        assert client.get(url, headers=headers).status_code == 304, url
+        revalidated_ms = _timed(lambda: client.get(url, headers=headers), args.repeat)
+        print(f'{url:64} uncached {uncached_ms:8.2f} ms   cached {cached_ms:6.2f} ms   '
+              f'304 {revalidated_ms:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+'''
+    bench_search.py
+
+    This file measures /movies/search on a synthetic catalog of word-based titles and overviews.
+    It handles:
+    - Seeding the movies table (the full-text index is filled by its triggers)
+    - Timing full-text search against the old title ILIKE scan for a few typed prefixes
+
+    Run it with `python benchmarks/bench_search.py --rows 1000000`.
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('night', 'storm', 'river', 'ghost', 'summer', 'city', 'love', 'war', 'secret', 'island',
+         'dark', 'road', 'king', 'last', 'blue', 'house', 'star', 'dream', 'wild', 'heart',
+         'shadow', 'winter', 'fire', 'garden', 'silent', 'broken', 'golden', 'lost', 'empire', 'ocean')
+QUERIES = ('st', 'storm', 'storm ri', 'golden emp', 'xylophone')
+
+
+def _seed(db, Movie, rows):
+    rng = random.Random(506)
+    vocabulary = list(WORDS) + [f'word{n}' for n in range(5000)]
+    batch = []
+    for movie_id in range(1, rows + 1):
+        batch.append({
+            'id': movie_id,
+            'title': ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))).title(),
+            'overview': ' '.join(rng.choice(vocabulary) for _ in range(25)),
+            'popularity': rng.uniform(0, 500),
+        })
+        if len(batch) == 10000:
+            db.session.execute(Movie.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Movie.__table__.insert(), batch)
+    db.session.commit()
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark full-text vs ILIKE movie search.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['APP_SQL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+    os.environ.setdefault('SORT_RANKS_INTERVAL', '0')
+    os.environ.setdefault('TMDB_DISK_CACHE', '')
+
+    from app import create_app
+    from extentions import db
+    from model import Movie
+    from routes.Catalog import card_select, fetch_cards
+    from routes.Search import search_cards
+    from routes.Serializers import CARD_FIELDS
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        _seed(db, Movie, args.rows)
+        print(f'seeded {args.rows} rows in {time.perf_counter() - started:.1f} s')
+
+        for query in QUERIES:
+            fts_ms = _timed(lambda: search_cards(query, CARD_FIELDS, limit=10), args.repeat)
+            like_ms = _timed(lambda: fetch_cards(
+                card_select(CARD_FIELDS).where(Movie.title.ilike(f'%{query}%')).limit(10)), args.repeat)
+            print(f'{query!r:14} full-text {fts_ms:8.2f} ms   ilike {like_ms:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
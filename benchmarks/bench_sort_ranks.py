@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+'''
+    bench_sort_ranks.py
+
+    This file compares the two ways /sort_movies_V2 can read page N of a sorted listing:
+    - Index: page_cards() walking the (sort column, id) index past an OFFSET of (N - 1) * 12 rows
+    - Rank table: the movie_sort_ranks range for positions (N - 1) * 12 .. N * 12 (routes/SortRanks.py)
+    Pages from the first to the last are timed for each sort key and direction, after checking both paths agree.
+
+    Run it with `python benchmarks/bench_sort_ranks.py --rows 1000000`.
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_catalog_reads import _seed, _timed  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sort-rank pages against OFFSET pages.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['APP_SQL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+    os.environ.setdefault('TMDB_DISK_CACHE', '')
+    os.environ['TYPEAHEAD_INDEX'] = 'no'
+    os.environ['COLUMNAR_CATALOG'] = 'no'
+    os.environ['SORT_RANKS_INTERVAL'] = '0'  # rebuilt below, in the foreground
+
+    from app import create_app
+    from extentions import db
+    from model import Movie
+    from routes.Catalog import page_cards
+    from routes.Serializers import CARD_FIELDS
+    from routes.SortRanks import SORT_KEYS, sort_ranks
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        _seed(db, Movie, args.rows)
+        db.session.execute(Movie.__table__.update().values(title=Movie.title))  # move the catalog version
+        db.session.commit()
+        print(f'seeded {args.rows} rows in {time.perf_counter() - started:.1f} s')
+
+        for sort_by in SORT_KEYS:
+            started = time.perf_counter()
+            sort_ranks.rebuild((sort_by,))
+            print(f'ranked {sort_by} in {time.perf_counter() - started:.1f} s')
+
+        last_page = (args.rows + 11) // 12
+        for sort_by in SORT_KEYS:
+            for order in ('asc', 'desc'):
+                for page in (1, 100, last_page // 2, last_page):
+                    def index():
+                        return page_cards(CARD_FIELDS, sort_by=sort_by, order=order, page=page)
+
+                    def ranked():
+                        return sort_ranks.page(CARD_FIELDS, sort_by=sort_by, order=order, page=page)
+
+                    assert ranked() == index(), (sort_by, order, page)
+                    index_ms = _timed(index, args.repeat)
+                    ranked_ms = _timed(ranked, args.repeat)
+                    print(f'{sort_by:12} {order:4} page {page:<6} index {index_ms:8.2f} ms   '
+                          f'rank table {ranked_ms:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
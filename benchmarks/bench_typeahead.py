@@ -0,0 +1,86 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+'''
+    bench_typeahead.py
+
+    This file measures the in-memory typeahead index behind /movies/autocomplete.
+    It handles:
+    - Seeding the movies table with word-based titles and building the index from it
+    - Reporting build time, index size and p50/p99 latency over a stream of typed prefixes
+    - The same prefixes through the database prefix scan the endpoint falls back to before the build
+
+    Run it with `python benchmarks/bench_typeahead.py --rows 1000000`.
+'''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import _seed  # noqa: E402
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the typeahead index against a prefix scan.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=20000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['APP_SQL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+    os.environ.setdefault('SORT_RANKS_INTERVAL', '0')
+    os.environ.setdefault('TMDB_DISK_CACHE', '')
+    os.environ['TYPEAHEAD_INDEX'] = 'no'  # built below, in the foreground
+
+    from app import create_app
+    from extentions import db
+    from model import Movie
+    from routes.Catalog import fetch_cards
+    from routes.Typeahead import typeahead_index
+    from sqlalchemy import select
+
+    app = create_app()
+    with app.app_context():
+        _seed(db, Movie, args.rows)
+
+        started = time.perf_counter()
+        typeahead_index.build()
+        print(f'built index over {args.rows} rows in {time.perf_counter() - started:.1f} s: {typeahead_index.stats()}')
+
+        # Every prefix of a sample of real titles, as they would arrive keystroke by keystroke
+        rng = random.Random(506)
+        titles = [title for (title,) in db.session.execute(select(Movie.title).limit(5000))]
+        prefixes = []
+        while len(prefixes) < args.queries:
+            title = rng.choice(titles)
+            prefixes.extend(title[:length] for length in range(1, len(title) + 1))
+
+        samples = []
+        for prefix in prefixes[:args.queries]:
+            started = time.perf_counter()
+            typeahead_index.query(prefix, 10)
+            samples.append(time.perf_counter() - started)
+        p50, p99 = _percentiles(samples)
+        print(f'index    p50 {p50:8.3f} ms   p99 {p99:8.3f} ms')
+
+        samples = []
+        for prefix in prefixes[:min(args.queries, 500)]:
+            stmt = (select(Movie.id, Movie.title, Movie.popularity).where(Movie.title.ilike(f'{prefix}%'))
+                    .order_by(Movie.popularity.desc()).limit(10))
+            started = time.perf_counter()
+            fetch_cards(stmt)
+            samples.append(time.perf_counter() - started)
+        p50, p99 = _percentiles(samples)
+        print(f'database p50 {p50:8.3f} ms   p99 {p99:8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
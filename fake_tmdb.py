@@ -0,0 +1,227 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from routes.Config import genre_dict
+
+'''
+    fake_tmdb.py
+
+    This file runs a local stand-in for the TMDb API so TMDb-backed endpoints can be
+    tested, load-tested and profiled without network access.
+    It handles:
+    - A deterministic synthetic catalog (PAGES * 20 movies)
+    - /discover/movie, /movie/now_playing, /movie/popular, /search/movie and /movie/{id}
+    - /movie/changes, fed by edits made with touch()
+    - Configurable response latency and error rate
+
+    Run it standalone with `python fake_tmdb.py --port 8765`, or set TMDB_TRANSPORT=fake
+    to have routes/TMDb.py start one in-process.
+'''
+
+PAGE_SIZE = 20
+CHANGES_PAGE_SIZE = 100  # /movie/changes pages are larger, like TMDb's
+MAX_PAGES = 500  # TMDb never serves pages past 500
+LANGUAGES = ['en', 'en', 'en', 'fr', 'es', 'ja', 'ko', 'de']
+GENRE_IDS = list(genre_dict)
+
+
+#
+# Build the synthetic catalog; the same seed always yields the same movies
+#
+def build_catalog(pages, seed=506):
+    rng = random.Random(seed)
+    today = date.today()
+    movies = []
+    for movie_id in range(1, pages * PAGE_SIZE + 1):
+        release = today - timedelta(days=rng.randint(-60, 40 * 365))
+        movies.append({
+            'id': movie_id,
+            'title': f'Fake Movie {movie_id}',
+            'genre_ids': rng.sample(GENRE_IDS, rng.randint(1, 3)),
+            'original_language': rng.choice(LANGUAGES),
+            'overview': f'Synthetic overview for fake movie {movie_id}.',
+            'popularity': round(rng.uniform(1, 5000), 3),
+            'release_date': release.isoformat(),
+            'poster_path': f'/fake{movie_id}.jpg',
+            'vote_average': round(rng.uniform(1, 10), 1),
+            'adult': False,
+            'video': False,
+        })
+    return movies
+
+
+class FakeTMDb:
+    def __init__(self, pages=10, latency=0.0, error_rate=0.0, seed=506):
+        self.movies = build_catalog(pages, seed)
+        self.by_id = {movie['id']: movie for movie in self.movies}
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._server = None
+        self.requests = 0
+        self.paths = []  # path of every request served, for asserting on traffic
+        self.changes = {}  # ISO date -> ids changed that day, served by /movie/changes
+
+    #
+    # Route one request; returns (status, payload)
+    #
+    def handle(self, path, query):
+        self.requests += 1
+        self.paths.append(path)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return 500, {'status_code': 11, 'status_message': 'Internal error: fake failure'}
+
+        params = {key: values[-1] for key, values in query.items()}
+        if path == '/discover/movie':
+            return 200, self._page(self._discover(params), params)
+        if path == '/movie/now_playing':
+            playing = [m for m in self.movies if m['id'] % 3 == 0]
+            return 200, self._page(playing, params)
+        if path == '/movie/popular':
+            return 200, self._page(sorted(self.movies, key=lambda m: -m['popularity']), params)
+        if path == '/search/movie':
+            needle = params.get('query', '').lower()
+            return 200, self._page([m for m in self.movies if needle in m['title'].lower()], params)
+        if path == '/movie/changes':
+            return self._changes(params)
+
+        match = re.fullmatch(r'/movie/(\d+)', path)
+        if match and int(match.group(1)) in self.by_id:
+            return 200, self._details(self.by_id[int(match.group(1))])
+        return 404, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+
+    def _discover(self, params):
+        movies = self.movies
+        if params.get('with_genres'):
+            raw = params['with_genres']
+            wanted = [int(g) for g in re.split(r'[|,]', raw) if g]
+            match_all = ',' in raw and params.get('with_genres_operator') != 'or'
+            test = all if match_all else any
+            movies = [m for m in movies if test(g in m['genre_ids'] for g in wanted)]
+        if params.get('with_original_language'):
+            movies = [m for m in movies if m['original_language'] == params['with_original_language']]
+        if params.get('primary_release_year'):
+            movies = [m for m in movies if m['release_date'].startswith(str(params['primary_release_year']))]
+        for prefix in ('primary_release_date', 'release_date'):
+            if params.get(f'{prefix}.gte'):
+                movies = [m for m in movies if m['release_date'] >= params[f'{prefix}.gte']]
+            if params.get(f'{prefix}.lte'):
+                movies = [m for m in movies if m['release_date'] <= params[f'{prefix}.lte']]
+
+        field, _, order = params.get('sort_by', 'popularity.desc').partition('.')
+        field = {'title': 'title', 'release_date': 'release_date'}.get(field, 'popularity')
+        return sorted(movies, key=lambda m: m[field], reverse=(order != 'asc'))
+
+    def _page(self, movies, params):
+        try:
+            page = max(int(params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        total_pages = min(max((len(movies) + PAGE_SIZE - 1) // PAGE_SIZE, 1), MAX_PAGES)
+        start = (page - 1) * PAGE_SIZE
+        return {
+            'page': page,
+            'results': movies[start:start + PAGE_SIZE] if page <= MAX_PAGES else [],
+            'total_pages': total_pages,
+            'total_results': len(movies),
+        }
+
+    #
+    # Edit a movie (or add a new one) and record it as changed on `day` (today by default)
+    #
+    def touch(self, movie_id, day=None, **fields):
+        movie = self.by_id.get(movie_id)
+        if movie is None:
+            movie = dict(build_catalog(1)[0], id=movie_id, title=f'Fake Movie {movie_id}')
+            self.movies.append(movie)
+            self.by_id[movie_id] = movie
+        movie.update(fields)
+        day = (day or date.today()).isoformat()
+        self.changes.setdefault(day, [])
+        if movie_id not in self.changes[day]:
+            self.changes[day].append(movie_id)
+
+    def _changes(self, params):
+        today = date.today()
+        start = params.get('start_date', (today - timedelta(days=1)).isoformat())
+        end = params.get('end_date', today.isoformat())
+        if date.fromisoformat(end) - date.fromisoformat(start) > timedelta(days=14):
+            return 422, {'status_code': 7, 'status_message': 'The date range cannot exceed 14 days.'}
+        ids = list(dict.fromkeys(movie_id for day, day_ids in sorted(self.changes.items())
+                                 if start <= day <= end for movie_id in day_ids))
+        try:
+            page = max(int(params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        start_index = (page - 1) * CHANGES_PAGE_SIZE
+        return 200, {
+            'page': page,
+            'results': [{'id': movie_id, 'adult': False} for movie_id in ids[start_index:start_index + CHANGES_PAGE_SIZE]],
+            'total_pages': max((len(ids) + CHANGES_PAGE_SIZE - 1) // CHANGES_PAGE_SIZE, 1),
+            'total_results': len(ids),
+        }
+
+    def _details(self, movie):
+        details = {key: value for key, value in movie.items() if key != 'genre_ids'}
+        details['genres'] = [{'id': gid, 'name': genre_dict[gid]} for gid in movie['genre_ids']]
+        return details
+
+    #
+    # Serve in a daemon thread; returns the base URL to point TMDB_BASE_URL at
+    #
+    def start(self, host='127.0.0.1', port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path[2:] if url.path.startswith('/3/') else url.path
+                status, payload = fake.handle(path, parse_qs(url.query))
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), name='fake-tmdb', daemon=True).start()
+        return f'http://{host}:{self._server.server_port}/3'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local fake TMDb API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=10, help='catalog size in pages of 20 movies')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeTMDb(pages=args.pages, latency=args.latency_ms / 1000, error_rate=args.error_rate)
+    print(f'Fake TMDb listening on {fake.start(args.host, args.port)}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
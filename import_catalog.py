@@ -0,0 +1,208 @@
+import os
+
+if __name__ == '__main__':
+    # A command-line import serves no requests: skip the app's background work
+    # (must be set before routes.Config is imported below)
+    os.environ.setdefault('TYPEAHEAD_INDEX', 'no')
+    os.environ.setdefault('COLUMNAR_CATALOG', 'no')
+    os.environ.setdefault('SORT_RANKS_INTERVAL', '0')
+    os.environ.setdefault('NOW_PLAYING_REFRESH', '0')
+
+import argparse
+import csv
+import json
+import time
+
+from extentions import db
+from routes.Catalog import card_to_row, load_checkpoint, movies_table, save_checkpoint, upsert_rows
+from routes.Config import IMPORT_BATCH_SIZE
+from routes.Search import drop_search_index, ensure_search_index
+from routes.Serializers import tmdb_card, tmdb_details_card
+
+'''
+    import_catalog.py
+
+    This file bulk-loads catalog dumps into the movies table from the command line.
+    It handles:
+    - Streaming CSV (movies-table columns) or JSONL (movie cards, TMDb results or TMDb daily export lines)
+      record by record, so memory stays flat whatever the file size
+    - Multi-row upserts, committed one transaction per IMPORT_BATCH_SIZE rows
+    - Dropping the movies secondary and full-text indexes for the load and rebuilding them once at the end
+    - A checkpoint (byte offset in the file) committed with every batch, so an interrupted
+      import resumes where it stopped
+
+    Run it with `python import_catalog.py movies.csv` (APP_SQL selects the database, as for app.py).
+    Imported rows get updated_at = NULL, so local-first lookups still refresh them from TMDb.
+'''
+
+
+#
+# Records of a CSV file from byte offset `start`, as (record, offset after it)
+#
+def _iter_csv(handle, start):
+    """
+    Reads raw lines so the byte offset is always known, and joins lines until
+    the quotes balance, since quoted fields (overviews) may contain newlines.
+    """
+    handle.seek(0)
+    header = next(csv.reader([handle.readline().decode('utf-8-sig')]))
+    if start:
+        handle.seek(start)
+    offset = handle.tell()
+    pending = b''
+    for line in iter(handle.readline, b''):
+        offset += len(line)
+        pending += line
+        if pending.count(b'"') % 2:
+            continue  # inside a quoted field
+        text = pending.decode('utf-8')
+        pending = b''
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        yield dict(zip(header, values)), offset
+
+
+#
+# Records of a JSONL file from byte offset `start`, as (record, offset after it)
+#
+def _iter_jsonl(handle, start):
+    handle.seek(start)
+    offset = start
+    for line in iter(handle.readline, b''):
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), offset
+        except ValueError:
+            yield None, offset  # e.g. a line truncated by an interrupted download; counted as skipped
+
+
+#
+# Turn one record into a movies-table row, or None if it cannot be stored
+#
+def _record_to_row(record):
+    if not isinstance(record, dict):
+        return None
+    if 'genre_ids' in record:
+        record = tmdb_card(record)
+    elif isinstance(record.get('genres'), list):
+        record = tmdb_details_card(record)
+    else:
+        record = dict(record)
+    # TMDb daily exports only carry original_title
+    record['title'] = record.get('title') or record.get('original_title')
+    for field in ('genres', 'original_language', 'overview', 'release_date', 'poster_path'):
+        if record.get(field) == '':
+            record[field] = None  # empty CSV cells
+    try:
+        popularity = record.get('popularity')
+        record['popularity'] = float(popularity) if popularity not in (None, '') else None
+        return card_to_row(record, refreshed_at=None)
+    except (TypeError, ValueError):
+        return None
+
+
+# Upsert one batch and move the checkpoint past it, in a single transaction
+def _write_batch(name, batch, offset, source, rows_total):
+    upsert_rows(list(batch.values()))
+    save_checkpoint(name, {'source': source, 'offset': offset, 'rows': rows_total + len(batch)})
+    db.session.commit()
+    return len(batch)
+
+
+def _drop_indexes(connection):
+    drop_search_index(connection)
+    for index in movies_table.indexes:
+        index.drop(connection, checkfirst=True)
+
+
+def _rebuild_indexes(connection):
+    for index in movies_table.indexes:
+        index.create(connection, checkfirst=True)
+    ensure_search_index(connection)
+
+
+#
+# Import one CSV/JSONL file into the movies table (needs an app context). Returns counters
+#
+def import_catalog(path, fmt=None, batch_size=IMPORT_BATCH_SIZE, drop_indexes=True, restart=False, log=print):
+    """
+    Each batch of rows and the checkpoint recording the file offset after it
+    are committed together, so re-running after a crash (or Ctrl-C) skips
+    exactly the rows already written. The checkpoint is tied to the file's
+    size and mtime; a changed file, or restart=True, starts from the top.
+    """
+    path = os.path.abspath(path)
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    stat = os.stat(path)
+    name = f'import:{path}'
+    source = {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    saved = None if restart else load_checkpoint(name)
+    if saved is not None and saved.get('source') != source:
+        log(f'{path} changed since the last import; starting over')
+        saved = None
+    if saved is not None and saved.get('done'):
+        log(f'{path} was already imported ({saved["rows"]} rows); use --restart to load it again')
+        return {'rows': 0, 'skipped': 0, 'resumed_at': saved['offset']}
+    offset = saved['offset'] if saved else 0
+    rows_total = saved['rows'] if saved else 0
+    if offset:
+        log(f'resuming {path} at byte {offset} after {rows_total} rows')
+
+    if drop_indexes:
+        _drop_indexes(db.session.connection())
+        db.session.commit()
+
+    started = time.perf_counter()
+    counters = {'rows': 0, 'skipped': 0, 'resumed_at': offset}
+    with open(path, 'rb') as handle:
+        records = _iter_csv(handle, offset) if fmt == 'csv' else _iter_jsonl(handle, offset)
+        batch = {}
+        for record, offset in records:
+            row = _record_to_row(record)
+            if row is None:
+                counters['skipped'] += 1
+                continue
+            batch[row['id']] = row  # the last record for an id wins
+            if len(batch) >= batch_size:
+                rows_total += _write_batch(name, batch, offset, source, rows_total)
+                counters['rows'] += len(batch)
+                batch = {}
+                elapsed = time.perf_counter() - started
+                log(f'{rows_total} rows ({counters["rows"] / elapsed:,.0f} rows/s)')
+        if batch:
+            rows_total += _write_batch(name, batch, offset, source, rows_total)
+            counters['rows'] += len(batch)
+
+    save_checkpoint(name, {'source': source, 'offset': offset, 'rows': rows_total, 'done': True})
+    db.session.commit()
+
+    if drop_indexes:
+        rebuild_started = time.perf_counter()
+        _rebuild_indexes(db.session.connection())
+        db.session.commit()
+        log(f'rebuilt indexes in {time.perf_counter() - rebuild_started:.1f} s')
+    log(f'imported {counters["rows"]} rows, skipped {counters["skipped"]}, '
+        f'in {time.perf_counter() - started:.1f} s')
+    return counters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-load a CSV or JSONL catalog dump into the movies table.')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='default: from the file extension')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='rows per transaction')
+    parser.add_argument('--keep-indexes', action='store_true',
+                        help='maintain indexes during the load (faster for small updates to a large table)')
+    parser.add_argument('--restart', action='store_true', help='ignore any checkpoint and load from the top')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()  # also brings the schema up to date
+    with app.app_context():
+        import_catalog(args.path, fmt=args.format, batch_size=args.batch_size,
+                       drop_indexes=not args.keep_indexes, restart=args.restart)
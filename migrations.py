@@ -0,0 +1,137 @@
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from extentions import db
+from routes.Catalog import bump_catalog_version, genre_mask, movies_table
+from routes.Search import ensure_search_index
+
+'''
+    migrations.py
+
+    This file upgrades an existing database in place to match the models in model.py.
+    It handles:
+    - Creating tables that do not exist yet
+    - Adding columns that were introduced after a table was first created
+    - Creating indexes declared on the models
+    - Creating and filling the full-text search index on movies (routes/Search.py)
+    - Filling movies.genre_mask for rows stored before the column existed
+    Every step is idempotent and runs in its own transaction. A step that fails because another
+    process made the same change first counts as done, so workers starting together cannot crash
+    each other. upgrade() runs on each app start unless MIGRATE_ON_START=no; deployments with
+    several workers should run `python migrations.py` once instead.
+'''
+
+
+#
+# Run one schema change in its own transaction. Returns True if it was applied here, False if
+# it failed because another process applied it first (exists() is then true)
+#
+def _apply(engine, change, exists):
+    try:
+        with engine.begin() as connection:
+            change(connection)
+        return True
+    except DBAPIError:
+        with engine.connect() as connection:
+            if exists(connection):
+                return False
+        raise
+
+
+def _has_column(table_name, column_name):
+    return lambda connection: column_name in {column['name'] for column in
+                                              inspect(connection).get_columns(table_name)}
+
+
+def _has_index(table_name, index_name):
+    return lambda connection: index_name in {index['name'] for index in inspect(connection).get_indexes(table_name)}
+
+
+#
+# Create the model tables that do not exist yet. Returns the names created
+#
+def _create_missing_tables(engine):
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        missing = [table for table in db.metadata.sorted_tables if not inspector.has_table(table.name)]
+    return [table.name for table in missing
+            if _apply(engine, table.create, lambda connection, name=table.name: inspect(connection).has_table(name))]
+
+
+#
+# Add any model column that is missing from an existing table (new columns are always nullable)
+#
+def _add_missing_columns(engine):
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        missing = []
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            missing += [(table, column) for column in table.columns if column.name not in existing]
+
+    added = []
+    for table, column in missing:
+        column_type = column.type.compile(dialect=engine.dialect)
+        statement = text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+        if _apply(engine, lambda connection: connection.execute(statement), _has_column(table.name, column.name)):
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+#
+# Create every index declared on the models if it does not exist yet. Returns the names created
+#
+def _create_missing_indexes(engine):
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        missing = []
+        for table in db.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            missing += [index for index in table.indexes if index.name not in existing]
+    return [f'index {index.name}' for index in missing
+            if _apply(engine, index.create, _has_index(index.table.name, index.name))]
+
+
+#
+# Compute genre_mask for rows that do not have one yet. Returns the number of rows updated
+#
+def _backfill_genre_masks(connection):
+    """
+    There are only a few hundred distinct genre strings, so this runs one
+    UPDATE per distinct string rather than one per row.
+    """
+    pending = movies_table.c.genre_mask.is_(None)
+    updated = 0
+    for (genres,) in connection.execute(select(movies_table.c.genres).where(pending).distinct()).all():
+        result = connection.execute(
+            movies_table.update()
+            .where(pending, movies_table.c.genres.is_not_distinct_from(genres))
+            .values(genre_mask=genre_mask(genres))
+        )
+        updated += result.rowcount
+    return updated
+
+
+#
+# Bring the bound database up to date with the models
+#
+def upgrade(engine=None):
+    engine = engine or db.engine
+    added = _create_missing_tables(engine)
+    added += _add_missing_columns(engine)
+    added += _create_missing_indexes(engine)
+    with engine.begin() as connection:
+        if ensure_search_index(connection):
+            added.append('movies full-text index')
+    with engine.begin() as connection:
+        if _backfill_genre_masks(connection):
+            bump_catalog_version(connection)  # running workers' in-memory catalogs filter on genre_mask
+            added.append('movies.genre_mask values')
+    return added
+
+
+if __name__ == '__main__':
+    from app import create_database_app
+
+    with create_database_app().app_context():  # APP_SQL, without the routes or background work
+        added = upgrade()
+    print(f"Database upgraded, added: {', '.join(added)}" if added else 'Database schema is up to date')
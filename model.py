@@ -7,10 +7,12 @@ import random
     model.py
     
     This file defines the SQLAlchemy models for the application database, including:
-    - Movie: Stores information about individual movies
+    - Movie: Stores information about individual movies (preloaded or hydrated from TMDb)
     - Session: Represents a movie selection session with a host and status
     - SessionParticipant: Tracks participants in a session and their progress
     - MoviePocket: Temporary storage for selected movies and their votes during a session
+    - Checkpoint: Progress of resumable background jobs (catalog imports, TMDb sync) and the catalog version
+    - MovieSortRank: Each movie's position in every supported listing order, for paged sorted browsing
 '''
 
 
@@ -19,11 +21,22 @@ class Movie(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     genres = db.Column(db.String(100))
+    genre_mask = db.Column(db.Integer)  # genres as bits of genre_bits (routes/Config.py), kept in sync with genres
     original_language = db.Column(db.String(10))
     overview = db.Column(db.Text)
     popularity = db.Column(db.Float)
     release_date = db.Column(db.Date)
     poster_path = db.Column(db.String(200))
+    updated_at = db.Column(db.DateTime)  # Last TMDb refresh; NULL for rows from the CSV import
+
+    # Keyset pagination seeks on (sort column, id); see page_cards in routes/Catalog.py.
+    # The release_date and original_language indexes also serve the year and language filters
+    __table_args__ = (
+        db.Index('ix_movies_title_id', 'title', 'id'),
+        db.Index('ix_movies_popularity_id', 'popularity', 'id'),
+        db.Index('ix_movies_release_date_id', 'release_date', 'id'),
+        db.Index('ix_movies_original_language_id', 'original_language', 'id'),
+    )
 
 
 # Session Model for movie sessions
@@ -42,6 +55,11 @@ class SessionParticipant(db.Model):
     done_selecting = db.Column(db.Boolean, default=False)  # For movie selection phase
     done_voting = db.Column(db.Boolean, default=False)  # For voting phase
 
+    # Participants are looked up by session, and by session and name when joining
+    __table_args__ = (
+        db.Index('ix_session_participant_session_id_name', 'session_id', 'name'),
+    )
+
 
 
 # Temporary Pocket for Movie Voting
@@ -51,3 +69,26 @@ class MoviePocket(db.Model):
     session_id = db.Column(db.Text, db.ForeignKey('session.id'),nullable=False)
     movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'))
     votes = db.Column(db.Integer, default=0)
+
+    # Pockets are read per session, and per session and movie when voting
+    __table_args__ = (
+        db.Index('ix_movie_pocket_session_id_movie_id', 'session_id', 'movie_id'),
+    )
+
+
+# Where a resumable job (e.g. import_catalog.py) got to, or the catalog version (see routes/Catalog.py);
+# written in the same transaction as the work it describes
+class Checkpoint(db.Model):
+    __tablename__ = 'checkpoints'
+    name = db.Column(db.String(255), primary_key=True)  # job name, e.g. "import:/data/movies.csv"
+    value = db.Column(db.Text, nullable=False)  # JSON progress marker, format owned by the job
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+# Position of every movie in ascending (sort_by, id) order, rebuilt from movies when the catalog
+# version changes (see routes/SortRanks.py); a page of a sorted listing is a primary-key range
+class MovieSortRank(db.Model):
+    __tablename__ = 'movie_sort_ranks'
+    sort_by = db.Column(db.String(20), primary_key=True)  # popularity, release_date or title
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0-based
+    movie_id = db.Column(db.Integer, nullable=False)
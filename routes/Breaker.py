@@ -0,0 +1,90 @@
+import threading
+import time
+
+import requests
+
+'''
+    Breaker.py
+
+    This file provides the circuit breaker that protects our workers from TMDb outages.
+    It handles:
+    - Counting consecutive upstream failures, where calls slower than a threshold also count
+    - Failing fast while the circuit is open, then letting a single probe through (half-open)
+    - Notifying a callback when the circuit closes again so stale data can be refreshed
+'''
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class TMDbUnavailable(requests.RequestException):
+    """Raised instead of calling TMDb while the circuit is open and no stale copy exists."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, slow_call_seconds, open_seconds, on_close=None):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.on_close = on_close
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    #
+    # May a request go upstream right now? While open, one probe is let through after open_seconds
+    #
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, elapsed):
+        if elapsed > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            was_open = self.state != CLOSED
+            self.state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+        if was_open and self.on_close is not None:
+            self.on_close()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    #
+    # The allowed request never reached TMDb (e.g. it was throttled locally); free the probe slot
+    #
+    def cancel(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited,
+            }
@@ -0,0 +1,541 @@
+import base64
+import binascii
+import json
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, event, false, or_, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+
+from extentions import db
+from model import Checkpoint, Movie
+from routes.Config import LOCAL_MOVIE_MAX_AGE, CATALOG_STREAM_CHUNK, genre_bits
+from routes.Utils import hydrate_movies
+from routes.Serializers import CARD_FIELDS, dumps
+from routes.Typeahead import queue_for_commit
+
+'''
+    Catalog.py
+
+    This file treats the local movies table as a read-through / write-through copy of TMDb.
+    It handles:
+    - A read-only list path that selects only the needed columns as plain rows (no ORM instances)
+    - Genre filters as a bitwise test on movies.genre_mask instead of a text match on movies.genres
+    - Release-year filters as a date range, so they can use the release_date index
+    - Streaming those rows from a server-side cursor in fixed-size chunks
+    - Keyset (cursor) pagination on (sort column, id), so deep pages cost the same as the first
+    - Batched upserts of TMDb movie cards into the movies table
+    - Checkpoints for resumable catalog jobs (bulk import, TMDb change sync), and claims that let
+      one worker at a time run a periodic job
+    - The catalog version, a token replaced by every write to the movies table, so in-memory
+      copies of the catalog (routes/Columnar.py) and cached responses can tell when they are out of date
+    - Local-first lookups that serve fresh rows locally and only send misses to TMDb
+'''
+
+UPSERT_BATCH_SIZE = 500
+
+movies_table = Movie.__table__
+_checkpoints = Checkpoint.__table__
+
+
+#
+# SELECT of just the given movies columns; add filters, ordering and paging with .where()/.order_by()/...
+#
+def card_select(fields=CARD_FIELDS):
+    return select(*(movies_table.c[field] for field in fields))
+
+
+#
+# Run a card_select() statement on the session's connection and return plain dicts.
+# Rows never become Movie instances, so there is no identity map or change tracking.
+#
+def fetch_cards(stmt):
+    result = db.session.connection().execute(stmt)
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+_GENRE_BITS = {name.lower(): bit for name, bit in genre_bits.items()}
+
+
+#
+# Bitmask for a dash-joined genre string such as "Action-Drama"; unknown names contribute no bit
+#
+def genre_mask(genres):
+    return genre_names_mask((genres or '').split('-'))
+
+
+#
+# Bitmask for a list of genre names (case-insensitive); unknown names contribute no bit
+#
+def genre_names_mask(names):
+    mask = 0
+    for name in names:
+        mask |= _GENRE_BITS.get(name.strip().lower(), 0)
+    return mask
+
+
+#
+# WHERE clause matching movies with at least one of the given genre names (case-insensitive)
+#
+def genre_filter(names):
+    mask = genre_names_mask(names)
+    if not mask:
+        return false()  # only unknown genres were asked for
+    return movies_table.c.genre_mask.bitwise_and(mask) != 0
+
+
+#
+# WHERE clause for movies released in [year_min, year_max]. A range on the bare column, unlike
+# extract('year', release_date), can be answered from ix_movies_release_date_id
+#
+def release_year_filter(year_min, year_max=None):
+    year_max = year_min if year_max is None else year_max
+    column = movies_table.c.release_date
+    return and_(column >= date(year_min, 1, 1), column <= date(year_max, 12, 31))
+
+
+# Keep genre_mask in step with genres for movies written through the ORM
+@event.listens_for(Movie, 'before_insert')
+@event.listens_for(Movie, 'before_update')
+def _sync_genre_mask(mapper, connection, target):
+    target.genre_mask = genre_mask(target.genres)
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor token that is malformed or belongs to a different sort."""
+
+
+#
+# Opaque cursor token: the sort it belongs to plus the last row's sort value and id
+#
+def encode_cursor(sort_by, order, value, last_id):
+    raw = dumps([sort_by, order, value, last_id])
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(token, sort_by, order):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        token_sort, token_order, value, last_id = json.loads(raw)
+        if (token_sort, token_order) != (sort_by, order) or not isinstance(last_id, int):
+            raise InvalidCursor('Cursor does not match this sort')
+        if value is not None and sort_by == 'release_date':
+            value = date.fromisoformat(value)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursor(str(exc)) from exc
+    return value, last_id
+
+
+#
+# WHERE clauses for the rows after (value, last_id) in ORDER BY column, id, in the order they are read.
+# Each clause is a plain range on the (column, id) index; "a > v OR (a = v AND id > x)" is
+# written as "a >= v AND (a > v OR id > x)" because SQLite does not seek on the first form.
+# NULLs sort first in SQLite and MySQL, so they get their own segment before (ascending) or
+# after (descending) the non-NULL values.
+#
+def cursor_segments(column, ascending, value, last_id):
+    id_column = movies_table.c.id
+    if value is None:
+        if ascending:
+            return [and_(column.is_(None), id_column > last_id), column.isnot(None)]
+        return [and_(column.is_(None), id_column < last_id)]
+    if ascending:
+        return [and_(column >= value, or_(column > value, id_column > last_id))]
+    return [and_(column <= value, or_(column < value, id_column < last_id)), column.is_(None)]
+
+
+#
+# Columns a page reads on top of fields, so that next_cursor can be built from its last card
+#
+def cursor_columns(fields, sort_by):
+    return [name for name in dict.fromkeys((sort_by, 'id')) if name not in fields]
+
+
+#
+# (cards, next_cursor) for a page read with one row past per_page: next_cursor is None when that row is missing
+# (the last page). The cursor_columns added for it are dropped from the cards
+#
+def finish_page(cards, extra, *, sort_by, order, per_page):
+    next_cursor = None
+    if len(cards) > per_page:
+        cards = cards[:per_page]
+        last = cards[-1]
+        next_cursor = encode_cursor(sort_by, order, last[sort_by], last['id'])
+    for card in cards:
+        for name in extra:
+            del card[name]
+    return cards, next_cursor
+
+
+#
+# One page of cards ordered by (sort_by, id). Returns (cards, next_cursor); next_cursor is None on the last page
+#
+def page_cards(fields, *, filters=(), sort_by='id', order='asc', cursor=None, page=1, per_page=12):
+    """
+    With a cursor (from a previous next_cursor) the page starts right after
+    the row it encodes and is found by an index seek on (sort_by, id); page is
+    ignored. Without one, page is applied as an OFFSET for compatibility.
+    Raises InvalidCursor for a bad token.
+    """
+    ascending = order != 'desc'
+    column = movies_table.c[sort_by]
+    id_column = movies_table.c.id
+    extra = cursor_columns(fields, sort_by)
+
+    stmt = card_select(tuple(fields) + tuple(extra)).where(*filters)
+    if sort_by == 'id':
+        stmt = stmt.order_by(column.asc() if ascending else column.desc())
+    else:
+        stmt = stmt.order_by(*((column.asc(), id_column.asc()) if ascending else (column.desc(), id_column.desc())))
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_by, order)
+        if sort_by == 'id':
+            segments = [column > last_id if ascending else column < last_id]
+        else:
+            segments = cursor_segments(column, ascending, value, last_id)
+        cards = []
+        for segment in segments:
+            cards += fetch_cards(stmt.where(segment).limit(per_page + 1 - len(cards)))
+            if len(cards) > per_page:
+                break
+    else:
+        if page > 1:
+            stmt = stmt.offset((page - 1) * per_page)
+        cards = fetch_cards(stmt.limit(per_page + 1))
+
+    return finish_page(cards, extra, sort_by=sort_by, order=order, per_page=per_page)
+
+
+#
+# Like fetch_cards, but yield lists of at most chunk_size dicts from a server-side cursor,
+# so memory stays flat however many rows the statement matches
+#
+def stream_cards(stmt, chunk_size=None):
+    chunk_size = chunk_size or CATALOG_STREAM_CHUNK
+    result = db.session.connection().execute(
+        stmt, execution_options={'stream_results': True, 'yield_per': chunk_size}
+    )
+    keys = tuple(result.keys())
+    try:
+        for rows in result.partitions():
+            yield [dict(zip(keys, row)) for row in rows]
+    finally:
+        result.close()
+
+# Columns refreshed on conflict (everything except the primary key)
+_UPDATE_COLUMNS = ('title', 'genres', 'genre_mask', 'original_language', 'overview', 'popularity',
+                   'release_date', 'poster_path', 'updated_at')
+
+
+# Trim strings to their column length so strict databases (MySQL) accept them
+def _clip(value, length):
+    return value[:length] if value else value
+
+
+#
+# Convert a TMDb movie card into a movies-table row (None if it cannot be stored)
+#
+def card_to_row(card, refreshed_at):
+    if card.get('id') is None or not card.get('title'):
+        return None
+
+    release_date = card.get('release_date')
+    if isinstance(release_date, str):
+        try:
+            release_date = date.fromisoformat(release_date)
+        except ValueError:
+            release_date = None
+
+    return {
+        'id': int(card['id']),
+        'title': _clip(card['title'], 100),
+        'genres': _clip(card.get('genres'), 100),
+        'genre_mask': genre_mask(card.get('genres')),
+        'original_language': _clip(card.get('original_language'), 10),
+        'overview': card.get('overview'),
+        'popularity': card.get('popularity'),
+        'release_date': release_date,
+        'poster_path': _clip(card.get('poster_path'), 200),
+        'updated_at': refreshed_at,
+    }
+
+
+#
+# One INSERT ... ON CONFLICT / ON DUPLICATE KEY statement, run with many rows of parameters.
+# It is compiled once and cached, where .values(rows) would build and compile a new statement per batch
+#
+def _upsert_statement(dialect_name):
+    if dialect_name == 'sqlite':
+        stmt = sqlite.insert(movies_table)
+        return stmt.on_conflict_do_update(
+            index_elements=[movies_table.c.id],
+            set_={column: stmt.excluded[column] for column in _UPDATE_COLUMNS},
+        )
+    if dialect_name in ('mysql', 'mariadb'):
+        stmt = mysql.insert(movies_table)
+        return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in _UPDATE_COLUMNS})
+    return None
+
+
+#
+# Insert or refresh movies-table rows (from card_to_row) in the current transaction, without committing,
+# UPSERT_BATCH_SIZE rows per executemany() call
+#
+def upsert_rows(rows):
+    stmt = _upsert_statement(db.session.get_bind().dialect.name)
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[start:start + UPSERT_BATCH_SIZE]
+        if stmt is not None:
+            db.session.execute(stmt, batch)
+        else:
+            for row in batch:
+                db.session.merge(Movie(**row))
+    _bump_in_session(db.session)
+
+
+#
+# Insert or refresh movie cards in the movies table and commit
+#
+def upsert_movies(cards, refreshed_at=None):
+    """
+    Write movie cards (as produced by tmdb_details_card) into the movies
+    table and commit. Returns the number of rows written.
+    """
+    refreshed_at = refreshed_at or datetime.utcnow()
+    rows = [row for row in (card_to_row(card, refreshed_at) for card in cards) if row is not None]
+    if not rows:
+        return 0
+
+    upsert_rows(rows)
+    # Core upserts bypass the ORM events that keep the typeahead index current
+    queue_for_commit(db.session, [(row['id'], row['title'], row['popularity']) for row in rows])
+    db.session.commit()
+    return len(rows)
+
+
+#
+# Progress marker of a resumable job (a JSON value), or None if it never ran
+#
+def load_checkpoint(name):
+    checkpoint = db.session.get(Checkpoint, name)
+    return json.loads(checkpoint.value) if checkpoint is not None else None
+
+
+#
+# Record a job's progress in the current transaction, so it commits together with the work it describes
+#
+def save_checkpoint(name, value):
+    checkpoint = db.session.get(Checkpoint, name) or Checkpoint(name=name)
+    checkpoint.value = json.dumps(value)
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.add(checkpoint)
+
+
+#
+# Take this interval's run of a periodic job unless another worker ran or started one within min_gap seconds
+#
+def claim_checkpoint(name, min_gap):
+    """
+    The claim is an UPDATE of the checkpoint's updated_at guarded by its
+    previous value, so of several workers waking up together exactly one
+    sees a row change. The row is created on the first claim.
+    """
+    now = datetime.utcnow()
+    try:
+        if db.session.get(Checkpoint, name) is None:
+            db.session.add(Checkpoint(name=name, value='{}', updated_at=now))
+            db.session.commit()
+            return True
+        result = db.session.execute(
+            _checkpoints.update()
+            .where(_checkpoints.c.name == name, _checkpoints.c.updated_at <= now - timedelta(seconds=min_gap))
+            .values(updated_at=now)
+        )
+        db.session.commit()
+        return result.rowcount > 0
+    except IntegrityError:
+        db.session.rollback()  # another worker created the row first
+        return False
+
+
+#
+# Keep a claim from claim_checkpoint while its job is still running (in the current transaction),
+# so a job that outlasts min_gap is not claimed again by another worker
+#
+def renew_claim(name):
+    db.session.execute(_checkpoints.update().where(_checkpoints.c.name == name).values(updated_at=datetime.utcnow()))
+
+
+CATALOG_VERSION = 'catalog_version'
+
+
+#
+# Values of several checkpoints in one query, as {name: value}; names never saved are left out
+#
+def load_checkpoint_values(names, connection=None):
+    """
+    Read with a plain SELECT rather than db.session.get(), so a long-lived
+    session sees other workers' commits instead of its identity map.
+    """
+    connection = connection or db.session.connection()
+    rows = connection.execute(
+        select(_checkpoints.c.name, _checkpoints.c.value).where(_checkpoints.c.name.in_(names))
+    )
+    return {name: json.loads(value) for name, value in rows}
+
+
+#
+# Current catalog version (an opaque string), or None if the movies table was never written through the app
+#
+def catalog_version(connection=None):
+    return load_checkpoint_values((CATALOG_VERSION,), connection).get(CATALOG_VERSION)
+
+
+#
+# Replace the catalog version in the current transaction, so it commits with the write that changed the movies.
+# Returns (replaced version, new version)
+#
+def bump_catalog_version(connection):
+    """
+    A fresh random token rather than a counter: concurrent writers can
+    never end up on the same value, and readers only compare for equality.
+    The replaced version is read under a row lock, so a caller holding a
+    copy of the catalog at that version knows it saw every other write.
+    """
+    current = connection.execute(
+        select(_checkpoints.c.value).where(_checkpoints.c.name == CATALOG_VERSION).with_for_update()
+    ).scalar()
+    value = uuid.uuid4().hex
+    now = datetime.utcnow()
+    if current is None:
+        connection.execute(_checkpoints.insert().values(name=CATALOG_VERSION, value=json.dumps(value), updated_at=now))
+    else:
+        connection.execute(_checkpoints.update().where(_checkpoints.c.name == CATALOG_VERSION)
+                           .values(value=json.dumps(value), updated_at=now))
+    return (json.loads(current) if current is not None else None), value
+
+
+#
+# Bump the version and remember in the session the change its commit makes: (version before, version after)
+#
+def _bump_in_session(session):
+    replaced, value = bump_catalog_version(session.connection())
+    before = session.info['catalog_version_change'][0] if 'catalog_version_change' in session.info else replaced
+    session.info['catalog_version_change'] = (before, value)
+
+
+#
+# The (before, after) catalog versions the session's current transaction commits, or None
+#
+def committed_version_change(session):
+    return session.info.get('catalog_version_change')
+
+
+# Movies written through the ORM (tests, admin scripts) move the version too
+@event.listens_for(OrmSession, 'after_flush')
+def _bump_after_movie_flush(session, flush_context):
+    if any(isinstance(instance, Movie) for instance in (*session.new, *session.dirty, *session.deleted)):
+        _bump_in_session(session)
+
+
+# The last catalog version read by recent_catalog_version(), and when. generation counts local commits
+# that moved the version, so a read that raced with one is not remembered
+_recent_version = {'value': None, 'checked_at': None, 'generation': 0}
+_recent_version_lock = threading.Lock()
+
+
+#
+# catalog_version() as read at most max_age seconds ago, so hot paths can skip the query
+#
+def recent_catalog_version(max_age):
+    """
+    Writes committed by this process are seen at once (the commit forgets
+    the remembered value); other workers' writes within max_age seconds.
+    """
+    with _recent_version_lock:
+        checked_at = _recent_version['checked_at']
+        if checked_at is not None and time.monotonic() - checked_at <= max_age:
+            return _recent_version['value']
+        generation = _recent_version['generation']
+    value = catalog_version()
+    with _recent_version_lock:
+        if _recent_version['generation'] == generation:
+            _recent_version.update(value=value, checked_at=time.monotonic())
+    return value
+
+
+#
+# Make the next recent_catalog_version() read the database (e.g. after switching databases)
+#
+def forget_recent_catalog_version():
+    with _recent_version_lock:
+        _recent_version.update(checked_at=None, generation=_recent_version['generation'] + 1)
+
+
+@event.listens_for(OrmSession, 'after_commit')
+def _forget_recent_version(session):
+    # Registered after routes.Typeahead's after_commit listener, which reads the change first
+    if session.info.pop('catalog_version_change', None):
+        forget_recent_catalog_version()
+
+
+@event.listens_for(OrmSession, 'after_rollback')
+def _discard_bump(session):
+    session.info.pop('catalog_version_change', None)
+
+
+#
+# Look movies up in the local table first; fetch only missing or stale ids from TMDb and write them back
+#
+def get_movies_local_first(movie_ids, max_age=None):
+    """
+    Return (cards, failures) keyed by the requested ids, like hydrate_movies.
+    Rows refreshed within max_age seconds (default LOCAL_MOVIE_MAX_AGE) are
+    served locally. Rows that were never refreshed (CSV import) count as
+    stale, but are still served if TMDb cannot be reached.
+    """
+    max_age = LOCAL_MOVIE_MAX_AGE if max_age is None else max_age
+    keys = {}
+    for movie_id in movie_ids:
+        try:
+            keys[movie_id] = int(movie_id)
+        except (TypeError, ValueError):
+            keys[movie_id] = None
+
+    local_ids = {key for key in keys.values() if key is not None}
+    stmt = card_select(CARD_FIELDS + ('updated_at',)).where(movies_table.c.id.in_(local_ids))
+    by_id = {row['id']: row for row in fetch_cards(stmt)} if local_ids else {}
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+
+    cards, stale, misses = {}, {}, []
+    for movie_id, key in keys.items():
+        # A copy: ids like 1 and "1" share one row
+        row = dict(by_id[key]) if key in by_id else None
+        updated_at = row.pop('updated_at') if row is not None else None
+        if updated_at is not None and updated_at >= cutoff:
+            cards[movie_id] = row
+            continue
+        if row is not None:
+            stale[movie_id] = row
+        misses.append(movie_id)
+
+    fetched, failures, stale_fetched = hydrate_movies(misses)
+    # Cards TMDb could only answer from its last known good copy are served but not stored,
+    # so they are not marked as refreshed now
+    refreshed = [card for movie_id, card in fetched.items() if movie_id not in stale_fetched]
+    if refreshed:
+        upsert_movies(refreshed)
+    cards.update(fetched)
+
+    # Fall back to the stale local copy when TMDb could not refresh it
+    for movie_id in list(failures):
+        if movie_id in stale:
+            cards[movie_id] = stale[movie_id]
+            del failures[movie_id]
+    return cards, failures
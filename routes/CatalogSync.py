@@ -0,0 +1,166 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from extentions import db
+from routes.Catalog import claim_checkpoint, load_checkpoint, movies_table, save_checkpoint, upsert_movies
+from routes.Config import CATALOG_SYNC_BATCH, CATALOG_SYNC_CONCURRENCY, CATALOG_SYNC_INITIAL_DAYS
+from routes.RateLimit import BACKGROUND
+from routes.TMDb import get_json
+from routes.Utils import hydrate_movies
+
+'''
+    CatalogSync.py
+
+    This file keeps the local movies table current by following TMDb's movie change feed.
+    It handles:
+    - Reading /movie/changes since the last checkpoint, in windows of at most 14 days
+    - Keeping only the changed ids that are in the local catalog, so the cost follows the change volume
+    - Re-fetching those movies with bounded concurrency and writing them back in batched upserts
+    - Committing the checkpoint with the last batch of each window, and retrying failed ids on the next run
+    - Running on an interval in a background thread, at most one worker per interval
+'''
+
+CHECKPOINT_NAME = 'tmdb_changes'
+MAX_WINDOW_DAYS = 14  # TMDb rejects longer /movie/changes ranges
+MAX_RETRY_IDS = 10000
+
+
+class CatalogSync:
+    def __init__(self, concurrency=CATALOG_SYNC_CONCURRENCY, batch_size=CATALOG_SYNC_BATCH,
+                 initial_days=CATALOG_SYNC_INITIAL_DAYS):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.initial_days = initial_days
+        self._lock = threading.Lock()
+        self._thread = None
+        self.runs = 0
+        self.changed = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.last_run_at = None
+        self.last_error = None
+
+    #
+    # Every id TMDb reports as changed between start and end (inclusive)
+    #
+    def _changed_ids(self, start, end):
+        ids, page, total_pages = [], 1, 1
+        while page <= total_pages:
+            data = get_json('/movie/changes', {'start_date': start.isoformat(), 'end_date': end.isoformat(),
+                                               'page': page}, priority=BACKGROUND, cached=False)
+            total_pages = data.get('total_pages', 1)
+            ids.extend(result['id'] for result in data.get('results', []) if result.get('id') is not None)
+            page += 1
+        return list(dict.fromkeys(ids))
+
+    #
+    # The subset of ids present in the movies table
+    #
+    def _local_ids(self, ids):
+        local = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            local.update(db.session.execute(select(movies_table.c.id).where(movies_table.c.id.in_(chunk))).scalars())
+        return [movie_id for movie_id in ids if movie_id in local]
+
+    #
+    # Refresh the local movies in one window and move the checkpoint to its end. Returns the ids to retry
+    #
+    def _sync_window(self, start, end, retry):
+        changed = self._changed_ids(start, end)
+        local_ids = self._local_ids(list(dict.fromkeys(retry + changed)))
+        with self._lock:
+            self.changed += len(changed)
+
+        failed = []
+        for index in range(0, len(local_ids), self.batch_size):
+            batch = local_ids[index:index + self.batch_size]
+            cards, failures, _ = hydrate_movies(batch, max_workers=self.concurrency, priority=BACKGROUND, fresh=True)
+            for movie_id, exc in failures.items():
+                response = getattr(exc, 'response', None)
+                if response is None or response.status_code != 404:  # a 404 means TMDb removed it; keep our row
+                    failed.append(movie_id)
+            if index + self.batch_size >= len(local_ids):
+                # The last batch commits together with the checkpoint
+                save_checkpoint(CHECKPOINT_NAME, {'through': end.isoformat(), 'retry': failed[:MAX_RETRY_IDS]})
+            upsert_movies(cards.values())
+            db.session.commit()  # upsert_movies does not commit when nothing was fetched
+            with self._lock:
+                self.refreshed += len(cards)
+                self.failed += len(failures)
+
+        if not local_ids:
+            save_checkpoint(CHECKPOINT_NAME, {'through': end.isoformat(), 'retry': failed})
+            db.session.commit()
+        return failed[:MAX_RETRY_IDS]
+
+    #
+    # Catch up from the checkpoint to today (needs an app context). Returns the number of movies refreshed
+    #
+    def sync(self, today=None):
+        """
+        Each window's checkpoint commits with its last upsert, so an
+        interrupted run repeats at most one window; upserts are idempotent.
+        The window end is re-read on the next run, since TMDb keeps adding
+        changes to the current day.
+        """
+        today = today or datetime.utcnow().date()
+        saved = load_checkpoint(CHECKPOINT_NAME) or {}
+        if saved.get('through'):
+            start = date.fromisoformat(saved['through'])
+        else:
+            start = today - timedelta(days=self.initial_days)
+        retry = saved.get('retry', [])
+        refreshed_before = self.refreshed
+
+        while True:
+            end = min(start + timedelta(days=MAX_WINDOW_DAYS), today)
+            retry = self._sync_window(start, end, retry)
+            if end >= today:
+                break
+            start = end
+
+        with self._lock:
+            self.runs += 1
+            self.last_run_at = time.time()
+        return self.refreshed - refreshed_before
+
+    def stats(self):
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'changed': self.changed,
+                'refreshed': self.refreshed,
+                'failed': self.failed,
+                'last_run_at': self.last_run_at,
+                'last_error': self.last_error,
+            }
+
+    #
+    # Start the background sync loop (idempotent)
+    #
+    def start(self, app, interval):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while True:
+                with app.app_context():
+                    try:
+                        if claim_checkpoint(CHECKPOINT_NAME, interval / 2):
+                            self.sync()
+                            self.last_error = None
+                    except Exception as exc:
+                        db.session.rollback()
+                        self.last_error = str(exc)
+                        print(f"Catalog sync failed: {exc}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name='catalog-sync', daemon=True)
+        self._thread.start()
+
+
+catalog_sync = CatalogSync()
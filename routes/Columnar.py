@@ -0,0 +1,298 @@
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import select
+
+from extentions import db
+from routes.Catalog import (card_select, catalog_version, cursor_columns, decode_cursor, fetch_cards, finish_page,
+                            genre_names_mask, movies_table, recent_catalog_version)
+
+try:
+    import numpy as np
+except ImportError:  # optional; without it the paged endpoints stay on SQL
+    np = None
+
+'''
+    Columnar.py
+
+    This file keeps an in-memory columnar copy of the movies table for the paged filter and sort endpoints.
+    It handles:
+    - Loading id, popularity, release date, language and genre_mask into numpy arrays, one per column
+    - Precomputing, per sort column, the (column, id) order of all movies, with NULLs where SQL puts them
+    - Answering genre/language/year filters with vectorized masks: over the first rows of that order when
+      they fill the page, otherwise over every row, ordering the matches with argpartition
+    - Hydrating only the movies on the returned page from the database
+    - Checking the catalog version on every query (as read at most VERSION_CHECK_AGE seconds ago); an
+      out-of-date copy is rebuilt in the background while the endpoints answer from SQL (page_cards),
+      as they do when numpy is not installed
+'''
+
+
+# Rows of the sort order tested before falling back to filtering every row
+PROBE_ROWS = 4096
+# Seconds a catalog version read is trusted for before page() checks it again
+VERSION_CHECK_AGE = 1
+
+
+class _Snapshot:
+    def __init__(self, version, ids, popularity, release, languages, codes, genre_masks, orders):
+        self.version = version
+        self.ids = ids                  # int64, ascending
+        self.popularity = popularity    # float64, NaN for NULL
+        self.release = release          # int32 date ordinals, 0 for NULL
+        self.languages = languages      # int16 codes into `codes`, -1 for NULL
+        self.codes = codes              # language -> code
+        self.genre_masks = genre_masks  # int32
+        # sort column -> (row positions in ascending (column, id) order, each row's index in that order)
+        self.orders = orders
+
+    #
+    # Function from an array of row positions to a boolean mask of those passing the filters;
+    # None when there are no filters
+    #
+    def matcher(self, genres, language, year_range):
+        tests = []
+        if genres:
+            bits = genre_names_mask(genres)
+            tests.append(lambda positions: (self.genre_masks[positions] & bits) != 0)
+        if language:
+            code = self.codes.get(language, -2)  # -2 is no row's code
+            tests.append(lambda positions: self.languages[positions] == code)
+        if year_range:
+            year_min, year_max = year_range
+            year_max = year_min if year_max is None else year_max
+            low, high = date(year_min, 1, 1).toordinal(), date(year_max, 12, 31).toordinal()
+            tests.append(lambda positions: (self.release[positions] >= low) & (self.release[positions] <= high))
+        if not tests:
+            return None
+
+        def matches(positions):
+            keep = tests[0](positions)
+            for test in tests[1:]:
+                keep &= test(positions)
+            return keep
+        return matches
+
+    #
+    # Position of a movie id, or None if it is not in the snapshot
+    #
+    def position(self, movie_id):
+        position = int(np.searchsorted(self.ids, movie_id))
+        if position < len(self.ids) and self.ids[position] == movie_id:
+            return position
+        return None
+
+    #
+    # Whether the row at position still has the sort value a cursor recorded for it
+    #
+    def has_value(self, sort_by, position, value):
+        if sort_by == 'id':
+            return True
+        if sort_by == 'popularity':
+            stored = self.popularity[position]
+            return bool(np.isnan(stored)) if value is None else stored == value
+        if sort_by == 'release_date':
+            return self.release[position] == (value.toordinal() if value is not None else 0)
+        return False  # titles are not kept in memory; SQL continues those cursors
+
+
+#
+# Row positions in ascending order, and each row's index in it (to place cursors)
+#
+def _with_ranks(order):
+    order = order.astype(np.int32)
+    ranks = np.empty(len(order), dtype=np.int32)
+    ranks[order] = np.arange(len(order), dtype=np.int32)
+    return order, ranks
+
+
+#
+# _with_ranks() for ascending (key..., id) order, given keys from most to least significant
+#
+def _sorted_by(ids, *keys):
+    return _with_ranks(np.lexsort((ids,) + tuple(reversed(keys))))
+
+
+class ColumnarCatalog:
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._app = None
+        self._thread = None
+        self.built_at = None
+        self.build_seconds = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    def is_available(self):
+        return np is not None
+
+    #
+    # Load a new snapshot from the movies table (needs an app context). Returns the number of movies
+    #
+    def build(self):
+        """
+        The version is read in the same transaction as the rows, so the
+        snapshot is never labelled newer than its contents. Title ranks
+        follow Python string order, which is SQLite's BINARY collation;
+        on other databases title sorts are left to SQL.
+        """
+        started = time.perf_counter()
+        connection = db.session.connection()
+        version = catalog_version(connection)
+        columns = movies_table.c
+        result = connection.execute(
+            select(columns.id, columns.popularity, columns.release_date, columns.original_language,
+                   columns.genre_mask, columns.title).order_by(columns.id),
+            execution_options={'yield_per': 10000}
+        )
+        ids, popularity, release, languages, genre_masks, titles = [], [], [], [], [], []
+        codes = {}
+        for rows in result.partitions():
+            for movie_id, movie_popularity, release_date, language, genre_mask, title in rows:
+                ids.append(movie_id)
+                popularity.append(movie_popularity)
+                release.append(release_date.toordinal() if release_date is not None else 0)
+                languages.append(codes.setdefault(language, len(codes)) if language is not None else -1)
+                genre_masks.append(genre_mask or 0)
+                titles.append(title)
+        dialect = connection.dialect.name
+        db.session.rollback()  # release the read transaction
+
+        ids = np.array(ids, dtype=np.int64)
+        popularity = np.array(popularity, dtype=np.float64)  # None becomes NaN
+        release = np.array(release, dtype=np.int32)
+        missing = np.isnan(popularity)
+        orders = {
+            'id': _with_ranks(np.arange(len(ids))),
+            # NULLs sort first ascending in SQLite and MySQL
+            'popularity': _sorted_by(ids, ~missing, np.where(missing, 0.0, popularity)),
+            'release_date': _sorted_by(ids, release),
+        }
+        if dialect == 'sqlite':
+            # sorted() is stable, so equal titles stay in id order
+            orders['title'] = _with_ranks(np.array(sorted(range(len(titles)), key=titles.__getitem__)))
+
+        self._snapshot = _Snapshot(version, ids, popularity, release, np.array(languages, dtype=np.int16),
+                                   codes, np.array(genre_masks, dtype=np.int32), orders)
+        self.built_at = time.time()
+        self.build_seconds = time.perf_counter() - started
+        return len(ids)
+
+    #
+    # One page of cards, like page_cards(), or None when the caller should ask SQL instead
+    #
+    def page(self, fields, *, genres=(), language=None, year_range=None, sort_by='id', order='asc',
+             cursor=None, page=1, per_page=12):
+        """
+        Same results, order and cursors as page_cards() with the matching
+        genre_filter/language/release_year_filter filters, so a client can
+        page through one listing partly here and partly in SQL. Returns None
+        when there is no current snapshot (not built, out of date, numpy
+        missing) or for a sort or cursor it cannot place. Raises
+        InvalidCursor for a bad token.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or sort_by not in snapshot.orders:
+            return self._fallback()
+        if recent_catalog_version(VERSION_CHECK_AGE) != snapshot.version:
+            self.refresh_in_background()
+            return self._fallback()
+
+        # Rows are read from the precomputed order (reversed for desc), from just after the cursor
+        ascending = order != 'desc'
+        sequence, ranks = snapshot.orders[sort_by]
+        if not ascending:
+            sequence = sequence[::-1]
+        skip = (page - 1) * per_page
+        start = 0
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort_by, order)
+            position = snapshot.position(last_id)
+            if position is None or not snapshot.has_value(sort_by, position, value):
+                return self._fallback()
+            start = (int(ranks[position]) if ascending else len(sequence) - 1 - int(ranks[position])) + 1
+            skip = 0
+        wanted = skip + per_page + 1
+
+        matches = snapshot.matcher(genres, language, year_range)
+        if matches is None:
+            found = sequence[start + skip:start + wanted]
+        else:
+            # A common filter fills the page from the first rows of the order
+            head = sequence[start:start + PROBE_ROWS]
+            found = head[matches(head)]
+            if len(found) < wanted and start + PROBE_ROWS < len(sequence):
+                # Otherwise filter every row, and order the matches only as far as this page
+                candidates = np.flatnonzero(matches(slice(None)))
+                keys = ranks[candidates] if ascending else len(sequence) - 1 - ranks[candidates]
+                if start:
+                    after = keys >= start
+                    candidates, keys = candidates[after], keys[after]
+                top = np.argpartition(keys, wanted - 1)[:wanted] if wanted < len(keys) else np.arange(len(keys))
+                found = candidates[top[np.argsort(keys[top])]]
+            found = found[skip:wanted]
+        page_ids = snapshot.ids[found].tolist()
+
+        extra = cursor_columns(fields, sort_by)
+        by_id = {}
+        if page_ids:
+            stmt = card_select(tuple(fields) + tuple(extra)).where(movies_table.c.id.in_(page_ids))
+            by_id = {card['id']: card for card in fetch_cards(stmt)}
+        if len(by_id) != len(page_ids):
+            return self._fallback()  # a movie was deleted after the version check
+        cards = [by_id[movie_id] for movie_id in page_ids]
+
+        cards, next_cursor = finish_page(cards, extra, sort_by=sort_by, order=order, per_page=per_page)
+        with self._lock:
+            self.hits += 1
+        return cards, next_cursor
+
+    def _fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'available': self.is_available(),
+            'movies': len(snapshot.ids) if snapshot is not None else 0,
+            'built_at': self.built_at,
+            'build_seconds': self.build_seconds,
+            'hits': self.hits,
+            'fallbacks': self.fallbacks,
+        }
+
+    #
+    # Rebuild in a background thread unless one is already running (needs start() to have been called)
+    #
+    def refresh_in_background(self):
+        with self._lock:
+            if self._app is None or (self._thread is not None and self._thread.is_alive()):
+                return
+
+            def run():
+                with self._app.app_context():
+                    try:
+                        count = self.build()
+                        print(f"Columnar catalog built with {count} movies in {self.build_seconds:.1f} s")
+                    except Exception as exc:
+                        print(f"Columnar catalog build failed: {exc}")
+
+            self._thread = threading.Thread(target=run, name='columnar-build', daemon=True)
+            self._thread.start()
+
+    #
+    # Build the first snapshot in the background; later ones follow catalog version changes
+    #
+    def start(self, app):
+        if not self.is_available():
+            print("numpy is not installed; paged filter and sort queries use SQL only")
+            return
+        self._app = app
+        self.refresh_in_background()
+
+
+columnar_catalog = ColumnarCatalog()
@@ -3,12 +3,153 @@ import os
      Config.py
      This file contains configuration settings and mappings for the movie app, including:
      - TMDB API key retrieval
+     - TMDB HTTP client settings (base URL, timeouts, retries, pool size, next-page prefetch)
+     - TMDB transport selection (live, record, replay, fake) and fake-server settings
+     - TMDB rate-limit settings (token bucket split across workers and per-priority maximum waits)
+     - TMDB circuit-breaker and stale-response settings
+     - Shared on-disk TMDB response cache settings (path, per-endpoint TTLs)
+     - Movie-detail cache settings (size, TTL) and batch hydration concurrency
+     - Local-first lookup settings for the movies table
+     - Now-playing snapshot refresh interval
+     - Full-text search ranking weights and the typeahead index settings
+     - The in-memory columnar catalog used for paged filter and sort queries
+     - The sort-rank tables behind paged sorted listings (rebuild interval and chunk size)
+     - The catalog-versioned response cache for local catalog endpoints (size, version check age)
+     - Chunk size for the streaming catalog endpoints and batch size for the bulk importer
+     - Whether the app upgrades the database schema when it starts
+     - TMDb change-feed catalog sync settings (interval, concurrency, batch size)
      - Genre ID to name mappings (genre_dict)
      - Genre name to ID mappings (genre_dict_rev)
+     - Genre name to bit mappings for the movies.genre_mask column (genre_bits)
 '''
 # Retrieve TMDB API key from environment variable, with a default fallback key
 TMDB_api = os.environ.get('TMDB_KEY', '454688fc07a43e24f8dd4952f05c413f')
 
+# Shared TMDB HTTP client settings (see routes/TMDb.py)
+TMDB_BASE_URL = os.environ.get('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+TMDB_CONNECT_TIMEOUT = float(os.environ.get('TMDB_CONNECT_TIMEOUT', 3.05))
+TMDB_READ_TIMEOUT = float(os.environ.get('TMDB_READ_TIMEOUT', 8))
+TMDB_RETRIES = int(os.environ.get('TMDB_RETRIES', 2))
+TMDB_POOL_SIZE = int(os.environ.get('TMDB_POOL_SIZE', 20))
+
+# How TMDB requests are sent (see routes/Transport.py):
+#   live   - real HTTP to TMDB_BASE_URL
+#   record - live, and every exchange is appended to TMDB_CASSETTE
+#   replay - answered from TMDB_CASSETTE, no network
+#   fake   - an in-process fake TMDB server (fake_tmdb.py)
+TMDB_TRANSPORT = os.environ.get('TMDB_TRANSPORT', 'live')
+TMDB_CASSETTE = os.environ.get('TMDB_CASSETTE', 'tmdb_cassette.jsonl')
+FAKE_TMDB_PAGES = int(os.environ.get('FAKE_TMDB_PAGES', 10))
+FAKE_TMDB_LATENCY_MS = float(os.environ.get('FAKE_TMDB_LATENCY_MS', 0))
+FAKE_TMDB_ERROR_RATE = float(os.environ.get('FAKE_TMDB_ERROR_RATE', 0))
+
+# Opt-in speculative prefetch of page N+1 for browse endpoints, parked for TMDB_PREFETCH_TTL seconds
+TMDB_PREFETCH = os.environ.get('TMDB_PREFETCH', 'no') == 'yes'
+TMDB_PREFETCH_TTL = float(os.environ.get('TMDB_PREFETCH_TTL', 60))
+TMDB_PREFETCH_WORKERS = int(os.environ.get('TMDB_PREFETCH_WORKERS', 2))
+
+# Token bucket shared by all TMDB requests in a worker (see routes/RateLimit.py). TMDb limits the API key,
+# so TMDB_RATE_LIMIT and TMDB_RATE_BURST are the budget of the whole deployment: each worker gets
+# 1/TMDB_WORKERS of it. TMDB_WORKERS defaults to gunicorn's WEB_CONCURRENCY; set it to the number of
+# workers across all hosts that share the key
+TMDB_RATE_LIMIT = float(os.environ.get('TMDB_RATE_LIMIT', 40))   # requests per second
+TMDB_RATE_BURST = float(os.environ.get('TMDB_RATE_BURST', 40))
+TMDB_WORKERS = max(int(os.environ.get('TMDB_WORKERS', os.environ.get('WEB_CONCURRENCY', 1))), 1)
+# Longest each priority lane waits for a token: critical, interactive, background
+TMDB_LANE_MAX_WAIT = (
+    float(os.environ.get('TMDB_CRITICAL_MAX_WAIT', 10)),
+    float(os.environ.get('TMDB_INTERACTIVE_MAX_WAIT', 3)),
+    float(os.environ.get('TMDB_BACKGROUND_MAX_WAIT', 0.5)),
+)
+
+# Circuit breaker: open after this many consecutive failures (calls slower than
+# TMDB_BREAKER_SLOW_SECONDS count as failures) and probe again after TMDB_BREAKER_OPEN_SECONDS
+TMDB_BREAKER_FAILURES = int(os.environ.get('TMDB_BREAKER_FAILURES', 5))
+TMDB_BREAKER_SLOW_SECONDS = float(os.environ.get('TMDB_BREAKER_SLOW_SECONDS', 2.5))
+TMDB_BREAKER_OPEN_SECONDS = float(os.environ.get('TMDB_BREAKER_OPEN_SECONDS', 30))
+# Last known good responses kept for serving while TMDB is failing
+TMDB_STALE_SIZE = int(os.environ.get('TMDB_STALE_SIZE', 2048))
+TMDB_STALE_TTL = float(os.environ.get('TMDB_STALE_TTL', 24 * 3600))
+
+# On-disk TMDB response cache shared by every worker on the host ('' disables it, see routes/DiskCache.py)
+TMDB_DISK_CACHE = os.environ.get('TMDB_DISK_CACHE', 'tmdb_cache.sqlite3')
+# Expired entries are kept this much longer, to serve while one worker refreshes them or TMDB is down
+TMDB_DISK_CACHE_GRACE = float(os.environ.get('TMDB_DISK_CACHE_GRACE', 24 * 3600))
+# Freshness per endpoint, in seconds
+TMDB_DISK_TTLS = {
+    '/movie/{id}': float(os.environ.get('TMDB_DISK_TTL_DETAILS', 24 * 3600)),
+    '/discover/movie': float(os.environ.get('TMDB_DISK_TTL_DISCOVER', 3600)),
+    '/movie/popular': float(os.environ.get('TMDB_DISK_TTL_POPULAR', 3600)),
+    '/search/movie': float(os.environ.get('TMDB_DISK_TTL_SEARCH', 6 * 3600)),
+    '/movie/now_playing': float(os.environ.get('TMDB_DISK_TTL_NOW_PLAYING', 1800)),
+}
+
+# In-process cache of normalized /movie/{id} cards (see movie_cache in routes/Utils.py)
+MOVIE_CACHE_SIZE = int(os.environ.get('MOVIE_CACHE_SIZE', 1024))
+MOVIE_CACHE_TTL = float(os.environ.get('MOVIE_CACHE_TTL', 3600))
+
+# Maximum concurrent TMDb detail requests for one batch hydration (see hydrate_movies in routes/Utils.py).
+# Every batch in a worker shares one pool of TMDB_POOL_SIZE threads
+TMDB_HYDRATE_CONCURRENCY = int(os.environ.get('TMDB_HYDRATE_CONCURRENCY', 8))
+
+# Serve movie details from the local movies table before asking TMDb (see routes/Catalog.py).
+# Rows refreshed more than LOCAL_MOVIE_MAX_AGE seconds ago are re-fetched and written back.
+LOCAL_FIRST_LOOKUP = os.environ.get('LOCAL_FIRST_LOOKUP', 'no') == 'yes'
+LOCAL_MOVIE_MAX_AGE = float(os.environ.get('LOCAL_MOVIE_MAX_AGE', 7 * 24 * 3600))
+
+# Seconds between background refreshes of the now-playing snapshot (routes/NowPlaying.py); 0 disables it
+NOW_PLAYING_REFRESH = float(os.environ.get('NOW_PLAYING_REFRESH', 600))
+
+# Full-text /movies/search ranking (routes/Search.py): column weights for relevance, how strongly
+# log(1 + popularity) is blended in, and how many best text matches are re-ranked with it
+SEARCH_TITLE_WEIGHT = float(os.environ.get('SEARCH_TITLE_WEIGHT', 10))
+SEARCH_OVERVIEW_WEIGHT = float(os.environ.get('SEARCH_OVERVIEW_WEIGHT', 1))
+SEARCH_POPULARITY_WEIGHT = float(os.environ.get('SEARCH_POPULARITY_WEIGHT', 0.3))
+SEARCH_CANDIDATES = int(os.environ.get('SEARCH_CANDIDATES', 200))
+
+# In-memory /movies/autocomplete index (routes/Typeahead.py): built from the movies table at startup
+# unless TYPEAHEAD_INDEX=no; keeps the TYPEAHEAD_BUCKET_SIZE most popular titles per word prefix of
+# up to TYPEAHEAD_MAX_PREFIX characters
+TYPEAHEAD_INDEX = os.environ.get('TYPEAHEAD_INDEX', 'yes') == 'yes'
+TYPEAHEAD_BUCKET_SIZE = int(os.environ.get('TYPEAHEAD_BUCKET_SIZE', 32))
+TYPEAHEAD_MAX_PREFIX = int(os.environ.get('TYPEAHEAD_MAX_PREFIX', 8))
+
+# In-memory columnar copy of the movies table (routes/Columnar.py) answering the paged filter and sort
+# endpoints; needs numpy and is skipped without it, or with COLUMNAR_CATALOG=no
+COLUMNAR_CATALOG = os.environ.get('COLUMNAR_CATALOG', 'yes') == 'yes'
+
+# Rank tables for /sort_movies_V2 pages (routes/SortRanks.py): checked every SORT_RANKS_INTERVAL seconds
+# and rebuilt when the catalog version moved (0 disables them; pages are then read through the indexes)
+SORT_RANKS_INTERVAL = float(os.environ.get('SORT_RANKS_INTERVAL', 60))
+# Positions written (or cleared) per transaction of a rebuild, so session writes never wait on a whole key
+SORT_RANKS_CHUNK = int(os.environ.get('SORT_RANKS_CHUNK', 20000))
+
+# Responses of the local catalog endpoints cached per catalog version (routes/ResponseCache.py), unless
+# RESPONSE_CACHE=no. The version is re-read from the database at most every RESPONSE_CACHE_VERSION_AGE
+# seconds, so other workers' writes show within that delay (this worker's own writes at once)
+RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'yes') == 'yes'
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 2048))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+RESPONSE_CACHE_VERSION_AGE = float(os.environ.get('RESPONSE_CACHE_VERSION_AGE', 1))
+
+# Rows fetched and sent per chunk by the streaming catalog endpoints (/sort_movies, /filter_movies)
+CATALOG_STREAM_CHUNK = int(os.environ.get('CATALOG_STREAM_CHUNK', 1000))
+
+# TMDb change-feed sync of the movies table (routes/CatalogSync.py): runs every CATALOG_SYNC_INTERVAL
+# seconds (0 disables it), fetching changed movies CATALOG_SYNC_CONCURRENCY at a time and writing them
+# CATALOG_SYNC_BATCH per transaction. The first run looks CATALOG_SYNC_INITIAL_DAYS back
+CATALOG_SYNC_INTERVAL = float(os.environ.get('CATALOG_SYNC_INTERVAL', 0))
+CATALOG_SYNC_CONCURRENCY = int(os.environ.get('CATALOG_SYNC_CONCURRENCY', 4))
+CATALOG_SYNC_BATCH = int(os.environ.get('CATALOG_SYNC_BATCH', 200))
+CATALOG_SYNC_INITIAL_DAYS = int(os.environ.get('CATALOG_SYNC_INITIAL_DAYS', 1))
+
+# Rows committed per transaction by the bulk catalog importer (import_catalog.py)
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 20000))
+
+# Upgrade the database schema (migrations.py) in create_app. Multi-worker deployments should set
+# MIGRATE_ON_START=no and run `python migrations.py` once as a deploy step instead
+MIGRATE_ON_START = os.environ.get('MIGRATE_ON_START', 'yes') == 'yes'
+
 # Mapping from TMDB genre IDs to genre names
 genre_dict = {
     28: "Action",
@@ -52,4 +193,7 @@ genre_dict_rev = {
     "Thriller": 53,
     "War": 10752,
     "Western": 37
-}
\ No newline at end of file
+}
+# Bit of each genre in movies.genre_mask (see routes/Catalog.py). Bits follow genre_dict's order,
+# so new genres must be appended there; reordering it would invalidate stored masks
+genre_bits = {name: 1 << position for position, name in enumerate(genre_dict.values())}
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+'''
+    DiskCache.py
+
+    This file provides the persistent TMDb response cache shared by every gunicorn worker on a host.
+    It handles:
+    - zlib-compressed response bodies stored in a local SQLite file (WAL mode, safe across processes)
+    - Per-entry freshness, with expired entries kept for a grace period
+    - A refresh lease so only one worker re-fetches an expired entry while the others keep serving it
+    - Hit / miss / write counters for monitoring
+    A broken or locked cache file never fails a request: errors are counted and treated as misses.
+'''
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    fresh_until REAL NOT NULL,
+    keep_until REAL NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0
+)
+'''
+
+PRUNE_EVERY = 500  # writes between sweeps of entries past their grace period
+
+
+class DiskCache:
+    def __init__(self, path, grace=24 * 3600.0, lease_seconds=30.0):
+        self.path = path
+        self.grace = grace
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready_pid = None  # process that has set up the file (WAL mode, schema)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    #
+    # One connection per thread and process; sqlite3 connections must not cross forks or threads.
+    # WAL mode is stored in the file, so it and the schema are set up once per process
+    #
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        pid = os.getpid()
+        if conn is None or self._local.pid != pid:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if self._ready_pid != pid:
+                with self._lock:
+                    if self._ready_pid != pid:
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.execute(_SCHEMA)
+                        self._ready_pid = pid
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    #
+    # Return (body, fresh) for a key, or (None, False) if it is missing or past its grace period
+    #
+    def get(self, key):
+        now = time.time()
+        try:
+            row = self._connection().execute(
+                'SELECT body, fresh_until FROM responses WHERE key = ? AND keep_until > ?', (key, now)
+            ).fetchone()
+        except sqlite3.Error:
+            self._count('errors')
+            return None, False
+        if row is None:
+            self._count('misses')
+            return None, False
+        fresh = row[1] > now
+        self._count('hits' if fresh else 'stale_hits')
+        return zlib.decompress(row[0]), fresh
+
+    def set(self, key, body, ttl):
+        now = time.time()
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO responses (key, body, fresh_until, keep_until, lease_until) '
+                'VALUES (?, ?, ?, ?, 0)',
+                (key, zlib.compress(body), now + ttl, now + ttl + self.grace),
+            )
+        except sqlite3.Error:
+            self._count('errors')
+            return
+        self._count('writes')
+        if self.writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    #
+    # Claim the right to refresh an expired entry; False means another worker already holds it
+    #
+    def claim(self, key):
+        now = time.time()
+        try:
+            cursor = self._connection().execute(
+                'UPDATE responses SET lease_until = ? WHERE key = ? AND lease_until <= ?',
+                (now + self.lease_seconds, key, now),
+            )
+        except sqlite3.Error:
+            self._count('errors')
+            return True
+        return cursor.rowcount > 0
+
+    def prune(self):
+        try:
+            self._connection().execute('DELETE FROM responses WHERE keep_until <= ?', (time.time(),))
+        except sqlite3.Error:
+            self._count('errors')
+
+    def clear(self):
+        try:
+            self._connection().execute('DELETE FROM responses')
+        except sqlite3.Error:
+            self._count('errors')
+        with self._lock:
+            self.hits = self.stale_hits = self.misses = self.writes = self.errors = 0
+
+    def stats(self):
+        try:
+            size = self._connection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'path': self.path,
+                'size': size,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
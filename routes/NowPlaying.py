@@ -0,0 +1,124 @@
+import threading
+import time
+
+from routes.Config import genre_dict
+from routes.TMDb import get_json
+from routes.RateLimit import BACKGROUND
+
+'''
+    NowPlaying.py
+
+    This file keeps an in-memory snapshot of TMDb's US now-playing list.
+    It handles:
+    - Walking every now_playing page in a background thread on a fixed interval
+    - Building genre, language and release-year indexes over the snapshot
+    - Answering the same filters as get_filtered_now_playing from memory
+'''
+
+
+class NowPlayingCatalog:
+    def __init__(self, max_age=None):
+        self.max_age = max_age  # seconds before a snapshot is considered too old to serve
+        # (movies, by_genre, by_language, by_year); the indexes map a lower-cased genre name,
+        # an original_language or a release year to the set of positions in movies
+        self._snapshot = ([], {}, {}, {})
+        self.refreshed_at = None
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    #
+    # Fetch every now-playing page and swap in a freshly indexed snapshot
+    #
+    def refresh(self):
+        with self._refresh_lock:
+            movies, seen = [], set()
+            current_page, total_pages = 1, 1
+            while current_page <= total_pages:
+                data = get_json('/movie/now_playing', {'language': 'en-US', 'page': current_page, 'region': 'US'},
+                                priority=BACKGROUND)
+                total_pages = data.get('total_pages', 1)
+                for movie in data.get('results', []):
+                    if movie.get('id') in seen:
+                        continue
+                    seen.add(movie.get('id'))
+                    movies.append(movie)
+                current_page += 1
+
+            by_genre, by_language, by_year = {}, {}, {}
+            for position, movie in enumerate(movies):
+                for gid in movie.get('genre_ids', []):
+                    by_genre.setdefault(genre_dict.get(gid, "Unknown").lower(), set()).add(position)
+                by_language.setdefault(movie.get('original_language'), set()).add(position)
+                try:
+                    year = int((movie.get('release_date') or '').split('-')[0])
+                except ValueError:
+                    continue
+                by_year.setdefault(year, set()).add(position)
+
+            # Publish all indexes at once; readers grab a consistent tuple
+            self._snapshot = (movies, by_genre, by_language, by_year)
+            self.refreshed_at = time.time()
+            return len(movies)
+
+    def is_ready(self):
+        if self.refreshed_at is None:
+            return False
+        return self.max_age is None or time.time() - self.refreshed_at <= self.max_age
+
+    def stats(self):
+        return {
+            'movies': len(self._snapshot[0]),
+            'age_seconds': round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None,
+            'ready': self.is_ready(),
+        }
+
+    #
+    # Filter the snapshot exactly like get_filtered_now_playing; None when no usable snapshot exists
+    #
+    def query(self, page, genres, language, release_year, per_page=12):
+        if not self.is_ready():
+            return None
+        movies, by_genre, by_language, by_year = self._snapshot
+
+        candidates = None
+        if genres:
+            # A filter genre matches any genre name that contains it (case-insensitive)
+            wanted = [g.lower() for g in genres]
+            candidates = set()
+            for name, positions in by_genre.items():
+                if any(g in name for g in wanted):
+                    candidates |= positions
+        if language:
+            positions = by_language.get(language, set())
+            candidates = positions if candidates is None else candidates & positions
+        if release_year:
+            positions = by_year.get(release_year, set())
+            candidates = positions if candidates is None else candidates & positions
+
+        start_index = (page - 1) * per_page
+        if candidates is None:
+            return movies[start_index:start_index + per_page]
+        return [movies[position] for position in sorted(candidates)[start_index:start_index + per_page]]
+
+    #
+    # Start the background refresh loop (idempotent)
+    #
+    def start(self, interval):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.max_age is None:
+            self.max_age = interval * 3
+
+        def run():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as exc:
+                    print(f"Now-playing refresh failed: {exc}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name='now-playing-refresh', daemon=True)
+        self._thread.start()
+
+
+now_playing_catalog = NowPlayingCatalog()
@@ -0,0 +1,116 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+'''
+    RateLimit.py
+
+    This file provides the quota-aware scheduler that gates every upstream TMDb request.
+    It handles:
+    - A token bucket sized to TMDb's request-rate limit
+    - Priority lanes: session-critical before interactive browse before prefetch/background work
+    - Pausing all lanes when TMDb answers 429 with a Retry-After header
+'''
+
+# Priority lanes, lowest number first
+CRITICAL = 0      # session flow, e.g. final_movie hydration
+INTERACTIVE = 1   # user-facing browse and search
+BACKGROUND = 2    # prefetch and snapshot refreshes
+
+LANE_NAMES = ('critical', 'interactive', 'background')
+
+
+class TMDbThrottled(requests.RequestException):
+    """Raised when a request cannot get a token within its lane's maximum wait."""
+
+
+#
+# Parse a Retry-After header (delta-seconds or HTTP date) into seconds
+#
+def parse_retry_after(value, default=1.0):
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class RequestScheduler:
+    def __init__(self, rate, burst, max_waits):
+        self.rate = float(rate)              # tokens added per second
+        self.capacity = float(burst)         # bucket size
+        self.max_waits = tuple(max_waits)    # seconds each lane may wait for a token
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiting = [0] * len(LANE_NAMES)
+        self._cond = threading.Condition()
+        self._granted = [0] * len(LANE_NAMES)
+        self._rejected = [0] * len(LANE_NAMES)
+        self._retry_after_events = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    #
+    # Block until the lane may send one request; raises TMDbThrottled after the lane's max wait
+    #
+    def acquire(self, priority=INTERACTIVE):
+        deadline = time.monotonic() + self.max_waits[priority]
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    higher_waiting = any(self._waiting[lane] for lane in range(priority))
+                    if now >= self._blocked_until and self._tokens >= 1 and not higher_waiting:
+                        self._tokens -= 1
+                        self._granted[priority] += 1
+                        return
+
+                    if now >= deadline:
+                        self._rejected[priority] += 1
+                        raise TMDbThrottled(f'TMDb quota exhausted for {LANE_NAMES[priority]} requests')
+
+                    if now < self._blocked_until:
+                        wait = self._blocked_until - now
+                    elif self._tokens < 1:
+                        wait = (1 - self._tokens) / self.rate
+                    else:
+                        wait = 0.05  # a higher lane is queued; re-check once it is served
+                    self._cond.wait(min(wait, deadline - now))
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    #
+    # TMDb answered 429: stop granting tokens to every lane until Retry-After has passed
+    #
+    def penalize(self, retry_after):
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._tokens = 0.0
+            self._retry_after_events += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                'rate': self.rate,
+                'tokens': round(self._tokens, 2),
+                'blocked_for': round(max(self._blocked_until - time.monotonic(), 0.0), 3),
+                'retry_after_events': self._retry_after_events,
+                'granted': dict(zip(LANE_NAMES, self._granted)),
+                'rejected': dict(zip(LANE_NAMES, self._rejected)),
+                'waiting': dict(zip(LANE_NAMES, self._waiting)),
+            }
@@ -0,0 +1,102 @@
+import functools
+import hashlib
+
+from flask import Response, make_response, request
+
+from routes.Cache import TTLCache
+from routes.Catalog import catalog_version, recent_catalog_version
+from routes.Config import RESPONSE_CACHE, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_VERSION_AGE
+
+'''
+    ResponseCache.py
+
+    This file caches the responses of local catalog endpoints until the catalog changes.
+    It handles:
+    - Keying responses by endpoint, normalized query parameters and the catalog version
+    - Strong ETags derived from that key, so a matching If-None-Match gets a 304 before the view runs
+    - Replaying cached bodies (and their X-Next-Cursor header) without querying or serializing again
+    - Leaving errors, streamed responses and requests the view marks as uncacheable alone
+'''
+
+# Response headers stored and replayed with a cached body
+_KEPT_HEADERS = ('X-Next-Cursor',)
+
+
+class ResponseCache(TTLCache):
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize, ttl)
+        self.not_modified = 0
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        super().clear()
+        self.not_modified = 0
+
+    def stats(self):
+        stats = super().stats()
+        stats['not_modified'] = self.not_modified
+        return stats
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+#
+# Endpoint and query parameters; parameter order does not matter, the order of repeated values does
+#
+def _request_key():
+    return request.path, tuple(sorted((name, tuple(values)) for name, values in request.args.lists()))
+
+
+def _etag(version, key):
+    return hashlib.sha256(repr((version, key)).encode('utf-8')).hexdigest()[:32]
+
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # clients keep the body but revalidate each time
+    return response
+
+
+#
+# Decorator for GET views whose response depends only on the query parameters and the movies table.
+# skip_if, called per request, marks requests answered from elsewhere (e.g. TMDb)
+#
+def catalog_cached(skip_if=None):
+    """
+    The ETag is a hash of the version and the request, not of the body, so
+    it is known before the view runs: a revalidation is answered with a
+    304, and a repeated request with the stored bytes, using the version
+    remembered by recent_catalog_version() and no database query.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not RESPONSE_CACHE or (skip_if is not None and skip_if()):
+                return view(*args, **kwargs)
+
+            key = _request_key()
+            version = recent_catalog_version(RESPONSE_CACHE_VERSION_AGE)
+            etag = _etag(version, key)
+            if request.if_none_match.contains_weak(etag):
+                response_cache.count_not_modified()
+                return _with_etag(Response(status=304), etag)
+            cached = response_cache.get((version, key))
+            if cached is not None:
+                body, mimetype, headers = cached
+                return _with_etag(Response(body, mimetype=mimetype, headers=headers), etag)
+
+            # Read the version before the view's queries, so a body is never labelled with a version
+            # newer than the data it was built from
+            version = catalog_version()
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            headers = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+            response_cache.set((version, key), (response.get_data(), response.mimetype, headers))
+            return _with_etag(response, _etag(version, key))
+        return wrapper
+    return decorator
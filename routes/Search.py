@@ -0,0 +1,207 @@
+import math
+import re
+import weakref
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from extentions import db
+from model import Movie
+from routes.Config import (SEARCH_TITLE_WEIGHT, SEARCH_OVERVIEW_WEIGHT, SEARCH_POPULARITY_WEIGHT,
+                           SEARCH_CANDIDATES)
+from routes.Catalog import card_select, fetch_cards, movies_table
+
+'''
+    Search.py
+
+    This file provides full-text title/overview search over the local movies table.
+    It handles:
+    - The full-text index: an FTS5 table kept in sync by triggers on SQLite,
+      a FULLTEXT index on MySQL; created with the movies table and by migrations.py,
+      dropped and rebuilt around bulk loads (import_catalog.py)
+    - Turning user input into a safe prefix query (the last word may be half typed)
+    - Ranking by text relevance (title weighted above overview) blended with popularity
+    - Falling back to a plain ILIKE scan where no full-text index is available
+'''
+
+FTS_TABLE = 'movies_fts'
+MYSQL_FULLTEXT_INDEX = 'ft_movies_title_overview'
+
+_SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, overview, content='movies', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON movies BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, overview) VALUES (new.id, new.title, new.overview); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON movies BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, overview) "
+    f"VALUES ('delete', old.id, old.title, old.overview); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF id, title, overview ON movies BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, overview) "
+    f"VALUES ('delete', old.id, old.title, old.overview); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, overview) VALUES (new.id, new.title, new.overview); END",
+)
+
+_SQLITE_DROP = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+# Engine -> its full-text backend, looked up once (see search_backend)
+_backends = weakref.WeakKeyDictionary()
+
+
+#
+# Which full-text backend the connected database has: 'fts5', 'mysql' or None
+#
+def search_backend(connection):
+    """
+    Inspected once per engine. ensure_search_index and drop_search_index
+    forget the answer; a search whose index was dropped by another process
+    forgets it too (see search_cards).
+    """
+    engine = connection.engine
+    if engine not in _backends:
+        _backends[engine] = _inspect_backend(connection)
+    return _backends[engine]
+
+
+def _inspect_backend(connection):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        return 'fts5' if inspect(connection).has_table(FTS_TABLE) else None
+    if dialect in ('mysql', 'mariadb'):
+        indexes = inspect(connection).get_indexes('movies')
+        return 'mysql' if any(index['name'] == MYSQL_FULLTEXT_INDEX for index in indexes) else None
+    return None
+
+
+#
+# Create the full-text index if it is missing and fill it from the existing rows. Returns True if created
+#
+def ensure_search_index(connection):
+    _backends.pop(connection.engine, None)
+    if _inspect_backend(connection) is not None:
+        return False
+    dialect = connection.dialect.name
+    try:
+        if dialect == 'sqlite':
+            for statement in _SQLITE_DDL:
+                connection.execute(text(statement))
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        elif dialect in ('mysql', 'mariadb'):
+            connection.execute(text(
+                f'ALTER TABLE movies ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} (title, overview)'
+            ))
+        else:
+            return False
+    except DBAPIError:
+        return False  # e.g. SQLite built without FTS5; search falls back to ILIKE
+    return True
+
+
+#
+# Remove the full-text index (and its triggers), e.g. before a bulk load; ensure_search_index rebuilds it
+#
+def drop_search_index(connection):
+    _backends.pop(connection.engine, None)
+    backend = _inspect_backend(connection)
+    if connection.dialect.name == 'sqlite':
+        for statement in _SQLITE_DROP:
+            connection.execute(text(statement))
+    elif backend == 'mysql':
+        connection.execute(text(f'ALTER TABLE movies DROP INDEX {MYSQL_FULLTEXT_INDEX}'))
+
+
+@event.listens_for(Movie.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    ensure_search_index(connection)
+
+
+@event.listens_for(Movie.__table__, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        drop_search_index(connection)
+
+
+#
+# Words of the user's input; the last one is matched as a prefix since it may still be typed
+#
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _fts5_query(terms):
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _mysql_query(terms):
+    return ' '.join(f'+{term}' for term in terms[:-1]) + f' +{terms[-1]}*'
+
+
+#
+# Blend text relevance (higher is better) with popularity on a log scale
+#
+def _blended(relevance, popularity):
+    return relevance + SEARCH_POPULARITY_WEIGHT * math.log1p(max(popularity or 0.0, 0.0))
+
+
+#
+# Search titles (and overviews) and return at most limit cards, best match first
+#
+def search_cards(query, fields, limit=10):
+    """
+    Rank full-text matches by relevance blended with popularity. Only the best
+    SEARCH_CANDIDATES matches by relevance are re-ranked, so popularity can
+    reorder strong matches but never pulls in a weak one from further down.
+    Without a full-text index, falls back to the old title ILIKE scan.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    connection = db.session.connection()
+    backend = search_backend(connection)
+    if backend is None:
+        return fetch_cards(card_select(fields).where(Movie.title.ilike(f'%{query}%')).limit(limit))
+
+    columns = ', '.join(f'movies.{field}' for field in dict.fromkeys(tuple(fields) + ('id', 'popularity')))
+    if backend == 'fts5':
+        sql = (f'SELECT {columns}, -bm25({FTS_TABLE}, :title_weight, :overview_weight) AS relevance '
+               f'FROM {FTS_TABLE} JOIN movies ON movies.id = {FTS_TABLE}.rowid '
+               f'WHERE {FTS_TABLE} MATCH :match ORDER BY relevance DESC LIMIT :candidates')
+        params = {'title_weight': SEARCH_TITLE_WEIGHT, 'overview_weight': SEARCH_OVERVIEW_WEIGHT,
+                  'candidates': SEARCH_CANDIDATES}
+        # Common words match a large share of overviews and every match has to be scored, so
+        # titles (far fewer tokens, and weighted higher anyway) are searched first and
+        # overviews only when titles alone do not fill the page
+        matches = ['{title} : ' + _fts5_query(terms), _fts5_query(terms)]
+    else:
+        sql = (f'SELECT {columns}, MATCH (title, overview) AGAINST (:match IN BOOLEAN MODE) AS relevance '
+               f'FROM movies WHERE MATCH (title, overview) AGAINST (:match IN BOOLEAN MODE) '
+               f'ORDER BY relevance DESC LIMIT :candidates')
+        params = {'candidates': SEARCH_CANDIDATES}
+        matches = [_mysql_query(terms)]
+
+    typed = text(sql).columns(**{field: movies_table.c[field].type for field in fields})
+    rows = {}
+    try:
+        for match in matches:
+            for row in connection.execute(typed, dict(params, match=match)).mappings():
+                rows.setdefault(row['id'], dict(row))
+            if len(rows) >= limit:
+                break
+    except DBAPIError:
+        # Another process (e.g. import_catalog.py) dropped the index since it was looked up
+        _backends.pop(connection.engine, None)
+        if search_backend(connection) == backend:
+            raise
+        return search_cards(query, fields, limit)
+
+    ranked = sorted(rows.values(), key=lambda row: _blended(row['relevance'], row['popularity']), reverse=True)
+    return [{field: row[field] for field in fields} for row in ranked[:limit]]
@@ -0,0 +1,114 @@
+import json
+from datetime import date
+
+from flask import Response, stream_with_context
+
+from routes.Config import genre_dict
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder produces the same JSON
+    orjson = None
+
+'''
+    Serializers.py
+
+    This file is the single place movie cards are built and encoded for our endpoints.
+    It handles:
+    - The eight-field movie card for TMDb list results and TMDb /movie/{id} details
+    - Encoding straight to bytes with orjson when it is installed (stdlib json otherwise)
+    - Building Flask JSON responses from those bytes without going through jsonify
+    - Streaming large card lists chunk by chunk as a JSON array or as NDJSON
+'''
+
+CARD_FIELDS = ('id', 'title', 'genres', 'original_language', 'overview', 'popularity',
+               'release_date', 'poster_path')
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+#
+# Encode a payload to JSON bytes; dates become ISO strings
+#
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+#
+# Return payload as an application/json response
+#
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+#
+# Encode chunks (lists of cards) as one JSON array, sent piece by piece
+#
+def iter_json_array(chunks):
+    yield b'['
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        body = dumps(chunk)[1:-1]  # the chunk's items without its brackets
+        yield body if first else b',' + body
+        first = False
+    yield b']'
+
+
+#
+# Encode chunks as newline-delimited JSON, one card per line
+#
+def iter_ndjson(chunks):
+    for chunk in chunks:
+        if chunk:
+            yield b''.join(dumps(card) + b'\n' for card in chunk)
+
+
+#
+# Stream chunks of cards as a JSON array, or as NDJSON with fmt='ndjson'
+#
+def streamed_response(chunks, fmt='json'):
+    if fmt == 'ndjson':
+        return Response(stream_with_context(iter_ndjson(chunks)), mimetype='application/x-ndjson')
+    return Response(stream_with_context(iter_json_array(chunks)), mimetype='application/json')
+
+
+#
+# Movie card for a TMDb list result (discover, popular, search, now_playing)
+#
+def tmdb_card(movie):
+    genre_names = [genre_dict.get(gid, 'Unknown') for gid in movie.get('genre_ids', [])]
+    return {
+        'id': movie.get('id'),
+        'title': movie.get('title'),
+        'genres': '-'.join(genre_names) if genre_names else 'Unknown',
+        'original_language': movie.get('original_language'),
+        'overview': movie.get('overview'),
+        'popularity': movie.get('popularity'),
+        'release_date': movie.get('release_date'),
+        'poster_path': movie.get('poster_path')
+    }
+
+
+#
+# Movie card for a TMDb /movie/{id} response, whose genres are objects instead of ids
+#
+def tmdb_details_card(movie):
+    genre_names = [genre['name'] for genre in movie.get('genres', [])]
+    return {
+        'id': movie.get('id'),
+        'title': movie.get('title'),
+        'genres': '-'.join(genre_names) if genre_names else 'Unknown',
+        'original_language': movie.get('original_language'),
+        'overview': movie.get('overview'),
+        'popularity': movie.get('popularity'),
+        'release_date': movie.get('release_date'),
+        'poster_path': movie.get('poster_path')
+    }
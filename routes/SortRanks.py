@@ -0,0 +1,203 @@
+import threading
+import time
+
+from sqlalchemy import func, literal, select, true
+
+from extentions import db
+from model import MovieSortRank
+from routes.Catalog import (CATALOG_VERSION, card_select, catalog_version, claim_checkpoint, cursor_columns,
+                            cursor_segments, fetch_cards, finish_page, load_checkpoint, load_checkpoint_values,
+                            movies_table, renew_claim, save_checkpoint)
+from routes.Config import SORT_RANKS_CHUNK
+
+'''
+    SortRanks.py
+
+    This file materializes the sorted listings of the movies table as rank tables.
+    It handles:
+    - Numbering every movie by its position in (popularity | release_date | title, id) order,
+      NULLs first, exactly as page_cards() orders them, into a shadow slot in bounded chunks
+    - Answering page N of a sorted listing, either direction, as a primary-key range of positions
+    - Recording with each sort key the catalog version it was built from, so out-of-date ranks are never read
+    - Rebuilding out-of-date keys on an interval in a background thread, one worker at a time
+'''
+
+SORT_KEYS = ('popularity', 'release_date', 'title')
+CLAIM_NAME = 'sort_ranks'
+
+ranks_table = MovieSortRank.__table__
+
+
+def _checkpoint_name(sort_by):
+    return f'{CLAIM_NAME}:{sort_by}'
+
+
+#
+# The sort_by value of the ranks readers use for a key; checkpoints saved before slots existed mean the key itself
+#
+def _live_slot(sort_by, saved):
+    return saved.get('slot', sort_by)
+
+
+class SortRanks:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.rebuilds = 0
+        self.hits = 0
+        self.fallbacks = 0
+        self.last_rebuild_at = None
+        self.last_error = None
+
+    #
+    # Renumber the keys whose ranks are older than the catalog (needs an app context). Returns the keys rebuilt
+    #
+    def rebuild(self, keys=SORT_KEYS):
+        """
+        Each key has two slots in the table (its own name and '<key>:shadow').
+        The slot readers are not using is cleared and renumbered in
+        transactions of SORT_RANKS_CHUNK positions, so the write lock is
+        never held for a whole key. Readers switch slots when the checkpoint
+        naming the new slot, its catalog version and row count commits. A
+        catalog change during the rebuild leaves the new ranks labelled with
+        the version they started from, so they are not read and the next run
+        renumbers the key again.
+        """
+        rebuilt = []
+        for sort_by in keys:
+            version = catalog_version(db.session.connection())
+            saved = load_checkpoint(_checkpoint_name(sort_by))
+            if saved is not None and saved['version'] == version:
+                db.session.rollback()
+                continue
+
+            slot = f'{sort_by}:shadow' if saved is not None and _live_slot(sort_by, saved) == sort_by else sort_by
+            self._clear(slot)
+            rows = self._number(slot, sort_by)
+            save_checkpoint(_checkpoint_name(sort_by), {'version': version, 'rows': rows, 'slot': slot})
+            db.session.commit()
+            rebuilt.append(sort_by)
+
+        with self._lock:
+            self.rebuilds += len(rebuilt)
+            self.last_rebuild_at = time.time()
+        return rebuilt
+
+    #
+    # Delete a slot's positions, SORT_RANKS_CHUNK per transaction
+    #
+    def _clear(self, slot):
+        in_slot = ranks_table.c.sort_by == slot
+        last = db.session.execute(select(func.max(ranks_table.c.position)).where(in_slot)).scalar()
+        for low in range(0, (last if last is not None else -1) + 1, SORT_RANKS_CHUNK):
+            db.session.execute(ranks_table.delete().where(
+                in_slot, ranks_table.c.position >= low, ranks_table.c.position < low + SORT_RANKS_CHUNK
+            ))
+            renew_claim(CLAIM_NAME)
+            db.session.commit()
+
+    #
+    # Number every movie into an empty slot in (sort_by, id) order, SORT_RANKS_CHUNK per transaction;
+    # each chunk continues after the last row of the previous one. Returns the number of rows
+    #
+    def _number(self, slot, sort_by):
+        column = movies_table.c[sort_by]
+        rows, last = 0, None
+        while True:
+            written = 0
+            for segment in [true()] if last is None else cursor_segments(column, True, *last):
+                chunk = (select(column, movies_table.c.id).where(segment)
+                         .order_by(column.asc(), movies_table.c.id.asc())
+                         .limit(SORT_RANKS_CHUNK - written).subquery())
+                position = func.row_number().over(order_by=(chunk.c[sort_by].asc(), chunk.c.id.asc()))
+                written += db.session.execute(ranks_table.insert().from_select(
+                    ['sort_by', 'position', 'movie_id'],
+                    select(literal(slot), position + (rows + written - 1), chunk.c.id),
+                )).rowcount
+                if written == SORT_RANKS_CHUNK:
+                    break
+            rows += written
+            if written:
+                last = tuple(db.session.execute(
+                    select(column, movies_table.c.id)
+                    .select_from(ranks_table.join(movies_table, movies_table.c.id == ranks_table.c.movie_id))
+                    .where(ranks_table.c.sort_by == slot, ranks_table.c.position == rows - 1)
+                ).one())
+            renew_claim(CLAIM_NAME)
+            db.session.commit()
+            if written < SORT_RANKS_CHUNK:
+                return rows
+
+    #
+    # One page of cards ordered by (sort_by, id), like page_cards() without a cursor; None if the ranks are
+    # missing or older than the catalog
+    #
+    def page(self, fields, *, sort_by, order='asc', page=1, per_page=12):
+        if sort_by not in SORT_KEYS:
+            return None
+        checkpoints = load_checkpoint_values((CATALOG_VERSION, _checkpoint_name(sort_by)))
+        saved = checkpoints.get(_checkpoint_name(sort_by))
+        if saved is None or saved['version'] != checkpoints.get(CATALOG_VERSION):
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        # per_page + 1 positions, the extra one telling whether there is a next page
+        ascending = order != 'desc'
+        skip = (page - 1) * per_page
+        if ascending:
+            low, high = skip, skip + per_page
+        else:
+            high = saved['rows'] - 1 - skip
+            low = high - per_page
+        extra = cursor_columns(fields, sort_by)
+        stmt = (
+            card_select(tuple(fields) + tuple(extra))
+            .select_from(ranks_table.join(movies_table, movies_table.c.id == ranks_table.c.movie_id))
+            .where(ranks_table.c.sort_by == _live_slot(sort_by, saved), ranks_table.c.position.between(low, high))
+            .order_by(ranks_table.c.position.asc() if ascending else ranks_table.c.position.desc())
+        )
+        cards = fetch_cards(stmt)
+
+        cards, next_cursor = finish_page(cards, extra, sort_by=sort_by, order=order, per_page=per_page)
+        with self._lock:
+            self.hits += 1
+        return cards, next_cursor
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rebuilds': self.rebuilds,
+                'hits': self.hits,
+                'fallbacks': self.fallbacks,
+                'last_rebuild_at': self.last_rebuild_at,
+                'last_error': self.last_error,
+            }
+
+    #
+    # Start the background rebuild loop (idempotent)
+    #
+    def start(self, app, interval):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while True:
+                with app.app_context():
+                    try:
+                        if claim_checkpoint(CLAIM_NAME, interval / 2):
+                            rebuilt = self.rebuild()
+                            if rebuilt:
+                                print(f"Sort ranks rebuilt for {', '.join(rebuilt)}")
+                        self.last_error = None
+                    except Exception as exc:
+                        db.session.rollback()
+                        self.last_error = str(exc)
+                        print(f"Sort rank rebuild failed: {exc}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name='sort-ranks', daemon=True)
+        self._thread.start()
+
+
+sort_ranks = SortRanks()
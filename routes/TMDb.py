@@ -0,0 +1,523 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import g, has_request_context
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from routes.Config import (TMDB_api, TMDB_BASE_URL, TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT,
+                           TMDB_RETRIES, TMDB_POOL_SIZE, TMDB_PREFETCH, TMDB_PREFETCH_TTL,
+                           TMDB_PREFETCH_WORKERS, TMDB_RATE_LIMIT, TMDB_RATE_BURST, TMDB_WORKERS, TMDB_LANE_MAX_WAIT,
+                           TMDB_BREAKER_FAILURES, TMDB_BREAKER_SLOW_SECONDS, TMDB_BREAKER_OPEN_SECONDS,
+                           TMDB_STALE_SIZE, TMDB_STALE_TTL, TMDB_TRANSPORT, TMDB_CASSETTE,
+                           FAKE_TMDB_PAGES, FAKE_TMDB_LATENCY_MS, FAKE_TMDB_ERROR_RATE,
+                           TMDB_DISK_CACHE, TMDB_DISK_CACHE_GRACE, TMDB_DISK_TTLS)
+from routes.Cache import TTLCache
+from routes.DiskCache import DiskCache
+from routes.RateLimit import RequestScheduler, TMDbThrottled, parse_retry_after, INTERACTIVE, BACKGROUND
+from routes.Breaker import CircuitBreaker, TMDbUnavailable
+from routes.Transport import LiveTransport, RecordingTransport, ReplayTransport
+
+'''
+    TMDb.py
+
+    This file provides the single HTTP client that every outbound TMDb call goes through.
+    It handles:
+    - One pooled, keep-alive requests.Session per worker process
+    - A pluggable transport (live, record, replay or a local fake server, see TMDB_TRANSPORT)
+    - Uniform connect/read timeouts and retries with backoff on transient errors
+    - Counters for requests, opened connections and time spent on TCP/TLS handshakes,
+      so the latency saved by connection reuse can be measured
+    - Single-flight coalescing: concurrent identical requests in a worker share one upstream call
+    - A persistent on-disk response cache shared by all workers on the host, with per-endpoint TTLs
+    - Opt-in speculative prefetch of the next page for paginated browse queries
+    - Priority-aware rate limiting through the shared RequestScheduler, honoring Retry-After on 429
+    - A circuit breaker that fails fast during TMDb outages and serves the last known good
+      response (marked stale) instead, refreshing it in the background once TMDb recovers
+'''
+
+_stats_lock = threading.Lock()
+_stats = {
+    'requests': 0,
+    'connections_opened': 0,
+    'handshake_seconds': 0.0,
+    'request_seconds': 0.0,
+    'coalesced': 0,
+    'prefetch_issued': 0,
+    'prefetch_hits': 0,
+    'stale_served': 0,
+}
+
+
+def _record(key, value=1):
+    with _stats_lock:
+        _stats[key] += value
+
+
+#
+# urllib3 connection classes that time connect() (TCP + TLS handshake)
+#
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _record('connections_opened')
+        _record('handshake_seconds', time.perf_counter() - started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _record('connections_opened')
+        _record('handshake_seconds', time.perf_counter() - started)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+# Statuses _fetch retries (with backoff, each attempt taking its own scheduler token); 429 is handled apart
+RETRY_STATUSES = (500, 502, 503, 504)
+RETRY_BACKOFF = 0.3
+
+
+#
+# Build a new pooled session for both schemes. urllib3 only retries failed connects, which never reach
+# TMDb; anything TMDb answered is retried by _fetch so that it is rate limited like the first attempt
+#
+def _build_session():
+    retry = Retry(
+        total=TMDB_RETRIES,
+        read=0,
+        status=0,
+        backoff_factor=0.3,
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = _TimedAdapter(pool_connections=4, pool_maxsize=TMDB_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+#
+# Return this worker's session; a new one is built after a fork so that
+# gunicorn workers never share sockets with the master process
+#
+def get_session():
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def _build_transport():
+    if TMDB_TRANSPORT == 'replay':
+        return ReplayTransport(TMDB_CASSETTE)
+    if TMDB_TRANSPORT == 'record':
+        return RecordingTransport(TMDB_BASE_URL, get_session, TMDB_CASSETTE)
+    if TMDB_TRANSPORT == 'fake':
+        from fake_tmdb import FakeTMDb
+        fake = FakeTMDb(pages=FAKE_TMDB_PAGES, latency=FAKE_TMDB_LATENCY_MS / 1000,
+                        error_rate=FAKE_TMDB_ERROR_RATE)
+        return LiveTransport(fake.start(), get_session)
+    return LiveTransport(TMDB_BASE_URL, get_session)
+
+
+#
+# Return the transport selected by TMDB_TRANSPORT, built on first use in each worker
+#
+def get_transport():
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = _build_transport()
+    return _transport
+
+
+#
+# Swap the transport at runtime (tests, benchmarks); None goes back to TMDB_TRANSPORT
+#
+def set_transport(transport):
+    global _transport
+    with _transport_lock:
+        _transport = transport
+
+
+#
+# Normalized identity of a TMDb request: the path plus its sorted parameters (api_key excluded)
+#
+def request_key(path, params=None):
+    return (path, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items() if k != 'api_key')))
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+        self.stale = False
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Per-thread details of the last call (network time, whether a stale copy was served)
+_local = threading.local()
+
+
+# Every upstream request takes a token from this scheduler first; this worker's share of the key's budget
+scheduler = RequestScheduler(TMDB_RATE_LIMIT / TMDB_WORKERS, max(TMDB_RATE_BURST / TMDB_WORKERS, 1.0),
+                             TMDB_LANE_MAX_WAIT)
+
+# Raw bodies of speculatively fetched next pages, keyed by request_key
+prefetch_cache = TTLCache(maxsize=256, ttl=TMDB_PREFETCH_TTL)
+
+# Last known good raw body per request_key, served while TMDb is failing
+last_good = TTLCache(maxsize=TMDB_STALE_SIZE, ttl=TMDB_STALE_TTL)
+# Responses shared by every worker on the host; survives restarts and deploys
+disk_cache = DiskCache(TMDB_DISK_CACHE, grace=TMDB_DISK_CACHE_GRACE) if TMDB_DISK_CACHE else None
+
+_pending_refresh = {}  # request_key -> (path, params) served stale, refreshed once TMDb recovers
+_pending_lock = threading.Lock()
+
+_background_executor = None
+_background_pid = None
+
+
+#
+# Small per-worker pool for prefetches and stale revalidation
+#
+def _submit_background(fn):
+    global _background_executor, _background_pid
+    pid = os.getpid()
+    if _background_executor is None or _background_pid != pid:
+        _background_executor = ThreadPoolExecutor(max_workers=TMDB_PREFETCH_WORKERS,
+                                                  thread_name_prefix='tmdb-background')
+        _background_pid = pid
+    _background_executor.submit(fn)
+
+
+#
+# Re-fetch everything that was served stale; runs when the circuit closes again
+#
+def _refresh_stale():
+    with _pending_lock:
+        pending = list(_pending_refresh.items())
+        _pending_refresh.clear()
+
+    for key, (path, params) in pending:
+        def refresh(key=key, path=path, params=params):
+            try:
+                _get_body(key, path, params, None, BACKGROUND)
+            except Exception:
+                pass  # still failing; the stale copy stays in last_good
+        _submit_background(refresh)
+
+
+breaker = CircuitBreaker(TMDB_BREAKER_FAILURES, TMDB_BREAKER_SLOW_SECONDS, TMDB_BREAKER_OPEN_SECONDS,
+                         on_close=_refresh_stale)
+
+
+#
+# GET a TMDb API path (e.g. '/movie/550') and return the decoded JSON body
+#
+def get_json(path, params=None, *, timeout=None, prefetch_next=False, priority=INTERACTIVE, cached=True):
+    """
+    Issue a GET against TMDb through the shared pooled session. The API key is
+    added automatically. Raises requests.RequestException (including HTTPError
+    for non-2xx responses) exactly like a bare requests.get would.
+
+    Identical requests (same request_key) that overlap in time are coalesced:
+    the first caller performs the upstream call and the others wait for it.
+    Every caller decodes its own copy of the body, so results can be mutated freely.
+
+    With prefetch_next=True (and TMDB_PREFETCH enabled) the same query with
+    page + 1 is fetched in the background and parked in prefetch_cache
+    until the first request for it.
+
+    priority selects the scheduler lane (CRITICAL, INTERACTIVE or BACKGROUND);
+    TMDbThrottled is raised when no token is available within that lane's wait.
+
+    cached=False skips the prefetch and disk caches on the way in (the fresh
+    body is still stored on the way out), for callers that know the cached copy is outdated.
+
+    When TMDb fails or the circuit breaker is open, the last known good body for
+    the same request is returned instead and the response is flagged as stale
+    (see last_response_stale); TMDbUnavailable is raised if there is none.
+    """
+    key = request_key(path, params)
+    # A prefetched page is handed out once, so each one counts at most one hit
+    body = prefetch_cache.pop(key) if TMDB_PREFETCH and cached else None
+    stale = False
+    if body is not None:
+        _record('prefetch_hits')
+    else:
+        body, stale = _get_body(key, path, params, timeout, priority, cached)
+
+    _local.stale = stale
+    if stale:
+        _record('stale_served')
+        mark_request_stale()
+
+    if prefetch_next and TMDB_PREFETCH:
+        _schedule_prefetch(path, params)
+    return json.loads(body)
+
+
+#
+# Whether the last get_json call on this thread was answered from the stale store
+#
+def last_response_stale():
+    return getattr(_local, 'stale', False)
+
+
+#
+# Flag the current request as answered from stale TMDb data (a no-op outside a request).
+# Work done on pool threads has no request: callers check last_response_stale() there and flag it here
+#
+def mark_request_stale():
+    if has_request_context():
+        g.tmdb_stale = True
+
+
+#
+# after_request hook for blueprints serving TMDb data: flag responses built from the last known good data
+#
+def mark_stale_response(response):
+    if g.get('tmdb_stale'):
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['X-TMDb-Stale'] = 'true'
+    return response
+
+
+#
+# Return (raw body, stale) for a request, sharing one upstream call between concurrent identical requests
+#
+def _get_body(key, path, params, timeout, priority, cached=True):
+    # Uncached callers only share a call with each other, never with one answered from the disk cache
+    inflight_key = key if cached else ('uncached',) + key
+    with _inflight_lock:
+        call = _inflight.get(inflight_key)
+        leader = call is None
+        if leader:
+            call = _inflight[inflight_key] = _InFlight()
+
+    if not leader:
+        _record('coalesced')
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.body, call.stale
+
+    try:
+        call.body, call.stale = _load(key, path, params, timeout, priority, cached)
+        return call.body, call.stale
+    except BaseException as exc:
+        call.error = exc
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[inflight_key]
+        call.done.set()
+
+
+#
+# Disk-cache freshness for a path, or None for endpoints that are not cached on disk
+#
+def _disk_ttl(path):
+    return TMDB_DISK_TTLS.get(re.sub(r'^/movie/\d+$', '/movie/{id}', path))
+
+
+#
+# Answer from the shared disk cache when possible, otherwise fetch upstream and store the result.
+# An expired entry is refreshed by one worker (whoever claims it); the others keep serving it meanwhile.
+#
+def _load(key, path, params, timeout, priority, use_cache=True):
+    ttl = _disk_ttl(path)
+    if disk_cache is None or ttl is None:
+        return _guarded_fetch(key, path, params, timeout, priority)
+
+    disk_key = json.dumps(key)
+    cached, fresh = disk_cache.get(disk_key) if use_cache else (None, False)
+    if cached is not None and (fresh or not disk_cache.claim(disk_key)):
+        return cached, False
+
+    try:
+        body, stale = _guarded_fetch(key, path, params, timeout, priority)
+    except requests.HTTPError as exc:
+        status = exc.response.status_code if exc.response is not None else 500
+        if cached is None or (status < 500 and status != 429):
+            raise
+        return cached, True
+    except requests.RequestException:
+        if cached is None:
+            raise
+        return cached, True
+    if not stale:
+        disk_cache.set(disk_key, body, ttl)
+    return body, stale
+
+
+#
+# Fetch page + 1 of a paginated query in the background unless it is already cached or in flight
+#
+def _schedule_prefetch(path, params):
+    try:
+        page = int((params or {}).get('page', 1))
+    except (TypeError, ValueError):
+        return
+    if page >= 500:  # TMDb never serves pages past 500
+        return
+
+    next_params = dict(params or {}, page=page + 1)
+    next_key = request_key(path, next_params)
+    if next_key in prefetch_cache or next_key in _inflight:
+        return
+
+    def prefetch():
+        try:
+            body, stale = _get_body(next_key, path, next_params, None, BACKGROUND)
+            if not stale:
+                prefetch_cache.set(next_key, body)
+        except Exception:
+            pass  # a failed speculation is simply not cached
+
+    _record('prefetch_issued')
+    _submit_background(prefetch)
+
+
+#
+# Call TMDb through the circuit breaker; on upstream failure fall back to the last known good body
+#
+def _guarded_fetch(key, path, params, timeout, priority):
+    if not breaker.allow():
+        return _serve_stale(key, path, params, TMDbUnavailable('TMDb circuit breaker is open'))
+
+    _local.elapsed = 0.0
+    try:
+        body = _fetch(path, params, timeout, priority)
+    except TMDbThrottled:
+        breaker.cancel()
+        raise
+    except requests.HTTPError as exc:
+        status = exc.response.status_code if exc.response is not None else 500
+        if status < 500 and status != 429:
+            # TMDb is healthy, the request itself was rejected (e.g. unknown movie id)
+            breaker.record_success(getattr(_local, 'elapsed', 0.0))
+            raise
+        breaker.record_failure()
+        return _serve_stale(key, path, params, exc)
+    except requests.RequestException as exc:
+        breaker.record_failure()
+        return _serve_stale(key, path, params, exc)
+
+    breaker.record_success(getattr(_local, 'elapsed', 0.0))
+    last_good.set(key, body)
+    return body, False
+
+
+def _serve_stale(key, path, params, error):
+    body = last_good.get(key)
+    if body is None:
+        raise error
+    with _pending_lock:
+        if len(_pending_refresh) < 256:
+            _pending_refresh[key] = (path, dict(params or {}))
+    return body, True
+
+
+#
+# Perform the upstream GET and return the raw response body. A 429 pauses the
+# scheduler for Retry-After and the request is retried once if its lane can wait that long.
+# A 5xx is retried up to TMDB_RETRIES times with backoff; every attempt takes a token.
+#
+def _fetch(path, params, timeout, priority=INTERACTIVE):
+    query = dict(params or {})
+    query['api_key'] = TMDB_api
+    throttled = False
+    retries = 0
+    while True:
+        scheduler.acquire(priority)
+        started = time.perf_counter()
+        try:
+            response = get_transport().get(path, query, timeout or (TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT))
+        finally:
+            _local.elapsed = time.perf_counter() - started
+            _record('requests')
+            _record('request_seconds', _local.elapsed)
+
+        if response.status_code == 429:
+            scheduler.penalize(parse_retry_after(response.headers.get('Retry-After')))
+            if not throttled:
+                throttled = True
+                continue
+        elif response.status_code in RETRY_STATUSES and retries < TMDB_RETRIES:
+            time.sleep(RETRY_BACKOFF * 2 ** retries)
+            retries += 1
+            continue
+        response.raise_for_status()
+        return response.content
+
+
+#
+# Snapshot of the client counters, including the estimated handshake time saved by reuse
+#
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    opened = stats['connections_opened']
+    reused = max(stats['requests'] - opened, 0)
+    avg_handshake = stats['handshake_seconds'] / opened if opened else 0.0
+    stats['connections_reused'] = reused
+    stats['avg_handshake_ms'] = round(avg_handshake * 1000, 3)
+    stats['saved_handshake_ms'] = round(reused * avg_handshake * 1000, 3)
+    stats['saved_handshake_ms_per_request'] = (
+        round(stats['saved_handshake_ms'] / stats['requests'], 3) if stats['requests'] else 0.0
+    )
+    stats['prefetch_hit_rate'] = (
+        round(stats['prefetch_hits'] / stats['prefetch_issued'], 4) if stats['prefetch_issued'] else 0.0
+    )
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0 if isinstance(_stats[key], int) else 0.0
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+import requests
+
+'''
+    Transport.py
+
+    This file provides the pluggable transports that routes/TMDb.py sends requests through.
+    It handles:
+    - live: real HTTP through the pooled session (also used for the local fake TMDb server)
+    - record: live HTTP that appends every exchange to a JSON-lines cassette
+    - replay: answers requests from a cassette without any network access
+    Cassettes never contain the api_key parameter.
+'''
+
+
+class CassetteMiss(requests.HTTPError):
+    """
+    Raised in replay mode for a request the cassette has no recording of.
+    It carries a 404 response, so the circuit breaker treats it like TMDb
+    rejecting one request rather than as an outage.
+    """
+
+
+#
+# Cassette key for a request: the path plus its sorted parameters without api_key
+#
+def cassette_key(path, params):
+    return json.dumps([path, sorted([str(k), str(v)] for k, v in (params or {}).items() if k != 'api_key')])
+
+
+class LiveTransport:
+    name = 'live'
+
+    def __init__(self, base_url, session_factory):
+        self.base_url = base_url
+        self.session_factory = session_factory
+
+    def get(self, path, params, timeout):
+        return self.session_factory().get(f"{self.base_url}{path}", params=params, timeout=timeout)
+
+
+class RecordingTransport(LiveTransport):
+    name = 'record'
+
+    def __init__(self, base_url, session_factory, cassette_path):
+        super().__init__(base_url, session_factory)
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+
+    def get(self, path, params, timeout):
+        response = super().get(path, params, timeout)
+        entry = {
+            'key': cassette_key(path, params),
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() in ('content-type', 'retry-after')},
+            'body': response.text,
+        }
+        with self._lock, open(self.cassette_path, 'a', encoding='utf-8') as cassette:
+            cassette.write(json.dumps(entry) + '\n')
+        return response
+
+
+class ReplayTransport:
+    name = 'replay'
+
+    def __init__(self, cassette_path):
+        self.cassette_path = cassette_path
+        self.entries = {}
+        if os.path.exists(cassette_path):
+            with open(cassette_path, encoding='utf-8') as cassette:
+                for line in cassette:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['key']] = entry  # the latest recording wins
+
+    def get(self, path, params, timeout):
+        entry = self.entries.get(cassette_key(path, params))
+        if entry is None:
+            message = f'No recorded TMDb response for {path} {params}'
+            missing = {'status': 404, 'headers': {'Content-Type': 'application/json'},
+                       'body': json.dumps({'status_message': message})}
+            raise CassetteMiss(message, response=_response(path, missing))
+        return _response(path, entry)
+
+
+#
+# A requests.Response built from a cassette entry
+#
+def _response(path, entry):
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.headers.update(entry['headers'])
+    response._content = entry['body'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = path
+    return response
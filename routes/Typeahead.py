@@ -0,0 +1,350 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session as OrmSession, object_session
+
+from extentions import db
+from model import Movie
+from routes.Config import TYPEAHEAD_BUCKET_SIZE, TYPEAHEAD_MAX_PREFIX
+
+'''
+    Typeahead.py
+
+    This file keeps an in-process prefix index over movie titles for /movies/autocomplete.
+    It handles:
+    - Normalizing titles (case, accents, punctuation) into words
+    - Keeping, for every word prefix, the most popular movies whose title has such a word
+    - Building the index from the movies table at startup, in a background thread
+    - Applying committed inserts, updates and deletes of movies incrementally (ORM flushes and upsert_movies)
+    - Rebuilding in the background when the catalog version moves (imports, other workers' writes)
+    - Answering a prefix query from memory, without touching the movies table
+'''
+
+_WORD = re.compile(r'\w+')
+
+# Seconds a catalog version read is trusted for before query() checks it again
+VERSION_CHECK_AGE = 1
+# A query word's candidates are intersected in while it has at most this many times the movies left;
+# past that, checking each remaining title directly is cheaper than building the word's candidate set
+INTERSECT_RATIO = 8
+
+
+#
+# Lower-case, accent-free words of a title or query
+#
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _WORD.findall(stripped.lower())
+
+
+class TypeaheadIndex:
+    def __init__(self, bucket_size=TYPEAHEAD_BUCKET_SIZE, max_prefix=TYPEAHEAD_MAX_PREFIX):
+        self.bucket_size = bucket_size
+        self.max_prefix = max_prefix
+        # movie id -> (title, popularity, words)
+        self._movies = {}
+        # word prefix -> [(-popularity, id)] sorted, at most bucket_size long
+        self._buckets = {}
+        # word prefix -> how many movies have it, to tell a complete bucket from a truncated one
+        self._counts = {}
+        # word cut to max_prefix -> ids of the movies with such a word, and those keys in sorted order
+        # (None until first needed), to refill truncated buckets and answer what they cannot
+        self._keys = {}
+        self._sorted_keys = None
+        # prefixes whose truncated bucket lost a movie; refilled from _keys on their next query
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._building = None  # commits seen while a build runs, replayed onto the new index
+        self.version = None
+        self.built_at = None
+        self._app = None
+        self._thread = None
+
+    def _prefixes(self, words):
+        prefixes = set()
+        for word in words:
+            for length in range(1, min(len(word), self.max_prefix) + 1):
+                prefixes.add(word[:length])
+        return prefixes
+
+    def _insert(self, movie_id, title, popularity):
+        words = normalize(title)
+        self._movies[movie_id] = (title, popularity, words)
+        entry = (-(popularity or 0.0), movie_id)
+        for prefix in self._prefixes(words):
+            self._counts[prefix] = self._counts.get(prefix, 0) + 1
+            bucket = self._buckets.setdefault(prefix, [])
+            if len(bucket) < self.bucket_size or entry < bucket[-1]:
+                bisect.insort(bucket, entry)
+                del bucket[self.bucket_size:]
+        for key in {word[:self.max_prefix] for word in words}:
+            ids = self._keys.get(key)
+            if ids is None:
+                ids = self._keys[key] = set()
+                if self._sorted_keys is not None:
+                    bisect.insort(self._sorted_keys, key)
+            ids.add(movie_id)
+
+    def _remove(self, movie_id):
+        old = self._movies.pop(movie_id, None)
+        if old is None:
+            return
+        entry = (-(old[1] or 0.0), movie_id)
+        for prefix in self._prefixes(old[2]):
+            self._counts[prefix] -= 1
+            bucket = self._buckets[prefix]
+            if entry in bucket:
+                bucket.remove(entry)
+                # Movies cut from a full bucket may now belong in it
+                if self._counts[prefix] > len(bucket):
+                    self._stale.add(prefix)
+            if not self._counts[prefix]:
+                del self._counts[prefix], self._buckets[prefix]
+                self._stale.discard(prefix)
+        for key in {word[:self.max_prefix] for word in old[2]}:
+            ids = self._keys[key]
+            ids.discard(movie_id)
+            if not ids:
+                del self._keys[key]
+                if self._sorted_keys is not None:
+                    del self._sorted_keys[bisect.bisect_left(self._sorted_keys, key)]
+
+    #
+    # Ids of the movies with a title word starting with `word` (call with the lock held)
+    #
+    def _candidates(self, word):
+        if len(word) >= self.max_prefix:
+            return self._keys.get(word[:self.max_prefix], set())
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self._keys)
+        ids = set()
+        for position in range(bisect.bisect_left(self._sorted_keys, word), len(self._sorted_keys)):
+            key = self._sorted_keys[position]
+            if not key.startswith(word):
+                break
+            ids.update(self._keys[key])
+        return ids
+
+    #
+    # Ids of the movies that may match every word (call with the lock held): the candidate sets of the most
+    # selective words intersected, stopping once a word has many more movies than are left to check
+    #
+    def _matching_ids(self, words):
+        ids = None
+        for word in sorted(words, key=lambda word: self._counts.get(word[:self.max_prefix], 0)):
+            if ids is not None and self._counts.get(word[:self.max_prefix], 0) > INTERSECT_RATIO * len(ids):
+                break
+            candidates = self._candidates(word)
+            ids = candidates if ids is None else ids & candidates
+        return ids
+
+    def _top(self, ids, words, count):
+        entries = []
+        for movie_id in ids:
+            title, popularity, title_words = self._movies[movie_id]
+            if all(any(title_word.startswith(word) for title_word in title_words) for word in words):
+                entries.append((-(popularity or 0.0), movie_id))
+        return heapq.nsmallest(count, entries)
+
+    #
+    # Add or replace movies given as (id, title, popularity) tuples; a None title removes the movie.
+    # version_change is the (before, after) catalog versions of the commit that wrote them, if any
+    #
+    def add_many(self, movies, version_change=None):
+        with self._lock:
+            if self._building is not None:
+                self._building.append((movies, version_change))
+            self._apply(movies, version_change)
+
+    def _apply(self, movies, version_change):
+        for movie_id, title, popularity in movies:
+            self._remove(movie_id)
+            if title is not None:
+                self._insert(movie_id, title, popularity)
+        # A commit from this worker moving the catalog on from the index's own version: the index has
+        # seen every write up to it, so it is current at the new version and needs no rebuild
+        if version_change is not None and self.version == version_change[0]:
+            self.version = version_change[1]
+
+    #
+    # Rebuild the whole index from the movies table (needs an app context)
+    #
+    def build(self):
+        """
+        The catalog version is read in the same transaction as the titles,
+        so the index is never labelled newer than its contents. Commits
+        applied while the build runs are replayed onto the new index.
+        """
+        from routes.Catalog import catalog_version  # routes.Catalog imports this module
+
+        with self._lock:
+            self._building = []
+        fresh = TypeaheadIndex(self.bucket_size, self.max_prefix)
+        try:
+            connection = db.session.connection()
+            version = catalog_version(connection)
+            result = connection.execute(
+                select(Movie.id, Movie.title, Movie.popularity), execution_options={'yield_per': 5000}
+            )
+            for movie_id, title, popularity in result:
+                fresh._insert(movie_id, title, popularity)
+            db.session.rollback()  # release the read transaction
+        except BaseException:
+            with self._lock:
+                self._building = None
+            raise
+
+        count = len(fresh._movies)
+        with self._lock:
+            pending, self._building = self._building, None
+            self._movies, self._buckets, self._counts = fresh._movies, fresh._buckets, fresh._counts
+            self._keys, self._sorted_keys, self._stale = fresh._keys, None, set()
+            self.version = version
+            for movies, version_change in pending:
+                self._apply(movies, version_change)
+            self.built_at = time.time()
+        return count
+
+    def is_ready(self):
+        return self.built_at is not None
+
+    #
+    # Top `limit` movies by popularity with a title word starting with every query word; None if not built
+    #
+    def query(self, text, limit=10):
+        """
+        Answered from the most selective word's bucket when it holds the
+        whole answer: it is complete, or `limit` matches were found in it
+        (anything cut from it is less popular). Otherwise, for words longer
+        than max_prefix or combinations rare among that bucket's movies,
+        the candidate sets of the selective words are intersected and only
+        the movies left are checked.
+        """
+        if not self.is_ready():
+            return None
+        self._check_version()
+        words = normalize(text)
+        if not words:
+            return []
+
+        keys = [word[:self.max_prefix] for word in words]
+        key = min(keys, key=lambda prefix: self._counts.get(prefix, 0))
+        if key in self._stale:
+            with self._lock:
+                if key in self._stale and key in self._buckets:
+                    self._buckets[key] = self._top(self._candidates(key), (key,), self.bucket_size)
+                self._stale.discard(key)
+
+        entries = []
+        bucket = list(self._buckets.get(key, ()))
+        for entry in bucket:
+            movie = self._movies.get(entry[1])
+            if movie is not None and all(any(title_word.startswith(word) for title_word in movie[2])
+                                         for word in words):
+                entries.append(entry)
+                if len(entries) == limit:
+                    break
+        if len(entries) < limit and self._counts.get(key, 0) > len(bucket):
+            with self._lock:
+                entries = self._top(self._matching_ids(words), words, limit)
+
+        results = []
+        for _, movie_id in entries:
+            movie = self._movies.get(movie_id)
+            if movie is not None:
+                results.append({'id': movie_id, 'title': movie[0], 'popularity': movie[1]})
+        return results
+
+    #
+    # Rebuild in the background once the catalog has moved past the version the index was built from
+    #
+    def _check_version(self):
+        from routes.Catalog import recent_catalog_version
+
+        if self._app is not None and recent_catalog_version(VERSION_CHECK_AGE) != self.version:
+            self.refresh_in_background()
+
+    def stats(self):
+        return {
+            'movies': len(self._movies),
+            'prefixes': len(self._buckets),
+            'ready': self.is_ready(),
+            'built_at': self.built_at,
+        }
+
+    #
+    # Rebuild in a background thread unless one is already running (needs start() to have been called)
+    #
+    def refresh_in_background(self):
+        with self._lock:
+            if self._app is None or (self._thread is not None and self._thread.is_alive()):
+                return
+
+            def run():
+                with self._app.app_context():
+                    try:
+                        count = self.build()
+                        print(f"Typeahead index built with {count} movies")
+                    except Exception as exc:
+                        print(f"Typeahead index build failed: {exc}")
+
+            self._thread = threading.Thread(target=run, name='typeahead-build', daemon=True)
+            self._thread.start()
+
+    #
+    # Build the index in the background; later builds follow catalog version changes
+    #
+    def start(self, app):
+        self._app = app
+        self.refresh_in_background()
+
+
+typeahead_index = TypeaheadIndex()
+
+
+#
+# Incremental updates: remember movies written in a flush, apply them once the transaction commits
+#
+def _remember(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('typeahead_pending', []).append((target.id, target.title, target.popularity))
+
+
+def _forget(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('typeahead_pending', []).append((target.id, None, None))
+
+
+event.listen(Movie, 'after_insert', _remember)
+event.listen(Movie, 'after_update', _remember)
+event.listen(Movie, 'after_delete', _forget)
+
+
+#
+# Movies written with Core statements (e.g. upsert_movies) are queued here instead
+#
+def queue_for_commit(session, movies):
+    session.info.setdefault('typeahead_pending', []).extend(movies)
+
+
+@event.listens_for(OrmSession, 'after_commit')
+def _apply_pending(session):
+    from routes.Catalog import committed_version_change  # routes.Catalog imports this module
+
+    pending = session.info.pop('typeahead_pending', None)
+    version_change = committed_version_change(session)
+    if pending or version_change:
+        typeahead_index.add_many(pending or [], version_change)
+
+
+@event.listens_for(OrmSession, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('typeahead_pending', None)
@@ -1,6 +1,15 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-from routes.Config import TMDB_api, genre_dict, genre_dict_rev
-import requests
+from routes.Config import (genre_dict, genre_dict_rev, MOVIE_CACHE_SIZE, MOVIE_CACHE_TTL, TMDB_HYDRATE_CONCURRENCY,
+                           TMDB_POOL_SIZE)
+from routes.TMDb import get_json, last_response_stale, mark_request_stale
+from routes.Breaker import TMDbUnavailable
+from routes.RateLimit import INTERACTIVE
+from routes.Cache import TTLCache
+from routes.NowPlaying import now_playing_catalog
+from routes.Serializers import tmdb_card, tmdb_details_card
 
 '''
     Utils.py
@@ -10,6 +19,8 @@ import requests
     - Discovering movies with flexible filters (genres, language, release year, release date range)
     - Fetching and filtering now-playing movies with custom criteria
     - Fetching and formatting movies from TMDb Discover API for display
+    - Fetching single movie details through a TTL + LRU cache of normalized movie cards
+    - Hydrating many movie ids concurrently with bounded fan-out and partial-failure tolerance
     It also processes genre IDs into human-readable genre names for movie results.
 '''
 
@@ -26,11 +37,9 @@ def discover_movies(
     sort_by: str = "popularity",
     order: str = "desc",
     now_playing: bool = False,
+    prefetch_next: bool = False,
 ):
-    base_url = "https://api.themoviedb.org/3/discover/movie"
-
     params: dict[str, str | int | bool] = {
-        "api_key": TMDB_api,
         "include_adult": False,
         "include_video": False,
         "language": "en-US",
@@ -70,9 +79,7 @@ def discover_movies(
             params["release_date.gte"] = (today - timedelta(days=30)).isoformat()
 
     # --- Request ----------------------------------------------------------
-    response = requests.get(base_url, params=params, timeout=10)
-    response.raise_for_status()
-    data = response.json()
+    data = get_json("/discover/movie", params, prefetch_next=prefetch_next)
 
     # --- Post‑process genre IDs -> names ----------------------------------
     processed_results = []
@@ -94,22 +101,23 @@ def get_filtered_now_playing(page, genres, language, release_year, per_page=12):
     """
     Fetch now-playing movies from TMDb, apply additional filters (genres, language, release_year),
     and return a paginated list (per_page movies per page) of filtered movies.
+    Served from the in-memory now-playing snapshot when one is available.
     """
+    snapshot_results = now_playing_catalog.query(page, genres, language, release_year, per_page)
+    if snapshot_results is not None:
+        return snapshot_results
+
     filtered_results = []
-    tmdb_now_playing_url = "https://api.themoviedb.org/3/movie/now_playing"
     current_page = 1
     total_pages = None
 
     while True:
         params = {
-            'api_key': TMDB_api,
             'language': 'en-US',
             'page': current_page,
             'region': 'US'
         }
-        response = requests.get(tmdb_now_playing_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = get_json('/movie/now_playing', params)
         if total_pages is None:
             total_pages = data.get('total_pages', 1)
         now_playing_movies = data.get('results', [])
@@ -157,7 +165,6 @@ def get_filtered(page, genres, language, release_year, sort_by='popularity', ord
     genre_ids = [str(genre_dict_rev[g.strip()]) for g in genres if g.strip() in genre_dict_rev]
     # Build request parameters
     params = {
-        'api_key': TMDB_api,
         'with_genres': '|'.join(genre_ids),
         'with_genres_operator': 'or',
         'sort_by': f"{sort_by}.{order}",
@@ -168,22 +175,128 @@ def get_filtered(page, genres, language, release_year, sort_by='popularity', ord
     if language:
         params['with_original_language'] = language
 
-    response = requests.get("https://api.themoviedb.org/3/discover/movie", params=params)
-    response.raise_for_status()
-    data = response.json()
-
-    formatted_results = []
-    for movie in data.get('results', [])[:per_page]:
-        movie_genre_names = [genre_dict.get(gid, 'Unknown') for gid in movie.get('genre_ids', [])]
-        genres_str = '-'.join(movie_genre_names) if movie_genre_names else 'Unknown'
-        formatted_results.append({
-            'id': movie.get('id'),
-            'title': movie.get('title'),
-            'genres': genres_str,
-            'original_language': movie.get('original_language'),
-            'overview': movie.get('overview'),
-            'popularity': movie.get('popularity'),
-            'release_date': movie.get('release_date'),
-            'poster_path': movie.get('poster_path')
-        })
-    return formatted_results
\ No newline at end of file
+    data = get_json('/discover/movie', params)
+
+    formatted_results = [tmdb_card(movie) for movie in data.get('results', [])[:per_page]]
+    return formatted_results
+
+# Normalized /movie/{id} cards keyed by TMDb id, shared by every request in this worker
+movie_cache = TTLCache(maxsize=MOVIE_CACHE_SIZE, ttl=MOVIE_CACHE_TTL)
+
+#
+# Fetch a single movie card by TMDb id, served from movie_cache when possible
+#
+def get_movie_details(movie_id, priority=INTERACTIVE, fresh=False):
+    """
+    Return the normalized movie card for movie_id. Only fresh successful lookups
+    are cached; TMDb errors propagate as requests.RequestException. priority is
+    the TMDb scheduler lane used on a cache miss. fresh=True always asks TMDb
+    (for ids known to have changed) and raises TMDbUnavailable instead of
+    returning a stale copy.
+    """
+    return _movie_details(movie_id, priority, fresh)[0]
+
+
+#
+# get_movie_details plus whether the card came from stale TMDb data (movie_cache only holds fresh cards)
+#
+def _movie_details(movie_id, priority, fresh):
+    try:
+        key = int(movie_id)
+    except (TypeError, ValueError):
+        key = str(movie_id)
+
+    card = None if fresh else movie_cache.get(key)
+    stale = False
+    if card is None:
+        body = get_json(f'/movie/{movie_id}', {'language': 'en-US'}, priority=priority, cached=not fresh)
+        card = tmdb_details_card(body)
+        stale = last_response_stale()
+        if not stale:
+            movie_cache.set(key, card)
+        elif fresh:
+            raise TMDbUnavailable(f'TMDb is unavailable; only a stale copy of movie {movie_id} exists')
+    return dict(card), stale
+
+
+_DONE = object()
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+#
+# Per-process pool behind every hydrate_movies batch, as large as the TMDb connection pool
+#
+def _hydrate_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=TMDB_POOL_SIZE, thread_name_prefix='tmdb-hydrate')
+                _executor_pid = pid
+    return _executor
+
+
+#
+# Fetch many movie cards concurrently; failures are reported per id instead of aborting the batch
+#
+def hydrate_movies(movie_ids, max_workers=None, priority=INTERACTIVE, fresh=False):
+    """
+    Return (cards, failures, stale) for movie_ids. cards maps each
+    successfully fetched id to its movie card, failures maps each failed id
+    to the exception raised, and stale is the set of ids whose card was
+    served from the last known good TMDb data (those also flag the current
+    request as stale). Duplicate ids are fetched once and at most max_workers
+    (default TMDB_HYDRATE_CONCURRENCY) requests are in flight at a time, all
+    scheduled in the given TMDb priority lane. fresh is passed to get_movie_details.
+    """
+    unique_ids = list(dict.fromkeys(movie_ids))
+    cards, failures, stale = {}, {}, set()
+    if not unique_ids:
+        return cards, failures, stale
+
+    workers = min(max_workers or TMDB_HYDRATE_CONCURRENCY, len(unique_ids))
+    results = {}
+    if workers <= 1:
+        for movie_id in unique_ids:
+            results[movie_id] = _run(_movie_details, movie_id, priority, fresh)
+    else:
+        # `workers` tasks on the shared pool take ids off one queue, so this batch keeps at most that many in flight
+        queue = iter(unique_ids)
+        queue_lock = threading.Lock()
+
+        def drain():
+            while True:
+                with queue_lock:
+                    movie_id = next(queue, _DONE)
+                if movie_id is _DONE:
+                    return
+                results[movie_id] = _run(_movie_details, movie_id, priority, fresh)
+
+        for future in [_hydrate_executor().submit(drain) for _ in range(workers)]:
+            future.result()
+
+    for movie_id in unique_ids:
+        result, exc = results[movie_id]
+        if exc is not None:
+            failures[movie_id] = exc
+            continue
+        cards[movie_id], card_stale = result
+        if card_stale:
+            stale.add(movie_id)
+    # Pool threads have no request context, so the request is flagged here
+    if stale:
+        mark_request_stale()
+    return cards, failures, stale
+
+
+#
+# (fn(*args), None), or (None, the exception it raised)
+#
+def _run(fn, *args):
+    try:
+        return fn(*args), None
+    except Exception as exc:
+        return None, exc
@@ -2,10 +2,21 @@ from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from model import Movie
 from extentions import db
-from sqlalchemy import extract
-from routes.Config import TMDB_api,genre_dict
+from sqlalchemy import select
+from routes.Config import LOCAL_FIRST_LOOKUP
 import requests
-from routes.Utils import get_filtered_now_playing, get_filtered, discover_movies
+from routes.Utils import get_filtered_now_playing, get_filtered, discover_movies, get_movie_details, hydrate_movies, movie_cache
+from routes.TMDb import get_json, get_stats, scheduler, breaker, disk_cache, mark_stale_response
+from routes.Catalog import (get_movies_local_first, card_select, fetch_cards, stream_cards, page_cards,
+                            genre_filter, release_year_filter, InvalidCursor)
+from routes.NowPlaying import now_playing_catalog
+from routes.Search import search_cards
+from routes.Typeahead import typeahead_index
+from routes.CatalogSync import catalog_sync
+from routes.Columnar import columnar_catalog
+from routes.SortRanks import sort_ranks
+from routes.ResponseCache import catalog_cached, response_cache
+from routes.Serializers import json_response, streamed_response, tmdb_card, CARD_FIELDS
 from datetime import date
 movie_bp = Blueprint('movies', __name__)
 
@@ -15,10 +26,13 @@ movie_bp = Blueprint('movies', __name__)
     This file defines the Flask Blueprint routes for managing movie-related operations.
     It handles:
     - Searching for movies in the local database and via TMDb API
+    - Title autocomplete from the in-memory typeahead index
     - Retrieving detailed movie information by ID
     - Listing movies with pagination support
-    - Sorting and filtering movies based on various attributes
+    - Sorting and filtering movies based on various attributes (paged ones from the sort-rank tables
+      or the in-memory columnar catalog when they are current, SQL otherwise)
     - Combining filtering and sorting operations
+    - Caching local catalog responses per catalog version, with ETags for conditional GETs
     Utility functions and external TMDb API are used to enrich movie data retrieval.
 '''
 
@@ -26,31 +40,103 @@ movie_bp = Blueprint('movies', __name__)
 # ------------------------------- Movie Search Routes --------------------------------
 # Provides endpoints for searching movies either from the local database or TMDb API.
 #
+#
+# Flag responses that were answered from the last known good TMDb data while TMDb is failing
+#
+movie_bp.after_request(mark_stale_response)
+
+#
+# Card columns requested with ?fields=id,title,...; all of them by default, None if a name is unknown.
+# id is always included.
+#
+def requested_fields():
+    raw = request.args.get('fields')
+    if not raw:
+        return CARD_FIELDS
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    if any(field not in CARD_FIELDS for field in fields):
+        return None
+    return tuple(dict.fromkeys(['id'] + fields))
+
+#
+# Streaming body format: NDJSON with ?format=ndjson (or Accept: application/x-ndjson), else a JSON array
+#
+def requested_format():
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        return 'ndjson'
+    return 'json'
+
+#
+# Release-year range from ?release_year= or ?release_year_min=/release_year_max= (a missing bound
+# copies the other); None if no year was given. Raises ValueError for a reversed or impossible range
+#
+def requested_year_range():
+    release_year = request.args.get('release_year', type=int)
+    year_min = request.args.get('release_year_min', type=int)
+    year_max = request.args.get('release_year_max', type=int)
+    if year_min is None and year_max is None:
+        if not release_year:
+            return None
+        year_min = year_max = release_year
+    if year_min is None:
+        year_min = year_max
+    if year_max is None:
+        year_max = year_min
+    if year_min > year_max:
+        raise ValueError('`release_year_min` cannot be greater than `release_year_max`.')
+    if not 1 <= year_min <= year_max <= 9999:
+        raise ValueError('Release years must be between 1 and 9999.')
+    return year_min, year_max
+
+#
+# JSON page of cards; the cursor for the following page (if any) goes in the X-Next-Cursor header
+#
+def paged_response(cards, next_cursor):
+    response = json_response(cards)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
 '''--------------------------------------Movie Search-----------------------------------------------------'''
 #
-# Search movies in the local database (up to 10 matches)
+# Search movies in the local database (up to 10 best matches)
 #
 @movie_bp.route('/search', methods=['GET'])
 @cross_origin()
+@catalog_cached()
 def search_movies():
     query = request.args.get('query', '').strip()
     if not query:
-        return jsonify([])
-
-    movies = Movie.query.filter(Movie.title.ilike(f'%{query}%')).limit(10).all()
-    result = []
-    for movie in movies:
-        result.append({
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        })
-    return jsonify(result)
+        return json_response([])
+
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
+
+    # Full-text match on title and overview, ranked by relevance and popularity
+    result = search_cards(query, fields, limit=10)
+    return json_response(result)
+
+#
+# Title suggestions while typing: the most popular movies with a title word starting with each typed word
+#
+@movie_bp.route('/autocomplete', methods=['GET'])
+@cross_origin()
+def autocomplete_movies():
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 20)
+    if not query:
+        return json_response([])
+
+    # Answered from the in-memory index; until it has been built, a title prefix scan stands in
+    result = typeahead_index.query(query, limit)
+    if result is None:
+        stmt = (select(Movie.id, Movie.title, Movie.popularity)
+                .where(Movie.title.ilike(f'{query}%'))
+                .order_by(Movie.popularity.desc())
+                .limit(limit))
+        result = fetch_cards(stmt)
+    return json_response(result)
 
 #
 # Search movies using TMDb external API (supports pagination)
@@ -61,11 +147,9 @@ def search_movies_API():
     page  = request.args.get('page', 1, type=int)  # ← new: page number (defaults to 1)
 
     if not query:
-        return jsonify([])
+        return json_response([])
 
-    tmdb_search_url = "https://api.themoviedb.org/3/search/movie"
     params = {
-        'api_key': TMDB_api,
         'query': query,
         'language': 'en-US',
         'page': page,           # ← new: pass the page through
@@ -73,9 +157,7 @@ def search_movies_API():
     }
 
     try:
-        response = requests.get(tmdb_search_url, params=params)
-        response.raise_for_status()
-        data    = response.json()
+        data    = get_json('/search/movie', params, prefetch_next=True)
         movies  = data.get('results', [])
 
         today = date.today()
@@ -91,22 +173,9 @@ def search_movies_API():
                     continue  # Skip future release movies
             except ValueError:
                 continue  # Skip movies with malformed release date
-            genre_names = [
-                genre_dict.get(gid, "Unknown")
-                for gid in movie.get('genre_ids', [])
-            ]
-            result.append({
-                'id'               : movie.get('id'),
-                'title'            : movie.get('title'),
-                'genres'           : '-'.join(genre_names) or "Unknown",
-                'original_language': movie.get('original_language'),
-                'overview'         : movie.get('overview'),
-                'popularity'       : movie.get('popularity'),
-                'release_date'     : movie.get('release_date'),
-                'poster_path'      : movie.get('poster_path')
-            })
-
-        return jsonify(result)
+            result.append(tmdb_card(movie))
+
+        return json_response(result)
 
     except requests.RequestException as e:
         return jsonify({'error': str(e)}), 500
@@ -126,33 +195,8 @@ def get_info_by_id_API():
     if not movie_id:
         return jsonify({'error': 'Missing movie id parameter'}), 400
 
-    tmdb_url = f"https://api.themoviedb.org/3/movie/{movie_id}"
-    params = {
-        'api_key': TMDB_api,
-        'language': 'en-US'
-    }
-
     try:
-        response = requests.get(tmdb_url, params=params)
-        response.raise_for_status()
-        movie = response.json()
-
-        # Extract genre names and join them with a dash
-        genre_names = [genre['name'] for genre in movie.get('genres', [])]
-        genres_str = '-'.join(genre_names) if genre_names else "Unknown"
-
-        result = {
-            'id': movie.get('id'),
-            'title': movie.get('title'),
-            'genres': genres_str,
-            'original_language': movie.get('original_language'),
-            'overview': movie.get('overview'),
-            'popularity': movie.get('popularity'),
-            'release_date': movie.get('release_date'),
-            'poster_path': movie.get('poster_path')
-        }
-
-        return jsonify(result)
+        return json_response(get_movie_details(movie_id))
 
     except requests.RequestException as e:
         return jsonify({'error': str(e)}), 500
@@ -162,28 +206,20 @@ def get_info_by_id_API():
 #
 @movie_bp.route('/get_all_movies', methods=['GET'])
 @cross_origin()
+@catalog_cached()
 def get_all_movies():
-    movies = Movie.query.limit(15).all()  # REMOVE limit(10) to get all movies
-    result = []
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
 
-    for movie in movies:
-        result.append({
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        })
-
-    return jsonify(result)
+    result = fetch_cards(card_select(fields).limit(15))  # REMOVE limit(10) to get all movies
+    return json_response(result)
 
 #
 # Get movies from the local database with pagination (12 per page)
 #
 @movie_bp.route('/get_all_movies_V2', methods=['GET'])
+@catalog_cached()
 def get_all_movies_V2():
     try:
         # Get the page number from query parameters, default to 1 if not provided
@@ -194,25 +230,17 @@ def get_all_movies_V2():
         return jsonify({'error': 'Invalid page number. Page must be a positive integer.'}), 400
 
     per_page = 12
-    offset = (page - 1) * per_page
-
-    # Fetch the appropriate page of movies
-    movies = Movie.query.offset(offset).limit(per_page).all()
-    result = []
 
-    for movie in movies:
-        result.append({
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        })
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
 
-    return jsonify(result)
+    # Fetch the appropriate page of movies (?cursor= continues after the previous page instead)
+    try:
+        result, next_cursor = page_cards(fields, cursor=request.args.get('cursor'), page=page, per_page=per_page)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return paged_response(result, next_cursor)
 
 #
 # Get popular movies from TMDb API with pagination (up to 12 results)
@@ -220,37 +248,22 @@ def get_all_movies_V2():
 @movie_bp.route('/get_all_movies_API', methods=['GET'])
 def get_all_movies_API():
     page = request.args.get('page', 1, type=int)
-    tmdb_url = "https://api.themoviedb.org/3/movie/popular"
     params = {
-        'api_key': TMDB_api,
         'language': 'en-US',
         'page': page
     }
 
     try:
-        response = requests.get(tmdb_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = get_json('/movie/popular', params, prefetch_next=True)
         movies = data.get('results', [])
 
         result = []
         for movie in movies:
-            genre_names = [genre_dict.get(gid, "Unknown") for gid in movie.get('genre_ids', [])]
-            genres_str = '-'.join(genre_names) if genre_names else "Unknown"
-            result.append({
-                'id': movie.get('id'),
-                'title': movie.get('title'),
-                'genres': genres_str,
-                'original_language': movie.get('original_language'),
-                'overview': movie.get('overview'),
-                'popularity': movie.get('popularity'),
-                'release_date': movie.get('release_date'),
-                'poster_path': movie.get('poster_path')
-            })
+            result.append(tmdb_card(movie))
             if len(result) == 12:
                 break
 
-        return jsonify(result)
+        return json_response(result)
 
     except requests.RequestException as e:
         return jsonify({'error': str(e)}), 500
@@ -277,33 +290,23 @@ def sort_movies():
     if sort_by not in valid_sort_columns:
         return jsonify({'error': 'Invalid sort field'}), 400
 
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
+
     # Sort movies based on user request
-    query = Movie.query.order_by(
+    query = card_select(fields).order_by(
         valid_sort_columns[sort_by].desc() if order == 'desc' else valid_sort_columns[sort_by].asc()
     )
 
-    movies = query.all()
-    
-    result = [
-        {
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        }
-        for movie in movies
-    ]
-    
-    return jsonify(result)
+    # Unbounded: stream from a server-side cursor instead of building the whole list
+    return streamed_response(stream_cards(query), requested_format())
 
 #
 # Sort local movies with pagination (12 movies per page)
 #
 @movie_bp.route('/sort_movies_V2', methods=['GET'])
+@catalog_cached()
 def sort_movies_V2():
     sort_by = request.args.get('sort_by', 'title')  # Default to sorting by title
     order = request.args.get('order', 'asc').lower()  # Default to ascending order
@@ -324,77 +327,67 @@ def sort_movies_V2():
     except ValueError:
         return jsonify({'error': 'Invalid page number. Must be a positive integer.'}), 400
 
-    per_page = 12
-    offset = (page - 1) * per_page
-
-    query = Movie.query.order_by(
-        valid_sort_columns[sort_by].desc() if order == 'desc' else valid_sort_columns[sort_by].asc()
-    )
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
 
-    movies = query.offset(offset).limit(per_page).all()
-
-    result = [
-        {
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        }
-        for movie in movies
-    ]
+    per_page = 12
 
-    return jsonify(result)
+    # Ordered by (sort_by, id); ?cursor= seeks past the previous page through the matching index.
+    # Numbered pages are a range of the rank table, and otherwise the columnar catalog answers when
+    # they are current; all three paths share cursors
+    order = 'desc' if order == 'desc' else 'asc'
+    cursor = request.args.get('cursor')
+    try:
+        paged = None
+        if not cursor:
+            paged = sort_ranks.page(fields, sort_by=sort_by, order=order, page=page, per_page=per_page)
+        if paged is None:
+            paged = columnar_catalog.page(fields, sort_by=sort_by, order=order, cursor=cursor, page=page,
+                                          per_page=per_page)
+        if paged is None:
+            paged = page_cards(fields, sort_by=sort_by, order=order, cursor=cursor, page=page, per_page=per_page)
+        result, next_cursor = paged
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return paged_response(result, next_cursor)
 
 
 '''-----------------------------------------------filter_movies----------------------------------------'''
 #
-# Filter local movies by genres, language, and release year
+# Filter local movies by genres, language, and release year (or release year range)
 #
 @movie_bp.route('/filter_movies', methods=['GET'])
 @cross_origin()
 def filter_movies():
     genres = request.args.getlist('genres')  # Expect a list of genres
     language = request.args.get('language')
-    release_year = request.args.get('release_year', type=int)
 
-    query = Movie.query
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
+
+    try:
+        year_range = requested_year_range()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    query = card_select(fields)
 
     # Filter by genres (matches at least one selected genre)
     if genres:
-        genre_filters = [Movie.genres.ilike(f"%{genre}%") for genre in genres]
-        query = query.filter(db.or_(*genre_filters))
+        query = query.where(genre_filter(genres))
 
     # Filter by language
     if language:
-        query = query.filter(Movie.original_language == language)
-
-    # Filter by release year
-    if release_year:
-        query = query.filter(extract('year', Movie.release_date) == release_year)
+        query = query.where(Movie.original_language == language)
 
+    # Filter by release year or year range
+    if year_range:
+        query = query.where(release_year_filter(*year_range))
 
-
-    movies = query.all()
-
-    result = [
-        {
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        }
-        for movie in movies
-    ]
-
-    return jsonify(result)
+    # Unbounded: stream from a server-side cursor instead of building the whole list
+    return streamed_response(stream_cards(query), requested_format())
 
 
 #
@@ -413,25 +406,25 @@ def get_info_ids():
 
     movie_ids = data.get('ids')
     if movie_ids == []:
-        return jsonify([]), 200
+        return json_response([]), 200
+
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
 
+    # One query for every id, returned in request order
+    by_id = {movie['id']: movie for movie in fetch_cards(card_select(fields).where(Movie.id.in_(movie_ids)))}
     results = []
     for movie_id in movie_ids:
-        movie = Movie.query.filter_by(id=movie_id).first()
+        try:
+            movie = by_id.get(int(movie_id))
+        except (TypeError, ValueError):
+            movie = None
         if movie is None:
             continue  # Skip IDs that don't match any movie.
-        results.append({
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        })
+        results.append(dict(movie))
 
-    return jsonify(results)
+    return json_response(results)
 
 #
 # Get multiple movie details from TMDb API by their IDs (POST request)
@@ -448,46 +441,27 @@ def get_info_ids_API():
 
     ids = data.get('ids')
     if ids == []:
-        return jsonify([]), 200
+        return json_response([]), 200
     
-    results = []
-    for movie_id in ids:
-        tmdb_url = f"https://api.themoviedb.org/3/movie/{movie_id}"
-        params = {
-            'api_key': TMDB_api,
-            'language': 'en-US'
-        }
-
-        try:
-            response = requests.get(tmdb_url, params=params)
-            response.raise_for_status()
-            movie = response.json()
+    # local_first=yes serves fresh rows from the movies table and only fetches the misses from TMDb
+    local_first = request.args.get('local_first', 'yes' if LOCAL_FIRST_LOOKUP else 'no') == 'yes'
 
-            # Extract genre names and join them with a dash
-            genre_names = [genre['name'] for genre in movie.get('genres', [])]
-            genres_str = '-'.join(genre_names) if genre_names else "Unknown"
+    # Fetch all ids concurrently; ids that fail are skipped rather than failing the batch
+    if local_first:
+        cards, failures = get_movies_local_first(ids)
+    else:
+        cards, failures, _ = hydrate_movies(ids)
+    if failures and not cards:
+        return jsonify({'error': str(next(iter(failures.values())))}), 500
 
-            result = {
-                'id': movie.get('id'),
-                'title': movie.get('title'),
-                'genres': genres_str,
-                'original_language': movie.get('original_language'),
-                'overview': movie.get('overview'),
-                'popularity': movie.get('popularity'),
-                'release_date': movie.get('release_date'),
-                'poster_path': movie.get('poster_path')
-            }
-            results.append(result)
-
-        except requests.RequestException as e:
-            return jsonify({'error': str(e)}), 500
-
-    return jsonify(results)
+    results = [cards[movie_id] for movie_id in ids if movie_id in cards]
+    return json_response(results)
 
 #
-# Filter local or now-playing movies with pagination and genre/language/year filters
+# Filter local or now-playing movies with pagination and genre/language/year (or local year range) filters
 #
 @movie_bp.route('/filter_movies_V2', methods=['GET'])
+@catalog_cached(skip_if=lambda: request.args.get('only_in_theater') == 'yes')  # now playing comes from TMDb
 def filter_movies_V2():
     genres = request.args.getlist('genres')  # Expect a list of genres
     language = request.args.get('language')
@@ -502,7 +476,6 @@ def filter_movies_V2():
         return jsonify({'error': 'Invalid page number. Must be a positive integer.'}), 400
 
     per_page = 12
-    offset = (page - 1) * per_page
 
     # If only_in_theater is True, fetch now-playing movies from TMDb via the helper function
     if only_in_theater:
@@ -510,51 +483,41 @@ def filter_movies_V2():
         now_playing_movies = get_filtered_now_playing(page, genres, language, release_year, per_page=12)
         results = []
         for movie in now_playing_movies:
-            movie_genre_names = [genre_dict.get(gid, "Unknown") for gid in movie.get('genre_ids', [])]
-            genres_str = '-'.join(movie_genre_names) if movie_genre_names else "Unknown"
-            results.append({
-                'id': movie.get('id'),
-                'title': movie.get('title'),
-                'genres': genres_str,
-                'original_language': movie.get('original_language'),
-                'overview': movie.get('overview'),
-                'popularity': movie.get('popularity'),
-                'release_date': movie.get('release_date'),
-                'poster_path': movie.get('poster_path')
-            })
-        return jsonify(results)
-
-    query = Movie.query
+            results.append(tmdb_card(movie))
+        return json_response(results)
+
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Invalid fields'}), 400
+    try:
+        year_range = requested_year_range()
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    filters = []
     # Filter by genres (matches at least one selected genre)
     if genres:
-        genre_filters = [Movie.genres.ilike(f"%{genre}%") for genre in genres]
-        query = query.filter(db.or_(*genre_filters))
+        filters.append(genre_filter(genres))
 
     # Filter by language
     if language:
-        query = query.filter(Movie.original_language == language)
-
-    # Filter by release year
-    if release_year:
-        query = query.filter(extract('year', Movie.release_date) == release_year)
+        filters.append(Movie.original_language == language)
 
-    movies = query.offset(offset).limit(per_page).all()
+    # Filter by release year or year range
+    if year_range:
+        filters.append(release_year_filter(*year_range))
 
-    result = [
-        {
-            'id': movie.id,
-            'title': movie.title,
-            'genres': movie.genres,
-            'original_language': movie.original_language,
-            'overview': movie.overview,
-            'popularity': movie.popularity,
-            'release_date': movie.release_date.isoformat() if movie.release_date else None,
-            'poster_path': movie.poster_path
-        }
-        for movie in movies
-    ]
-
-    return jsonify(result)
+    # The columnar catalog answers when it is current; otherwise SQL applies the same filters
+    cursor = request.args.get('cursor')
+    try:
+        paged = columnar_catalog.page(fields, genres=genres, language=language, year_range=year_range,
+                                      cursor=cursor, page=page, per_page=per_page)
+        if paged is None:
+            paged = page_cards(fields, filters=filters, cursor=cursor, page=page, per_page=per_page)
+        result, next_cursor = paged
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return paged_response(result, next_cursor)
 
 #
 # Filter and sort movies, either from the https://api.themoviedb.org/3/discover/movie or https://api.themoviedb.org/3/movie/now_playing from TMDb
@@ -590,23 +553,12 @@ def filter_and_sort():
         now_playing_movies = get_filtered_now_playing(page, genres, language, release_year, per_page=12)
         results = []
         for movie in now_playing_movies:
-            movie_genre_names = [genre_dict.get(gid, "Unknown") for gid in movie.get('genre_ids', [])]
-            genres_str = '-'.join(movie_genre_names) if movie_genre_names else "Unknown"
-            results.append({
-                'id': movie.get('id'),
-                'title': movie.get('title'),
-                'genres': genres_str,
-                'original_language': movie.get('original_language'),
-                'overview': movie.get('overview'),
-                'popularity': movie.get('popularity'),
-                'release_date': movie.get('release_date'),
-                'poster_path': movie.get('poster_path')
-            })
-        return jsonify(results)
+            results.append(tmdb_card(movie))
+        return json_response(results)
 
     # Otherwise use TMDb Discover API for filtering, sorting, and formatting
     filtered_movies = get_filtered(page, genres, language, release_year, sort_by, order, per_page=12)
-    return jsonify(filtered_movies)
+    return json_response(filtered_movies)
 
 #
 # Advanced filter and sort from TMDb API with support for release year range
@@ -658,9 +610,32 @@ def filter_and_sort_V2():
             year_range=year_range,
             sort_by=sort_by,
             order=order,
-            now_playing=only_in_theater
+            now_playing=only_in_theater,
+            prefetch_next=True
         )
-    except requests.HTTPError as exc:
+    except requests.RequestException as exc:
         return jsonify({"error": "TMDb request failed", "detail": str(exc)}), 502
 
-    return jsonify(payload["results"])
\ No newline at end of file
+    return json_response(payload["results"])
+
+
+#
+# Counters for the shared TMDb client (requests, connections, handshake time saved by reuse)
+# the movie-detail cache (hits, misses, evictions), the now-playing snapshot, the rate-limit scheduler
+# the circuit breaker, the typeahead index, the catalog sync, the columnar catalog, the sort ranks
+# and the catalog response cache
+#
+@movie_bp.route('/tmdb_stats', methods=['GET'])
+def tmdb_stats():
+    stats = get_stats()
+    stats['movie_cache'] = movie_cache.stats()
+    stats['now_playing'] = now_playing_catalog.stats()
+    stats['scheduler'] = scheduler.stats()
+    stats['breaker'] = breaker.stats()
+    stats['disk_cache'] = disk_cache.stats() if disk_cache is not None else None
+    stats['typeahead'] = typeahead_index.stats()
+    stats['catalog_sync'] = catalog_sync.stats()
+    stats['columnar'] = columnar_catalog.stats()
+    stats['sort_ranks'] = sort_ranks.stats()
+    stats['response_cache'] = response_cache.stats()
+    return jsonify(stats)
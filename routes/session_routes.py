@@ -1,6 +1,5 @@
 from collections import defaultdict
 
-import requests
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
 from flask_socketio import leave_room
@@ -10,7 +9,10 @@ from model import Session, SessionParticipant, MoviePocket, Movie
 from sqlalchemy.sql import func
 import random
 import hashlib
-from routes.Config import TMDB_api
+from routes.Utils import hydrate_movies
+from routes.TMDb import mark_stale_response
+from routes.RateLimit import CRITICAL
+from routes.Serializers import json_response
 
 '''
     session_routes.py
@@ -27,6 +29,9 @@ from routes.Config import TMDB_api
 
 session_bp = Blueprint('session', __name__)
 
+# /final_movie hydrates cards from TMDb: flag them when they came from the last known good data
+session_bp.after_request(mark_stale_response)
+
 def generate_unique_session_id():
     while True:
         new_id = str(random.randint(100000, 999999))  # Generate a 6-digit ID
@@ -398,36 +403,14 @@ def final_movie():
         print(str(p.votes))
         vote_map[p.movie_id] += p.votes
 
+    # Session-critical: these requests are served before browse and prefetch traffic
+    cards, failures, _ = hydrate_movies(list(vote_map), priority=CRITICAL)
+    for movie_id, exc in failures.items():
+        print(f"Error fetching movie details: {exc}")
+
     movies_list = []
     for movie_id, votes in vote_map.items():
-        tmdb_url = f"https://api.themoviedb.org/3/movie/{movie_id}"
-        params = {
-            'api_key': TMDB_api,
-            'language': 'en-US'
-        }
-
-        try:
-            response = requests.get(tmdb_url, params=params, timeout=5)
-            response.raise_for_status()
-            movie = response.json()
-
-            genre_names = [g['name'] for g in movie.get('genres', [])]
-            genres_str = '-'.join(genre_names) if genre_names else 'Unknown'
-
-            movie_data = {
-                'id': movie.get('id'),
-                'title': movie.get('title'),
-                'genres': genres_str,
-                'original_language': movie.get('original_language'),
-                'overview': movie.get('overview'),
-                'popularity': movie.get('popularity'),
-                'release_date': movie.get('release_date'),
-                'poster_path': movie.get('poster_path')
-            }
-        except requests.RequestException as exc:
-            movie_data = {'id': movie_id}
-            print(f"Error fetching movie details: {exc}")
-
+        movie_data = cards.get(movie_id, {'id': movie_id})
         movies_list.append({'movie': movie_data, 'votes': votes})
 
     socketio.emit(
@@ -440,7 +423,7 @@ def final_movie():
         room=f'session_{session_id}'
     )
 
-    return jsonify({
+    return json_response({
         'movie_id': winning_movie.movie_id,
         'votes': winning_movie.votes,
         'movies_list': movies_list,
@@ -1,4 +1,6 @@
 import os
+os.environ.setdefault('TMDB_DISK_CACHE', '')  # tests opt in to the shared disk cache explicitly
+import re
 import pytest
 from flask import Flask
 from flask_cors import CORS
@@ -29,6 +31,11 @@ def app_fixture():
     app = create_app()
     with app.app_context():
         db.create_all()
+        # Every test starts a new database, so nothing remembered about the last one may carry over
+        from routes.Catalog import forget_recent_catalog_version
+        from routes.ResponseCache import response_cache
+        forget_recent_catalog_version()
+        response_cache.clear()
         # Patch socketio.emit to be a no-op during tests.
         socketio.emit = lambda *args, **kwargs: None
         yield app
@@ -37,4 +44,91 @@ def app_fixture():
 
 @pytest.fixture
 def client(app_fixture):
-    return app_fixture.test_client()
\ No newline at end of file
+    return app_fixture.test_client()
+
+@pytest.fixture
+def fake_tmdb(monkeypatch):
+    # Point the TMDb client at an in-process fake server with fresh caches and breaker state.
+    import routes.TMDb as tmdb
+    import routes.Utils as utils
+    from fake_tmdb import FakeTMDb
+    from routes.Breaker import CircuitBreaker
+    from routes.Transport import LiveTransport
+
+    fake = FakeTMDb(pages=3)
+    monkeypatch.setattr(tmdb, '_transport', LiveTransport(fake.start(), tmdb.get_session))
+    monkeypatch.setattr(tmdb, 'breaker', CircuitBreaker(5, 10, 30))
+    tmdb.last_good.clear()
+    tmdb.prefetch_cache.clear()
+    utils.movie_cache.clear()
+    yield fake
+    fake.stop()
+
+@pytest.fixture
+def fake_details(monkeypatch):
+    # Answer TMDb /movie/{id} lookups with generated bodies: call it with the ids that should fail.
+    # Returns the list of ids requested, in order
+    import requests
+    import routes.Utils as utils
+
+    def install(fail_ids=()):
+        calls = []
+
+        def fake_get_json(path, params=None, **kwargs):
+            movie_id = int(path.rsplit('/', 1)[1])
+            calls.append(movie_id)
+            if movie_id in fail_ids:
+                raise requests.ConnectionError('TMDb unreachable')
+            return {'id': movie_id, 'title': f'Remote {movie_id}', 'genres': [{'id': 18, 'name': 'Drama'}],
+                    'original_language': 'en', 'popularity': 1.5, 'release_date': '2020-02-02',
+                    'poster_path': f'/{movie_id}.jpg', 'overview': 'From TMDb'}
+
+        monkeypatch.setattr(utils, 'get_json', fake_get_json)
+        utils.movie_cache.clear()
+        return calls
+    return install
+
+class QueryPlans:
+    """
+    Records the SELECT/UPDATE/DELETE statements the app runs and explains them with
+    SQLite's EXPLAIN QUERY PLAN. A step reading a real table start to end
+    ("SCAN movies", "SCAN movies USING INDEX ...") counts as a full scan; index
+    searches and FTS virtual-table lookups do not.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self._tables = set(db.metadata.tables)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if re.match(r'\s*(SELECT|UPDATE|DELETE)\b', statement, re.IGNORECASE):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def plans(self):
+        with self.engine.connect() as connection:
+            return [(statement, [row[-1] for row in connection.exec_driver_sql(
+                        f'EXPLAIN QUERY PLAN {statement}', parameters)])
+                    for statement, parameters in self.statements]
+
+    def full_scans(self):
+        scans = []
+        for statement, steps in self.plans():
+            for step in steps:
+                match = re.match(r'SCAN (\w+)', step)
+                if match and match.group(1) in self._tables:
+                    scans.append((step, ' '.join(statement.split())))
+        return scans
+
+@pytest.fixture
+def query_plans(app_fixture):
+    # `with query_plans:` around the requests to check, then assert on query_plans.full_scans()
+    return QueryPlans(db.engine)
@@ -0,0 +1,386 @@
+import pytest
+import requests
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, func, inspect, select, text
+from extentions import db
+from model import Movie
+
+
+### Tests for local-first lookups in `/movies/get_movie_info_by_ids_API`
+
+def test_local_first_serves_fresh_rows_and_writes_back_misses(client, fake_details):
+    calls = fake_details()
+    db.session.add(Movie(id=1, title='Local 1', genres='Action', updated_at=datetime.utcnow()))
+    db.session.commit()
+
+    response = client.post('/movies/get_movie_info_by_ids_API?local_first=yes', json={'ids': [1, 2]})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [movie['title'] for movie in data] == ['Local 1', 'Remote 2']
+    assert calls == [2]
+
+    stored = db.session.get(Movie, 2)
+    assert stored.title == 'Remote 2'
+    assert stored.release_date == date(2020, 2, 2)
+    assert stored.updated_at is not None
+
+def test_local_first_refreshes_stale_rows(client, fake_details):
+    calls = fake_details()
+    db.session.add(Movie(id=3, title='Old title', updated_at=datetime.utcnow() - timedelta(days=30)))
+    db.session.add(Movie(id=4, title='From CSV'))  # never refreshed
+    db.session.commit()
+
+    response = client.post('/movies/get_movie_info_by_ids_API?local_first=yes', json={'ids': [3, 4]})
+    assert [movie['title'] for movie in response.get_json()] == ['Remote 3', 'Remote 4']
+    assert sorted(calls) == [3, 4]
+    db.session.expire_all()
+    assert db.session.get(Movie, 3).title == 'Remote 3'
+
+def test_local_first_serves_duplicate_and_mixed_type_ids(client, fake_details):
+    calls = fake_details()
+    db.session.add(Movie(id=1, title='Local 1', genres='Action', updated_at=datetime.utcnow()))
+    db.session.commit()
+
+    response = client.post('/movies/get_movie_info_by_ids_API?local_first=yes', json={'ids': [1, '1', 1, 6, '6']})
+    assert response.status_code == 200
+    assert [movie['title'] for movie in response.get_json()] == ['Local 1'] * 3 + ['Remote 6'] * 2
+    assert calls == [6]  # 6 and "6" are both misses; the movie cache fetches them once
+
+def test_local_first_serves_but_does_not_store_stale_tmdb_cards(client, fake_details, monkeypatch):
+    import routes.Utils as utils
+    fake_details()
+    monkeypatch.setattr(utils, 'last_response_stale', lambda: True)  # TMDb down: last known good copies
+    db.session.add(Movie(id=7, title='From CSV'))
+    db.session.commit()
+
+    response = client.post('/movies/get_movie_info_by_ids_API?local_first=yes', json={'ids': [7, 8]})
+    assert [movie['title'] for movie in response.get_json()] == ['Remote 7', 'Remote 8']
+    assert response.headers['X-TMDb-Stale'] == 'true'
+    db.session.expire_all()
+    assert db.session.get(Movie, 7).updated_at is None  # still due for a refresh
+    assert db.session.get(Movie, 8) is None
+
+def test_local_first_falls_back_to_stale_row_on_tmdb_failure(client, fake_details):
+    fake_details(fail_ids={5})
+    db.session.add(Movie(id=5, title='From CSV'))
+    db.session.commit()
+
+    response = client.post('/movies/get_movie_info_by_ids_API?local_first=yes', json={'ids': [5]})
+    assert response.status_code == 200
+    assert response.get_json()[0]['title'] == 'From CSV'
+
+### Tests for migrations.upgrade
+
+def test_upgrade_adds_missing_columns(app_fixture):
+    from migrations import upgrade
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE movies (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL)'))
+
+    added = upgrade(engine)
+    assert 'movies.updated_at' in added
+    assert 'updated_at' in {column['name'] for column in inspect(engine).get_columns('movies')}
+    assert inspect(engine).has_table('session_participant')
+    assert upgrade(engine) == []
+
+def test_upgrade_creates_hot_path_indexes_on_existing_tables(app_fixture):
+    from migrations import upgrade
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE movie_pocket (id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, '
+                                'movie_id INTEGER, votes INTEGER)'))
+
+    added = upgrade(engine)
+    assert 'index ix_movie_pocket_session_id_movie_id' in added
+    names = {index['name'] for index in inspect(engine).get_indexes('movie_pocket')}
+    assert 'ix_movie_pocket_session_id_movie_id' in names
+    assert upgrade(engine) == []
+
+def test_upgrade_step_lost_to_another_process_counts_as_done(app_fixture):
+    from migrations import _apply, _has_index
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE movie_pocket (id INTEGER PRIMARY KEY, session_id TEXT, movie_id INTEGER)'))
+    create = lambda connection: connection.execute(text('CREATE INDEX ix_pocket ON movie_pocket (session_id)'))
+    assert _apply(engine, create, _has_index('movie_pocket', 'ix_pocket')) is True
+    assert _apply(engine, create, _has_index('movie_pocket', 'ix_pocket')) is False  # exists: not an error
+    with pytest.raises(Exception):
+        _apply(engine, lambda connection: connection.execute(text('CREATE INDEX broken ON missing (x)')),
+               _has_index('movie_pocket', 'broken'))
+
+def test_upgrade_builds_search_index_for_existing_rows(app_fixture):
+    from migrations import upgrade
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE movies (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, '
+                                'overview TEXT)'))
+        connection.execute(text("INSERT INTO movies (id, title) VALUES (7, 'Existing Title')"))
+
+    assert 'movies full-text index' in upgrade(engine)
+    with engine.connect() as connection:
+        rowids = connection.execute(text("SELECT rowid FROM movies_fts WHERE movies_fts MATCH 'existing'"))
+        assert [row[0] for row in rowids] == [7]
+    assert 'movies full-text index' not in upgrade(engine)
+
+def test_upgrade_backfills_genre_masks(app_fixture):
+    from migrations import upgrade
+    from routes.Config import genre_bits
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE movies (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, '
+                                'genres VARCHAR(100))'))
+        connection.execute(text("INSERT INTO movies (id, title, genres) VALUES "
+                                "(1, 'A', 'Action-Drama'), (2, 'B', 'Action-Drama'), (3, 'C', NULL), "
+                                "(4, 'D', 'Unknown')"))
+
+    added = upgrade(engine)
+    assert 'movies.genre_mask' in added and 'movies.genre_mask values' in added
+    with engine.connect() as connection:
+        masks = dict(connection.execute(text('SELECT id, genre_mask FROM movies')).all())
+    assert masks == {1: genre_bits['Action'] | genre_bits['Drama'], 2: genre_bits['Action'] | genre_bits['Drama'],
+                     3: 0, 4: 0}
+    assert 'movies.genre_mask values' not in upgrade(engine)
+
+### Query-plan checks for the release-year filter
+
+def _query_plan(stmt):
+    connection = db.session.connection()
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}')]
+
+def test_release_year_filter_uses_release_date_index(app_fixture):
+    from routes.Catalog import card_select, genre_filter, release_year_filter
+    plan = _query_plan(card_select().where(release_year_filter(2001, 2003)))
+    assert plan == ['SEARCH movies USING INDEX ix_movies_release_date_id (release_date>? AND release_date<?)']
+
+    combined = card_select().where(release_year_filter(2001), genre_filter(['Drama']))
+    assert any('USING INDEX ix_movies_release_date_id' in step for step in _query_plan(combined))
+
+    # With a language too, the planner (no ANALYZE statistics) prefers the equality on the language index;
+    # either way the year/language/genre filter is an index search, not a scan
+    with_language = card_select().where(release_year_filter(2001), genre_filter(['Drama']),
+                                        Movie.original_language == 'en')
+    assert _query_plan(with_language) == ['SEARCH movies USING INDEX ix_movies_original_language_id '
+                                          '(original_language=?)']
+
+def test_release_year_filter_bounds_are_inclusive(app_fixture):
+    from routes.Catalog import card_select, fetch_cards, release_year_filter
+    for movie_id, released in enumerate((date(1999, 12, 31), date(2000, 1, 1), date(2001, 12, 31),
+                                         date(2002, 1, 1)), start=1):
+        db.session.add(Movie(id=movie_id, title=f'Movie {movie_id}', release_date=released))
+    db.session.commit()
+    assert [row['id'] for row in fetch_cards(card_select(('id',)).where(release_year_filter(2000, 2001)))] == [2, 3]
+    assert [row['id'] for row in fetch_cards(card_select(('id',)).where(release_year_filter(1999)))] == [1]
+
+### Tests for the bulk importer (import_catalog.py)
+
+CSV_DUMP = (
+    'id,title,genres,original_language,overview,popularity,release_date,poster_path\n'
+    '1,Heat,Crime-Drama,en,"A thief, a cop\nand one last job",30.5,1995-12-15,/heat.jpg\n'
+    '2,Amélie,Comedy-Romance,fr,,12,2001-04-25,\n'
+    'x,Broken id,,,,,,\n'
+    '3,Ronin,Action,en,"He said ""go""",,1998-09-25,/ronin.jpg\n'
+)
+
+def test_import_catalog_loads_csv_and_rebuilds_indexes(app_fixture, tmp_path):
+    from import_catalog import import_catalog
+    from routes.Config import genre_bits
+    from routes.Search import search_cards
+    dump = tmp_path / 'movies.csv'
+    dump.write_text(CSV_DUMP, encoding='utf-8')
+
+    counters = import_catalog(str(dump), batch_size=2, log=lambda message: None)
+    assert counters == {'rows': 3, 'skipped': 1, 'resumed_at': 0}
+    heat = db.session.get(Movie, 1)
+    assert heat.overview == 'A thief, a cop\nand one last job'
+    assert heat.popularity == 30.5 and heat.release_date == date(1995, 12, 15) and heat.updated_at is None
+    assert heat.genre_mask == genre_bits['Crime'] | genre_bits['Drama']
+    assert db.session.get(Movie, 2).poster_path is None
+    assert db.session.get(Movie, 3).overview == 'He said "go"'
+
+    names = {index['name'] for index in inspect(db.engine).get_indexes('movies')}
+    assert {index.name for index in Movie.__table__.indexes} <= names
+    assert [card['id'] for card in search_cards('ronin', ('id',))] == [3]
+
+    # An unchanged file is not loaded twice
+    assert import_catalog(str(dump), log=lambda message: None)['rows'] == 0
+
+def test_import_catalog_resumes_after_a_failed_batch(app_fixture, tmp_path, monkeypatch):
+    import json
+    import import_catalog as importer
+    dump = tmp_path / 'movies.jsonl'
+    lines = [json.dumps({'id': n, 'title': f'Movie {n}', 'genre_ids': [18], 'popularity': n}) for n in range(1, 6)]
+    lines.insert(2, json.dumps({'id': 99, 'original_title': 'Export line', 'popularity': 1.0, 'adult': False}))
+    dump.write_text('\n'.join(lines) + '\n{"id": 7, "tit', encoding='utf-8')
+
+    real_upsert = importer.upsert_rows
+    batches = []
+
+    def failing_upsert(rows):
+        batches.append([row['id'] for row in rows])
+        if len(batches) == 2:
+            raise RuntimeError('connection lost')
+        real_upsert(rows)
+
+    monkeypatch.setattr(importer, 'upsert_rows', failing_upsert)
+    with pytest.raises(RuntimeError):
+        importer.import_catalog(str(dump), batch_size=2, log=lambda message: None)
+    db.session.rollback()
+    assert db.session.query(Movie).count() == 2
+
+    counters = importer.import_catalog(str(dump), batch_size=2, log=lambda message: None)
+    assert batches[2][0] == 99  # resumed right after the committed batch
+    assert counters['rows'] == 4 and counters['skipped'] == 1 and counters['resumed_at'] > 0
+    assert sorted(movie.id for movie in Movie.query.all()) == [1, 2, 3, 4, 5, 99]
+    assert db.session.get(Movie, 99).title == 'Export line'
+    assert db.session.get(Movie, 4).genres == 'Drama'
+
+### Tests for the TMDb change-feed sync (routes/CatalogSync.py), against the fake TMDb server
+
+def test_catalog_sync_refreshes_only_changed_local_movies(app_fixture, fake_tmdb):
+    from routes.Catalog import load_checkpoint, upsert_movies
+    from routes.CatalogSync import CatalogSync
+    from routes.Serializers import tmdb_details_card
+    upsert_movies([tmdb_details_card(fake_tmdb._details(fake_tmdb.by_id[movie_id])) for movie_id in (1, 2, 3)])
+    fake_tmdb.touch(2, day=date.today() - timedelta(days=1), popularity=9999.0, poster_path='/new2.jpg')
+    fake_tmdb.touch(40, popularity=1.0)  # changed on TMDb but not in our catalog
+    fake_tmdb.touch(3, day=date.today() - timedelta(days=30), popularity=5.0)  # before the first window
+    fake_tmdb.paths.clear()
+
+    sync = CatalogSync(concurrency=2, batch_size=10, initial_days=1)
+    assert sync.sync() == 1
+    assert [path for path in fake_tmdb.paths if path != '/movie/changes'] == ['/movie/2']
+    db.session.expire_all()
+    assert db.session.get(Movie, 2).popularity == 9999.0 and db.session.get(Movie, 2).poster_path == '/new2.jpg'
+    assert db.session.get(Movie, 3).popularity != 5.0
+    assert db.session.get(Movie, 40) is None
+    assert load_checkpoint('tmdb_changes') == {'through': date.today().isoformat(), 'retry': []}
+
+    # Nothing new since the checkpoint: the feed is read again, but no movie is fetched
+    fake_tmdb.paths.clear()
+    assert sync.sync() == 0
+    assert fake_tmdb.paths == ['/movie/changes']
+
+def test_catalog_sync_catches_up_in_windows_and_retries_failures(app_fixture, fake_tmdb):
+    from routes.Catalog import load_checkpoint, save_checkpoint, upsert_movies
+    from routes.CatalogSync import CatalogSync
+    from routes.Serializers import tmdb_details_card
+    upsert_movies([tmdb_details_card(fake_tmdb._details(fake_tmdb.by_id[movie_id])) for movie_id in (5, 6)])
+    save_checkpoint('tmdb_changes', {'through': (date.today() - timedelta(days=20)).isoformat()})
+    db.session.commit()
+    fake_tmdb.touch(5, day=date.today() - timedelta(days=10), popularity=55.0)
+    fake_tmdb.touch(6, popularity=66.0)
+
+    fake_tmdb.error_rate = 1.0  # the feed fails: nothing moves
+    with pytest.raises(requests.RequestException):
+        CatalogSync().sync()
+    assert load_checkpoint('tmdb_changes')['through'] == (date.today() - timedelta(days=20)).isoformat()
+
+    fake_tmdb.error_rate = 0.0
+    fake_tmdb.paths.clear()
+    assert CatalogSync().sync() == 2
+    assert fake_tmdb.paths.count('/movie/changes') == 2  # 20 days is two windows
+    db.session.expire_all()
+    assert (db.session.get(Movie, 5).popularity, db.session.get(Movie, 6).popularity) == (55.0, 66.0)
+    assert load_checkpoint('tmdb_changes')['through'] == date.today().isoformat()
+
+
+def test_catalog_sync_retries_movies_that_failed_to_fetch(app_fixture, fake_tmdb, monkeypatch):
+    from routes.Catalog import load_checkpoint, upsert_movies
+    from routes.CatalogSync import CatalogSync
+    from routes.Serializers import tmdb_details_card
+    upsert_movies([tmdb_details_card(fake_tmdb._details(fake_tmdb.by_id[7]))])
+    fake_tmdb.touch(7, day=date.today() - timedelta(days=1), popularity=77.0)
+    handle = fake_tmdb.handle
+    monkeypatch.setattr(fake_tmdb, 'handle', lambda path, query: (
+        (500, {'status_message': 'fake failure'}) if path == '/movie/7' else handle(path, query)))
+
+    assert CatalogSync().sync() == 0
+    assert load_checkpoint('tmdb_changes') == {'through': date.today().isoformat(), 'retry': [7]}
+
+    # The next run re-fetches it although the feed since the checkpoint no longer lists it
+    monkeypatch.setattr(fake_tmdb, 'handle', handle)
+    assert CatalogSync().sync() == 1
+    db.session.expire_all()
+    assert db.session.get(Movie, 7).popularity == 77.0
+    assert load_checkpoint('tmdb_changes')['retry'] == []
+
+### Tests for the sort-rank tables (routes/SortRanks.py)
+
+def _seed_rank_movies():
+    # Ties and NULLs in every sort column, so (column, id) order and NULL placement are exercised
+    for movie_id in range(1, 31):
+        db.session.add(Movie(id=movie_id, title=['Heat', 'Alien', 'alien', 'Zodiac'][movie_id % 4],
+                             genres='Drama', popularity=None if movie_id % 7 == 0 else float(movie_id % 5),
+                             release_date=None if movie_id % 6 == 0 else date(2000 + movie_id % 3, 1, 1)))
+    db.session.commit()
+
+@pytest.mark.parametrize('sort_by', ['popularity', 'release_date', 'title'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_sort_rank_pages_match_the_index_path(app_fixture, sort_by, order):
+    from routes.Catalog import page_cards
+    from routes.Serializers import CARD_FIELDS
+    from routes.SortRanks import SortRanks
+    _seed_rank_movies()
+    ranks = SortRanks()
+    assert ranks.rebuild() == ['popularity', 'release_date', 'title']
+    for page in (1, 2, 3, 4, 9):
+        expected = page_cards(CARD_FIELDS, sort_by=sort_by, order=order, page=page, per_page=8)
+        assert ranks.page(CARD_FIELDS, sort_by=sort_by, order=order, page=page, per_page=8) == expected, page
+
+    # The next_cursor of a rank page continues through the index path
+    cards, cursor = ranks.page(('id',), sort_by=sort_by, order=order, per_page=8)
+    assert page_cards(('id',), sort_by=sort_by, order=order, cursor=cursor, per_page=8) == \
+        page_cards(('id',), sort_by=sort_by, order=order, page=2, per_page=8)
+
+def test_sort_ranks_are_not_read_once_the_catalog_changes(app_fixture):
+    from routes.Catalog import upsert_movies
+    from routes.SortRanks import SortRanks
+    _seed_rank_movies()
+    ranks = SortRanks()
+    assert ranks.page(('id',), sort_by='popularity') is None  # never built
+    ranks.rebuild()
+    assert ranks.rebuild() == []  # nothing changed since
+
+    upsert_movies([{'id': 99, 'title': 'Newest', 'genres': 'Drama', 'popularity': 10 ** 6}])
+    assert ranks.page(('id',), sort_by='popularity', order='desc', per_page=1) is None
+    assert ranks.rebuild() == ['popularity', 'release_date', 'title']
+    assert ranks.page(('id',), sort_by='popularity', order='desc', per_page=1)[0] == [{'id': 99}]
+    assert ranks.stats()['fallbacks'] == 2
+
+def test_sort_ranks_are_renumbered_in_chunks_into_the_unused_slot(app_fixture, monkeypatch):
+    from routes.Catalog import page_cards, upsert_movies
+    from routes.Serializers import CARD_FIELDS
+    from routes.SortRanks import SortRanks, ranks_table
+    monkeypatch.setattr('routes.SortRanks.SORT_RANKS_CHUNK', 4)  # chunks end inside the NULL segment
+    _seed_rank_movies()
+    ranks = SortRanks()
+    ranks.rebuild()
+    upsert_movies([{'id': 99, 'title': 'Newest', 'genres': 'Drama', 'popularity': None}])
+    ranks.rebuild()
+    for page in (1, 2, 5):
+        assert ranks.page(CARD_FIELDS, sort_by='popularity', page=page, per_page=7) == \
+            page_cards(CARD_FIELDS, sort_by='popularity', page=page, per_page=7)
+    slots = dict(db.session.execute(
+        select(ranks_table.c.sort_by, func.count()).group_by(ranks_table.c.sort_by)).all())
+    assert slots['popularity:shadow'] == 31 and slots['popularity'] == 30  # the old numbering, cleared next time
+
+    upsert_movies([{'id': 100, 'title': 'Newer', 'genres': 'Drama', 'popularity': 3.0}])
+    ranks.rebuild()
+    assert db.session.execute(select(func.count()).where(ranks_table.c.sort_by == 'popularity')).scalar() == 32
+    assert ranks.page(('id',), sort_by='popularity', order='desc', page=5, per_page=7) == \
+        page_cards(('id',), sort_by='popularity', order='desc', page=5, per_page=7)
+
+def test_sort_movies_v2_reads_numbered_pages_from_the_rank_table(client, monkeypatch):
+    import routes.movie_routes as movie_routes
+    from routes.SortRanks import SortRanks
+    _seed_rank_movies()
+    ranks = SortRanks()
+    monkeypatch.setattr(movie_routes, 'sort_ranks', ranks)
+    monkeypatch.setattr('routes.ResponseCache.RESPONSE_CACHE', False)  # both requests must run the view
+    index_page = client.get('/movies/sort_movies_V2?sort_by=title&order=desc&page=2')
+    ranks.rebuild()
+    rank_page = client.get('/movies/sort_movies_V2?sort_by=title&order=desc&page=2')
+    assert rank_page.get_json() == index_page.get_json()
+    assert rank_page.headers['X-Next-Cursor'] == index_page.headers['X-Next-Cursor']
+    assert ranks.stats()['hits'] == 1
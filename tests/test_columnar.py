@@ -0,0 +1,138 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from extentions import db
+from model import Movie
+from routes.Catalog import genre_filter, page_cards, release_year_filter, upsert_movies
+from routes.Serializers import CARD_FIELDS
+
+np = pytest.importorskip('numpy')  # the columnar catalog is optional
+
+
+@pytest.fixture
+def columnar(monkeypatch):
+    # A fresh snapshot per test, so movies from other tests do not leak in
+    import routes.Columnar as columnar_module
+    import routes.movie_routes as movie_routes
+    catalog = columnar_module.ColumnarCatalog()
+    monkeypatch.setattr(columnar_module, 'columnar_catalog', catalog)
+    monkeypatch.setattr(movie_routes, 'columnar_catalog', catalog)
+    return catalog
+
+
+def _seed(count=80):
+    # Few distinct popularities and dates, plus NULLs, so ties and NULL placement are exercised
+    rng = random.Random(506)
+    genres = ['Action', 'Drama', 'Comedy', 'Horror', 'Science Fiction']
+    for movie_id in range(1, count + 1):
+        db.session.add(Movie(
+            id=movie_id,
+            title=rng.choice(['Alien', 'alien', 'Brazil', 'Zodiac', 'Amélie']) + f' {rng.randint(1, 5)}',
+            genres='-'.join(rng.sample(genres, 2)),
+            original_language=rng.choice(['en', 'fr', None]),
+            popularity=rng.choice([None, 1.5, 10.0, 42.0, rng.uniform(0, 100)]),
+            release_date=rng.choice([None, date(1999, 12, 31),
+                                     date(2000, 1, 1) + timedelta(days=rng.randint(0, 3000))]),
+        ))
+    db.session.commit()
+
+
+def _sql_filters(genres=(), language=None, year_range=None):
+    filters = []
+    if genres:
+        filters.append(genre_filter(genres))
+    if language:
+        filters.append(Movie.original_language == language)
+    if year_range:
+        filters.append(release_year_filter(*year_range))
+    return filters
+
+
+QUERIES = [
+    {},
+    {'genres': ['Drama']},
+    {'genres': ['drama', 'Horror'], 'language': 'fr'},
+    {'language': 'en', 'year_range': (2000, 2003)},
+    {'year_range': (1999, 1999)},
+    {'genres': ['Unknown genre']},
+    {'language': 'xx'},
+]
+
+
+### Tests for the in-memory columnar catalog (routes/Columnar.py)
+
+@pytest.mark.parametrize('probe_rows', [4096, 8])  # the page found in the first rows, or by filtering all
+@pytest.mark.parametrize('sort_by', ['id', 'popularity', 'release_date', 'title'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_columnar_pages_match_sql(app_fixture, columnar, monkeypatch, sort_by, order, probe_rows):
+    monkeypatch.setattr('routes.Columnar.PROBE_ROWS', probe_rows)
+    _seed()
+    assert columnar.build() == 80
+    for query in QUERIES:
+        for page in (1, 2, 4, 20):
+            expected = page_cards(CARD_FIELDS, filters=_sql_filters(**query), sort_by=sort_by, order=order,
+                                  page=page, per_page=7)
+            assert columnar.page(CARD_FIELDS, sort_by=sort_by, order=order, page=page, per_page=7,
+                                 **query) == expected, (query, page)
+
+
+@pytest.mark.parametrize('probe_rows', [4096, 8])
+@pytest.mark.parametrize('sort_by', ['id', 'popularity', 'release_date'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_columnar_cursors_walk_the_same_listing_as_sql(app_fixture, columnar, monkeypatch, sort_by, order,
+                                                      probe_rows):
+    monkeypatch.setattr('routes.Columnar.PROBE_ROWS', probe_rows)
+    _seed()
+    columnar.build()
+    query = {'genres': ['Drama', 'Comedy']}
+    expected, cursor = [], None
+    while True:
+        cards, cursor = page_cards(('id',), filters=_sql_filters(**query), sort_by=sort_by, order=order,
+                                   cursor=cursor, per_page=5)
+        expected += cards
+        if cursor is None:
+            break
+
+    walked, cursor = [], None
+    while True:
+        cards, cursor = columnar.page(('id',), sort_by=sort_by, order=order, cursor=cursor, per_page=5, **query)
+        walked += cards
+        if cursor is None:
+            break
+    assert walked == expected and len(walked) > 5
+
+
+def test_columnar_falls_back_until_rebuilt_after_a_write(app_fixture, columnar):
+    _seed(10)
+    assert columnar.page(('id',)) is None  # not built yet
+    columnar.build()
+    assert columnar.page(('id',), sort_by='popularity', order='desc', per_page=1) is not None
+
+    upsert_movies([{'id': 11, 'title': 'Newest', 'genres': 'Drama', 'popularity': 10 ** 6}])
+    assert columnar.page(('id',), sort_by='popularity', order='desc', per_page=1) is None
+    columnar.build()
+    assert columnar.page(('id',), sort_by='popularity', order='desc', per_page=1)[0] == [{'id': 11}]
+    assert columnar.stats()['fallbacks'] == 2
+
+
+def test_columnar_pages_reuse_a_recent_catalog_version_read(app_fixture, columnar, query_plans):
+    _seed(10)
+    columnar.build()
+    columnar.page(('id',), sort_by='popularity')
+    with query_plans:
+        assert columnar.page(('id',), sort_by='popularity', page=2, per_page=3) is not None
+        assert columnar.page(('id',), sort_by='title', per_page=3) is not None
+    assert not [statement for statement, _ in query_plans.statements if 'checkpoints' in statement]
+
+
+def test_filter_and_sort_routes_are_served_from_the_columnar_catalog(client, columnar, monkeypatch):
+    monkeypatch.setattr('routes.ResponseCache.RESPONSE_CACHE', False)  # both requests must run the view
+    _seed()
+    sql_filtered = client.get('/movies/filter_movies_V2?genres=Drama&language=en&page=2').get_json()
+    sql_sorted = client.get('/movies/sort_movies_V2?sort_by=release_date&order=desc&page=3').get_json()
+    columnar.build()
+    assert client.get('/movies/filter_movies_V2?genres=Drama&language=en&page=2').get_json() == sql_filtered
+    assert client.get('/movies/sort_movies_V2?sort_by=release_date&order=desc&page=3').get_json() == sql_sorted
+    assert columnar.stats()['hits'] == 2
+    assert client.get('/movies/sort_movies_V2?sort_by=title&cursor=bogus').status_code == 400
@@ -37,6 +37,187 @@ def test_search_movies_no_match(client):
     assert response.status_code == 200
     assert data == []
 
+def test_search_movies_ranks_title_matches_and_popularity(client):
+    for index in range(20):
+        create_movie(db, title=f"Filler {index}", overview="Nothing to see here")
+    create_movie(db, title="Quiet Harbor", overview="A storm hits the harbor town", popularity=900.0)
+    create_movie(db, title="Storm Chasers", overview="Friends on the road", popularity=5.0)
+    create_movie(db, title="Storm Front", overview="A detective story", popularity=400.0)
+    data = client.get('/movies/search?query=storm').get_json()
+    assert [movie['title'] for movie in data] == ['Storm Front', 'Storm Chasers', 'Quiet Harbor']
+
+def test_search_movies_matches_prefix_and_follows_updates(client):
+    movie = create_movie(db, title="Amélie")
+    assert [m['title'] for m in client.get('/movies/search?query=ame').get_json()] == ['Amélie']
+
+    movie.title = "Delicatessen"
+    db.session.commit()
+    assert client.get('/movies/search?query=ame').get_json() == []
+    assert client.get('/movies/search?query=delica').get_json()[0]['id'] == movie.id
+
+    db.session.delete(movie)
+    db.session.commit()
+    assert client.get('/movies/search?query=delica').get_json() == []
+
+def test_search_movies_ignores_fts_syntax(client):
+    create_movie(db, title="Don't Look Up")
+    response = client.get('/movies/search?query=don%27t" *')
+    assert response.status_code == 200
+    assert [movie['title'] for movie in response.get_json()] == ["Don't Look Up"]
+
+def test_search_backend_is_looked_up_once_and_forgotten_when_the_index_goes(client, monkeypatch):
+    import routes.Search as search
+    from sqlalchemy import text
+    inspected = []
+    inspect_backend = search._inspect_backend
+    monkeypatch.setattr(search, '_inspect_backend',
+                        lambda connection: inspected.append(connection) or inspect_backend(connection))
+    create_movie(db, title="Storm Front", overview="A detective story")
+    assert len(client.get('/movies/search?query=storm').get_json()) == 1
+    assert len(client.get('/movies/search?query=front').get_json()) == 1
+    assert len(inspected) == 1
+
+    # import_catalog.py in another process drops the index without telling this one
+    for statement in search._SQLITE_DROP:
+        db.session.execute(text(statement))
+    db.session.commit()
+    assert [m['title'] for m in client.get('/movies/search?query=Storm').get_json()] == ["Storm Front"]
+    assert search.search_backend(db.session.connection()) is None
+
+### Tests for the `/movies/autocomplete` endpoint
+
+@pytest.fixture
+def typeahead(monkeypatch):
+    # A fresh index per test, so movies committed by other tests do not leak in
+    import routes.Typeahead as typeahead_module
+    import routes.movie_routes as movie_routes
+    index = typeahead_module.TypeaheadIndex(bucket_size=4)
+    monkeypatch.setattr(typeahead_module, 'typeahead_index', index)
+    monkeypatch.setattr(movie_routes, 'typeahead_index', index)
+    return index
+
+def test_autocomplete_ranks_prefix_matches_by_popularity(client, typeahead):
+    create_movie(db, title="Star Wars", popularity=80.0)
+    create_movie(db, title="A Star Is Born", popularity=120.0)
+    create_movie(db, title="Stardust", popularity=10.0)
+    create_movie(db, title="Amélie", popularity=50.0)
+    assert typeahead.build() == 4
+
+    data = client.get('/movies/autocomplete?q=Sta').get_json()
+    assert [movie['title'] for movie in data] == ['A Star Is Born', 'Star Wars', 'Stardust']
+    assert set(data[0]) == {'id', 'title', 'popularity'}
+    assert [m['title'] for m in client.get('/movies/autocomplete?q=star bo').get_json()] == ['A Star Is Born']
+    assert [m['title'] for m in client.get('/movies/autocomplete?q=AME').get_json()] == ['Amélie']
+    assert len(client.get('/movies/autocomplete?q=s&limit=2').get_json()) == 2
+    assert client.get('/movies/autocomplete?q=').get_json() == []
+
+def test_autocomplete_keeps_the_most_popular_when_buckets_overflow(client, typeahead):
+    for index in range(10):
+        create_movie(db, title=f"Heat {index}", popularity=float(index))
+    typeahead.build()
+    data = client.get('/movies/autocomplete?q=he&limit=3').get_json()
+    assert [movie['title'] for movie in data] == ['Heat 9', 'Heat 8', 'Heat 7']
+
+def test_autocomplete_follows_commits_but_not_rollbacks(client, typeahead):
+    typeahead.build()
+    movie = create_movie(db, title="Heat", popularity=30.0)
+    assert [m['id'] for m in client.get('/movies/autocomplete?q=hea').get_json()] == [movie.id]
+
+    movie.title = "Ronin"
+    db.session.commit()
+    assert client.get('/movies/autocomplete?q=hea').get_json() == []
+    assert client.get('/movies/autocomplete?q=ron').get_json()[0]['id'] == movie.id
+
+    db.session.add(Movie(title="Rollback Me", popularity=1.0))
+    db.session.flush()
+    db.session.rollback()
+    assert client.get('/movies/autocomplete?q=rollb').get_json() == []
+
+    db.session.delete(movie)
+    db.session.commit()
+    assert client.get('/movies/autocomplete?q=ron').get_json() == []
+
+def test_autocomplete_sees_upserted_movies(client, typeahead):
+    from routes.Catalog import upsert_movies
+    typeahead.build()
+    upsert_movies([{'id': 603, 'title': 'The Matrix', 'genres': 'Action', 'popularity': 90.0,
+                    'release_date': '1999-03-30'}])
+    assert client.get('/movies/autocomplete?q=matr').get_json() == [
+        {'id': 603, 'title': 'The Matrix', 'popularity': 90.0}
+    ]
+
+def test_autocomplete_refills_truncated_buckets_after_updates_and_deletes(app_fixture):
+    from routes.Typeahead import TypeaheadIndex
+    index = TypeaheadIndex(bucket_size=3)
+    for movie_id in range(1, 7):
+        create_movie(db, title=f"Star {movie_id}", popularity=70.0 - 10 * movie_id)
+    index.build()
+    assert [m['id'] for m in index.query('star', 3)] == [1, 2, 3]
+
+    index.add_many([(1, "Star 1", 5.0)])  # less popular than all the others now
+    assert [m['id'] for m in index.query('star', 3)] == [2, 3, 4]
+    index.add_many([(2, None, None)])
+    assert [m['id'] for m in index.query('star', 3)] == [3, 4, 5]
+    assert [m['id'] for m in index.query('st', 10)] == [3, 4, 5, 6, 1]
+
+def test_autocomplete_finds_matches_cut_from_the_bucket(app_fixture):
+    from routes.Typeahead import TypeaheadIndex
+    index = TypeaheadIndex(bucket_size=2, max_prefix=4)
+    create_movie(db, title="Interstellar", popularity=1.0)
+    create_movie(db, title="Intermission", popularity=50.0)
+    create_movie(db, title="Internal Affairs", popularity=40.0)
+    create_movie(db, title="Interview with the Vampire", popularity=30.0)
+    index.build()
+    assert [m['title'] for m in index.query('interstel')] == ["Interstellar"]
+    assert [m['title'] for m in index.query('inter vamp')] == ["Interview with the Vampire"]
+    assert [m['title'] for m in index.query('inte', 3)] == ["Intermission", "Internal Affairs",
+                                                              "Interview with the Vampire"]
+
+def test_autocomplete_checks_only_movies_matching_every_selective_word(app_fixture):
+    from routes.Typeahead import TypeaheadIndex
+    index = TypeaheadIndex(bucket_size=2, max_prefix=4)
+    for n in range(6):
+        create_movie(db, title=f"Night Storm {n}", popularity=100.0 + n)
+    create_movie(db, title="Night River", popularity=1.0)
+    create_movie(db, title="River Storm", popularity=2.0)
+    index.build()
+    assert [m['title'] for m in index.query('night riv')] == ["Night River"]
+    with index._lock:
+        assert {index._movies[movie_id][0] for movie_id in index._matching_ids(['riv', 'night'])} == {"Night River"}
+
+def test_autocomplete_rebuilds_when_another_writer_moves_the_catalog(client, app_fixture, typeahead, monkeypatch):
+    from routes.Catalog import bump_catalog_version
+    monkeypatch.setattr('routes.Typeahead.VERSION_CHECK_AGE', 0)
+    create_movie(db, title="Heat", popularity=30.0)
+    typeahead.start(app_fixture)
+    typeahead._thread.join()
+
+    # A Core insert, as an import or another worker would commit it: this process is not told
+    db.session.execute(Movie.__table__.insert().values(id=999, title="Heathers", popularity=60.0))
+    bump_catalog_version(db.session.connection())
+    db.session.commit()
+    assert [m['title'] for m in client.get('/movies/autocomplete?q=heat').get_json()] == ['Heat']
+    typeahead._thread.join()
+    assert [m['title'] for m in client.get('/movies/autocomplete?q=heat').get_json()] == ['Heathers', 'Heat']
+
+def test_autocomplete_follows_own_commits_without_rebuilding(client, app_fixture, typeahead):
+    from routes.Catalog import upsert_movies
+    typeahead.start(app_fixture)
+    typeahead._thread.join()
+    built_at = typeahead.built_at
+
+    upsert_movies([{'id': 603, 'title': 'The Matrix', 'genres': 'Action', 'popularity': 90.0}])
+    create_movie(db, title="Matrix Reloaded", popularity=50.0)
+    assert [m['title'] for m in client.get('/movies/autocomplete?q=matr').get_json()] == ['The Matrix',
+                                                                                          'Matrix Reloaded']
+    typeahead._thread.join()
+    assert typeahead.built_at == built_at
+
+def test_autocomplete_falls_back_to_database_before_build(client, typeahead):
+    create_movie(db, title="Heat", popularity=30.0)
+    create_movie(db, title="Heathers", popularity=60.0)
+    assert [m['title'] for m in client.get('/movies/autocomplete?q=heat').get_json()] == ['Heathers', 'Heat']
+
 ### Tests for `/movies/get_all_movies`
 
 def test_get_all_movies_empty_db(client):
@@ -98,6 +279,37 @@ def test_filter_movies_no_match(client):
     assert response.status_code == 200
     assert data == []
 
+def test_filter_movies_matches_whole_genre_names(client):
+    create_movie(db, title="Space Drama", genres="Science Fiction-Drama")
+    create_movie(db, title="Space Action", genres="Action-Science Fiction")
+    create_movie(db, title="Musical", genres="Music")
+    response = client.get('/movies/filter_movies?genres=drama&genres=Action')
+    assert sorted(movie['title'] for movie in response.get_json()) == ['Space Action', 'Space Drama']
+    # "Science" is not a genre, and "Music" no longer matches every name containing it
+    assert client.get('/movies/filter_movies?genres=Science').get_json() == []
+    assert [m['title'] for m in client.get('/movies/filter_movies_V2?genres=Music').get_json()] == ['Musical']
+
+def test_genre_mask_follows_genre_changes(client):
+    from routes.Catalog import genre_mask, upsert_movies
+    from routes.Config import genre_bits
+    movie = create_movie(db, genres="Horror")
+    assert movie.genre_mask == genre_bits['Horror']
+    movie.genres = "Comedy-Romance"
+    db.session.commit()
+    assert movie.genre_mask == genre_mask("Comedy-Romance") == genre_bits['Comedy'] | genre_bits['Romance']
+
+    upsert_movies([{'id': movie.id, 'title': 'Renamed', 'genres': 'Western'}])
+    assert db.session.get(Movie, movie.id).genre_mask == genre_bits['Western']
+
+def test_filter_movies_year_range(client):
+    for year in (1998, 2000, 2002, 2004):
+        create_movie(db, title=f"From {year}", release_date=datetime(year, 6, 1))
+    response = client.get('/movies/filter_movies_V2?release_year_min=2000&release_year_max=2003')
+    assert [movie['title'] for movie in response.get_json()] == ['From 2000', 'From 2002']
+    response = client.get('/movies/filter_movies?release_year_min=2004')
+    assert [movie['title'] for movie in response.get_json()] == ['From 2004']
+    assert client.get('/movies/filter_movies?release_year_min=2004&release_year_max=2000').status_code == 400
+
 def test_filter_movies_invalid_release_year(client):
     # Passing a non-integer for release_year might cause an error or return an empty list.
     response = client.get('/movies/filter_movies?release_year=not_a_number')
@@ -135,4 +347,197 @@ def test_get_movie_info_by_ids_some_not_found(client):
     data = response.get_json()
     assert response.status_code == 200
     # Assuming the endpoint returns available records.
-    assert any(movie['id'] == test_id for movie in data)
\ No newline at end of file
+    assert any(movie['id'] == test_id for movie in data)
+
+### Tests for the column-projected list path (`?fields=`)
+
+def test_sort_movies_V2_projects_requested_fields(client):
+    create_movie(db, title="Projected Movie")
+    response = client.get('/movies/sort_movies_V2?fields=title,release_date')
+    assert response.status_code == 200
+    assert response.get_json() == [{'id': 1, 'title': 'Projected Movie', 'release_date': '2021-01-01'}]
+
+def test_list_endpoint_rejects_unknown_field(client):
+    response = client.get('/movies/get_all_movies_V2?fields=title,updated_at')
+    assert response.status_code == 400
+
+def test_get_movie_info_by_ids_keeps_request_order(client):
+    first = create_movie(db, title="First")
+    second = create_movie(db, title="Second")
+    response = client.post('/movies/get_movie_info_by_ids', json={'ids': [second.id, 999, first.id]})
+    assert [movie['title'] for movie in response.get_json()] == ['Second', 'First']
+
+### Tests for keyset (cursor) pagination
+
+def _walk_cursor_pages(client, url):
+    titles, cursor, pages = [], None, 0
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        titles += [movie['title'] for movie in response.get_json()]
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return titles, pages
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_sort_movies_V2_cursor_walk_matches_full_order(client, order):
+    # Ties and NULLs in the sort column must neither repeat nor skip rows, and pages must follow
+    # (popularity, id) with NULLs first, the whole order reversed for desc
+    movies = []
+    for index in range(30):
+        popularity = None if index % 7 == 0 else float(index % 4)
+        movie = create_movie(db, title=f"Movie {index:02d}", popularity=popularity)
+        movies.append((popularity is not None, popularity or 0.0, movie.id, movie.title))
+
+    titles, pages = _walk_cursor_pages(client, f'/movies/sort_movies_V2?sort_by=popularity&order={order}')
+    expected = [title for *_, title in sorted(movies, reverse=order == 'desc')]
+    assert pages == 3
+    assert titles == expected
+
+def test_page_parameter_still_works_and_hands_out_cursor(client):
+    for index in range(13):
+        create_movie(db, title=f"Movie {index:02d}")
+    first = client.get('/movies/get_all_movies_V2?page=1')
+    second = client.get('/movies/get_all_movies_V2?page=2')
+    via_cursor = client.get(f"/movies/get_all_movies_V2?cursor={first.headers['X-Next-Cursor']}")
+    assert second.get_json() == via_cursor.get_json()
+    assert 'X-Next-Cursor' not in second.headers
+
+def test_invalid_or_mismatched_cursor_is_rejected(client):
+    for index in range(13):
+        create_movie(db, title=f"Movie {index:02d}")
+    cursor = client.get('/movies/sort_movies_V2?sort_by=title').headers['X-Next-Cursor']
+    assert client.get(f'/movies/sort_movies_V2?sort_by=popularity&cursor={cursor}').status_code == 400
+    assert client.get('/movies/filter_movies_V2?cursor=not-a-cursor').status_code == 400
+
+### Tests for streamed `/movies/sort_movies` and `/movies/filter_movies`
+
+def test_sort_movies_streams_json_array_across_chunks(client, monkeypatch):
+    import routes.Catalog as catalog
+    monkeypatch.setattr(catalog, 'CATALOG_STREAM_CHUNK', 2)
+    for title in ('C', 'A', 'E', 'B', 'D'):
+        create_movie(db, title=title)
+    response = client.get('/movies/sort_movies?sort_by=title')
+    assert response.is_streamed
+    assert [movie['title'] for movie in response.get_json()] == ['A', 'B', 'C', 'D', 'E']
+
+def test_filter_movies_streams_ndjson(client):
+    import json
+    create_movie(db, title="Drama One", genres="Drama")
+    create_movie(db, title="Comedy One", genres="Comedy")
+    response = client.get('/movies/filter_movies?genres=Drama&format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data().splitlines()
+    assert [json.loads(line)['title'] for line in lines] == ['Drama One']
+
+def test_sort_movies_streams_empty_array(client):
+    response = client.get('/movies/sort_movies')
+    assert response.get_data() == b'[]'
+
+### Tests for the TMDb-backed endpoints (served by the local fake TMDb server)
+
+def test_search_API_fake_tmdb(client, fake_tmdb):
+    response = client.get('/movies/search_API?query=Fake Movie 1&page=1')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data and all('Fake Movie 1' in movie['title'] for movie in data)
+
+def test_get_movie_info_by_id_API_fake_tmdb(client, fake_tmdb):
+    response = client.get('/movies/get_movie_info_by_id_API?id=7')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['id'] == 7
+    assert data['genres'] == '-'.join(g['name'] for g in fake_tmdb._details(fake_tmdb.by_id[7])['genres'])
+
+def test_get_movie_info_by_id_API_unknown_id(client, fake_tmdb):
+    response = client.get('/movies/get_movie_info_by_id_API?id=999999')
+    assert response.status_code == 500
+
+def test_get_all_movies_API_fake_tmdb(client, fake_tmdb):
+    response = client.get('/movies/get_all_movies_API?page=2')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert len(data) == 12
+
+def test_filter_and_sort_fake_tmdb(client, fake_tmdb):
+    response = client.get('/movies/filter_and_sort?genres=Drama&sort_by=popularity&order=desc')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert all('Drama' in movie['genres'] for movie in data)
+    popularity = [movie['popularity'] for movie in data]
+    assert popularity == sorted(popularity, reverse=True)
+
+def test_filter_and_sort_V2_year_range_fake_tmdb(client, fake_tmdb):
+    response = client.get('/movies/filter_and_sort_V2?release_year_min=2000&release_year_max=2010')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert all('2000' <= movie['release_date'][:4] <= '2010' for movie in data)
+
+def test_filter_movies_V2_in_theater_fake_tmdb(client, fake_tmdb):
+    response = client.get('/movies/filter_movies_V2?only_in_theater=yes&language=en&page=1')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert all(movie['original_language'] == 'en' and movie['id'] % 3 == 0 for movie in data)
+
+
+### Tests for the shared movie-card serializer (routes/Serializers.py)
+
+def test_row_cards_encode_release_date_as_iso(client):
+    create_movie(db, title="Dated Movie", release_date=datetime(2019, 5, 17))
+    response = client.get('/movies/sort_movies?sort_by=title')
+    assert response.mimetype == 'application/json'
+    card = response.get_json()[0]
+    assert card['release_date'] == '2019-05-17'
+    assert set(card) == {'id', 'title', 'genres', 'original_language', 'overview',
+                         'popularity', 'release_date', 'poster_path'}
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    import json
+    from datetime import date
+    import routes.Serializers as serializers
+    payload = [{'id': 1, 'title': 'Amélie', 'release_date': date(2001, 4, 25), 'popularity': 1.5, 'poster_path': None}]
+    fast = serializers.dumps(payload)
+    monkeypatch.setattr(serializers, 'orjson', None)
+    assert json.loads(serializers.dumps(payload)) == json.loads(fast)
+    assert json.loads(fast)[0]['release_date'] == '2001-04-25'
+
+### Tests for the catalog-versioned response cache (routes/ResponseCache.py)
+
+def test_local_listing_revalidates_with_304_without_querying(client, query_plans):
+    create_movie(db, title="Cached Movie")
+    first = client.get('/movies/sort_movies_V2?sort_by=title&order=asc')
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    with query_plans:
+        repeated = client.get('/movies/sort_movies_V2?order=asc&sort_by=title')  # parameter order is ignored
+        revalidated = client.get('/movies/sort_movies_V2?sort_by=title&order=asc',
+                                 headers={'If-None-Match': etag})
+    assert repeated.data == first.data and repeated.headers['ETag'] == etag
+    assert revalidated.status_code == 304 and revalidated.data == b''
+    assert query_plans.statements == []
+
+def test_catalog_write_changes_etag_and_body(client):
+    create_movie(db, title="First Movie")
+    first = client.get('/movies/get_all_movies_V2')
+    create_movie(db, title="Second Movie")
+    response = client.get('/movies/get_all_movies_V2', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert {movie['title'] for movie in response.get_json()} == {"First Movie", "Second Movie"}
+
+def test_cached_page_keeps_next_cursor_header(client):
+    for i in range(13):
+        create_movie(db, title=f"Paged {i}", popularity=float(i))
+    first = client.get('/movies/sort_movies_V2?sort_by=popularity')
+    replayed = client.get('/movies/sort_movies_V2?sort_by=popularity')
+    assert first.headers['X-Next-Cursor'] and replayed.headers['X-Next-Cursor'] == first.headers['X-Next-Cursor']
+    assert replayed.data == first.data
+
+def test_errors_and_tmdb_answers_are_not_cached(client, fake_tmdb):
+    from routes.ResponseCache import response_cache
+    assert client.get('/movies/sort_movies_V2?sort_by=title&cursor=bogus').status_code == 400
+    response = client.get('/movies/filter_movies_V2?only_in_theater=yes&genres=Drama')
+    assert response.status_code == 200 and 'ETag' not in response.headers
+    assert len(response_cache) == 0
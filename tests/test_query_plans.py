@@ -0,0 +1,103 @@
+import pytest
+from datetime import datetime
+from extentions import db
+from model import Movie
+
+# Hot-path requests whose SQL must be answered from indexes. Each entry is
+# (method, url, json body); '{session_id}' and '{participant_id}' are filled from a fresh session.
+HOT_MOVIE_REQUESTS = [
+    ('get', '/movies/filter_movies_V2?language=fr', None),
+    ('get', '/movies/filter_movies_V2?release_year=2001', None),
+    ('get', '/movies/filter_movies_V2?release_year_min=1999&release_year_max=2003&genres=Drama', None),
+    ('get', '/movies/filter_movies?language=fr', None),
+    ('get', '/movies/filter_movies?release_year=2001&language=en', None),
+    ('post', '/movies/get_movie_info_by_ids', {'ids': [2, 1]}),
+    ('get', '/movies/search?query=hea', None),
+]
+
+HOT_SESSION_REQUESTS = [
+    ('post', '/session/join', {'session_id': '{session_id}', 'name': 'Guest'}),
+    ('get', '/session/list_join_participants?session_id={session_id}', None),
+    ('post', '/session/add_movie', {'session_id': '{session_id}', 'movie_ids': [1, 2],
+                                    'participant_ID': '{participant_id}'}),
+    ('post', '/session/movies_in_pocket', {'session_id': '{session_id}', 'participant_id': '{participant_id}'}),
+    ('post', '/session/vote', {'session_id': '{session_id}', 'movie_id': 1, 'participant_id': '{participant_id}'}),
+    ('post', '/session/finish_selection', {'session_id': '{session_id}', 'participant_id': '{participant_id}'}),
+]
+
+def _fill(value, ids):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, ids) for item in value]
+    return value
+
+def _seed_movies():
+    for movie_id, (title, language, year) in enumerate((('Heat', 'en', 1995), ('Amélie', 'fr', 2001),
+                                                        ('Heathers', 'en', 1988)), start=1):
+        db.session.add(Movie(id=movie_id, title=title, genres='Drama', original_language=language,
+                             popularity=float(movie_id), release_date=datetime(year, 1, 1)))
+    db.session.commit()
+
+@pytest.mark.parametrize('method, url, body', HOT_MOVIE_REQUESTS)
+def test_hot_movie_queries_use_indexes(client, query_plans, method, url, body):
+    _seed_movies()
+    with query_plans:
+        response = getattr(client, method)(url, json=body)
+        response.get_data()  # drain streamed responses so their queries run
+    assert response.status_code == 200
+    assert query_plans.statements
+    assert query_plans.full_scans() == []
+
+@pytest.mark.parametrize('method, url, body', HOT_SESSION_REQUESTS)
+def test_hot_session_queries_use_indexes(client, query_plans, method, url, body):
+    _seed_movies()
+    started = client.post('/session/start', json={'host_name': 'Host'}).get_json()
+    ids = {'session_id': started['session_id'], 'participant_id': started['participant_id']}
+    client.post('/session/add_movie', json={'session_id': ids['session_id'], 'movie_ids': [1],
+                                            'participant_ID': ids['participant_id']})
+    with query_plans:
+        response = getattr(client, method)(_fill(url, ids), json=_fill(body, ids))
+    assert response.status_code == 200
+    assert query_plans.statements
+    assert query_plans.full_scans() == []
+
+def test_harness_reports_unindexed_filters(client, query_plans):
+    # A genre-only filter has no index to use; the harness must notice
+    _seed_movies()
+    with query_plans:
+        client.get('/movies/filter_movies?genres=Drama').get_data()
+    assert [step for step, _ in query_plans.full_scans()] == ['SCAN movies']
+
+def test_sorted_pages_read_a_range_of_the_rank_table(client, query_plans):
+    # With current ranks, a deep page of a sorted listing needs neither a scan nor a sort
+    from routes.SortRanks import sort_ranks
+    _seed_movies()
+    sort_ranks.rebuild()
+    with query_plans:
+        response = client.get('/movies/sort_movies_V2?sort_by=title&order=desc&page=40')
+    assert response.status_code == 200
+    assert any('movie_sort_ranks' in statement for statement, _ in query_plans.statements)
+    assert query_plans.full_scans() == []
+    assert not [step for _, steps in query_plans.plans() for step in steps if 'TEMP B-TREE' in step]
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('sort_by', ['popularity', 'release_date', 'title'])
+def test_sorted_listings_read_the_sort_index_in_order(client, query_plans, sort_by, order):
+    # Without current sort ranks, a numbered page walks the (column, id) index in order until its LIMIT
+    # and a cursor page seeks into it: neither sorts, and no other full read of a table happens
+    from routes.Catalog import encode_cursor
+    _seed_movies()
+    first = client.get(f'/movies/sort_movies_V2?sort_by={sort_by}&order={order}').get_json()
+    cursor = encode_cursor(sort_by, order, first[0][sort_by], first[0]['id'])
+    with query_plans:
+        assert client.get(f'/movies/sort_movies_V2?sort_by={sort_by}&order={order}&page=2').status_code == 200
+        assert client.get(f'/movies/sort_movies_V2?sort_by={sort_by}&order={order}&cursor={cursor}').get_json() \
+            == first[1:]
+    index = f'ix_movies_{sort_by}_id'
+    steps = [step for _, plan in query_plans.plans() for step in plan]
+    assert {step for step, _ in query_plans.full_scans()} == {f'SCAN movies USING INDEX {index}'}
+    assert any(step.startswith(f'SEARCH movies USING INDEX {index}') for step in steps)
+    assert not [step for step in steps if 'TEMP B-TREE' in step]
@@ -0,0 +1,461 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import routes.TMDb as tmdb
+from routes.Transport import CassetteMiss, LiveTransport, RecordingTransport, ReplayTransport
+from routes.RateLimit import RequestScheduler, TMDbThrottled, CRITICAL, INTERACTIVE, BACKGROUND
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    throttled_once = False
+    failed_once = False
+
+    def do_GET(self):
+        if self.path.startswith('/movie/429') and not _Handler.throttled_once:
+            _Handler.throttled_once = True
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            body = b'{}'
+        elif self.path.startswith('/movie/503') and not _Handler.failed_once:
+            _Handler.failed_once = True
+            self.send_response(503)
+            body = b'{}'
+        elif self.path.startswith('/movie/404'):
+            self.send_response(404)
+            body = b'{}'
+        else:
+            self.send_response(200)
+            body = json.dumps({'path': self.path}).encode()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_tmdb(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    monkeypatch.setattr(tmdb, 'TMDB_RETRIES', 0)
+    monkeypatch.setattr(tmdb, '_session', None)
+    monkeypatch.setattr(tmdb, '_transport', LiveTransport(f'http://127.0.0.1:{server.server_port}', tmdb.get_session))
+    tmdb.reset_stats()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+### Tests for the shared TMDb client
+
+def test_get_json_adds_api_key(local_tmdb):
+    data = tmdb.get_json('/movie/550', {'language': 'en-US'})
+    assert data['path'].startswith('/movie/550?')
+    assert 'api_key=' in data['path']
+
+def test_connections_are_reused(local_tmdb):
+    for _ in range(5):
+        tmdb.get_json('/movie/popular', {'page': 1})
+    stats = tmdb.get_stats()
+    assert stats['requests'] == 5
+    assert stats['connections_opened'] == 1
+    assert stats['connections_reused'] == 4
+
+def test_http_errors_raise_request_exception(local_tmdb):
+    with pytest.raises(requests.RequestException):
+        tmdb.get_json('/movie/404')
+
+def test_tmdb_stats_endpoint(client):
+    response = client.get('/movies/tmdb_stats')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert 'saved_handshake_ms_per_request' in data
+
+
+### Tests for the movie-detail cache
+
+def test_ttl_cache_lru_eviction():
+    from routes.Cache import TTLCache
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, 'a')
+    cache.set(2, 'b')
+    cache.get(1)          # 1 becomes most recently used
+    cache.set(3, 'c')     # evicts 2
+    assert cache.get(2) is None
+    assert cache.get(1) == 'a'
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 2 and stats['misses'] == 1
+
+def test_ttl_cache_expiry():
+    from routes.Cache import TTLCache
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('k', 'v', ttl=0)
+    assert cache.get('k') is None
+    assert cache.stats()['expirations'] == 1
+
+def test_get_movie_details_is_cached(fake_details):
+    import routes.Utils as utils
+    calls = fake_details()
+    first = utils.get_movie_details('550')
+    second = utils.get_movie_details(550)
+    assert first == second
+    assert first['genres'] == 'Drama'
+    assert calls == [550]
+    assert utils.movie_cache.stats()['hits'] == 1
+
+
+### Tests for batch hydration
+
+def test_hydrate_movies_tolerates_partial_failures(fake_details):
+    import routes.Utils as utils
+    fake_details(fail_ids={2})
+    cards, failures, stale = utils.hydrate_movies([1, 2, 3, 1], max_workers=4)
+    assert sorted(cards) == [1, 3]
+    assert list(failures) == [2]
+    assert stale == set()
+
+def test_hydrate_batches_share_one_pool_and_bound_their_own_concurrency(fake_details, monkeypatch):
+    import threading
+    import time
+    import routes.Utils as utils
+    fake_details()
+    fetch = utils.get_json
+    in_flight, peak, threads = [0], [0], set()
+    lock = threading.Lock()
+
+    def slow_get_json(path, params=None, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            threads.add(threading.get_ident())
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return fetch(path, params, **kwargs)
+
+    monkeypatch.setattr(utils, 'get_json', slow_get_json)
+    utils.hydrate_movies(range(1, 9), max_workers=2)
+    utils.movie_cache.clear()
+    utils.hydrate_movies(range(1, 9), max_workers=2)
+    assert peak[0] == 2
+    assert threads <= {thread.ident for thread in utils._hydrate_executor()._threads}
+
+def test_get_movie_info_by_ids_API_partial_failure(client, fake_details):
+    fake_details(fail_ids={2})
+    response = client.post('/movies/get_movie_info_by_ids_API', json={'ids': [3, 2, 1]})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [movie['id'] for movie in data] == [3, 1]
+
+def test_get_movie_info_by_ids_API_all_failed(client, fake_details):
+    fake_details(fail_ids={7})
+    response = client.post('/movies/get_movie_info_by_ids_API', json={'ids': [7]})
+    assert response.status_code == 500
+
+
+### Tests for the now-playing snapshot
+
+NOW_PLAYING_PAGES = {
+    1: [{'id': 1, 'title': 'A', 'genre_ids': [28], 'original_language': 'en', 'release_date': '2025-01-01'},
+        {'id': 2, 'title': 'B', 'genre_ids': [18], 'original_language': 'fr', 'release_date': '2024-05-05'}],
+    2: [{'id': 3, 'title': 'C', 'genre_ids': [28, 18], 'original_language': 'en', 'release_date': '2024-03-03'},
+        {'id': 1, 'title': 'A', 'genre_ids': [28], 'original_language': 'en', 'release_date': '2025-01-01'}],
+}
+
+@pytest.fixture
+def now_playing(monkeypatch):
+    import routes.NowPlaying as now_playing_module
+    calls = []
+
+    def fake_get_json(path, params=None, **kwargs):
+        calls.append(params['page'])
+        assert kwargs['priority'] == BACKGROUND
+        return {'page': params['page'], 'total_pages': 2, 'results': NOW_PLAYING_PAGES[params['page']]}
+
+    monkeypatch.setattr(now_playing_module, 'get_json', fake_get_json)
+    catalog = now_playing_module.now_playing_catalog
+    monkeypatch.setattr(catalog, '_snapshot', ([], {}, {}, {}))
+    monkeypatch.setattr(catalog, 'refreshed_at', None)
+    catalog.refresh()
+    calls.clear()
+    return catalog, calls
+
+def test_now_playing_snapshot_filters(now_playing):
+    catalog, _ = now_playing
+    assert [m['id'] for m in catalog.query(1, [], None, None)] == [1, 2, 3]
+    assert [m['id'] for m in catalog.query(1, ['action'], 'en', None)] == [1, 3]
+    assert [m['id'] for m in catalog.query(1, ['Drama'], None, 2024)] == [2, 3]
+    assert [m['id'] for m in catalog.query(2, [], None, None, per_page=2)] == [3]
+
+def test_filter_movies_V2_in_theater_uses_snapshot(client, now_playing):
+    _, calls = now_playing
+    response = client.get('/movies/filter_movies_V2?only_in_theater=yes&genres=Drama&language=fr')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [m['id'] for m in data] == [2]
+    assert data[0]['genres'] == 'Drama'
+    assert calls == []
+
+
+### Tests for single-flight coalescing
+
+def test_identical_concurrent_requests_are_coalesced(monkeypatch):
+    release = threading.Event()
+    upstream_calls = []
+
+    def slow_fetch(path, params, timeout, priority):
+        upstream_calls.append(path)
+        release.wait(5)
+        return b'{"results": [1, 2]}'
+
+    monkeypatch.setattr(tmdb, '_fetch', slow_fetch)
+    tmdb.reset_stats()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tmdb.get_json('/movie/popular', {'page': 1})))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for _ in range(500):
+        if tmdb.get_stats()['coalesced'] == 4:
+            break
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert upstream_calls == ['/movie/popular']
+    assert tmdb.get_stats()['coalesced'] == 4
+    assert results == [{'results': [1, 2]}] * 5
+    results[0]['results'].append(3)   # each caller owns its copy
+    assert results[1] == {'results': [1, 2]}
+
+def test_request_key_ignores_param_order_and_api_key():
+    assert tmdb.request_key('/x', {'a': 1, 'b': 2}) == tmdb.request_key('/x', {'b': 2, 'a': 1, 'api_key': 'k'})
+
+
+### Tests for next-page prefetch
+
+def test_prefetch_parks_next_page(monkeypatch):
+    fetched = []
+
+    def fake_fetch(path, params, timeout, priority):
+        fetched.append(params['page'])
+        return json.dumps({'page': params['page']}).encode()
+
+    monkeypatch.setattr(tmdb, '_fetch', fake_fetch)
+    monkeypatch.setattr(tmdb, 'TMDB_PREFETCH', True)
+    tmdb.prefetch_cache.clear()
+    tmdb.reset_stats()
+
+    assert tmdb.get_json('/movie/popular', {'page': 1}, prefetch_next=True) == {'page': 1}
+    next_key = tmdb.request_key('/movie/popular', {'page': 2})
+    for _ in range(500):
+        if next_key in tmdb.prefetch_cache:
+            break
+        threading.Event().wait(0.01)
+
+    assert tmdb.get_json('/movie/popular', {'page': 2}) == {'page': 2}
+    assert fetched == [1, 2]
+    assert next_key not in tmdb.prefetch_cache  # handed out once
+    assert tmdb.get_json('/movie/popular', {'page': 2}) == {'page': 2}
+    stats = tmdb.get_stats()
+    assert stats['prefetch_issued'] == 1
+    assert stats['prefetch_hits'] == 1
+    assert stats['prefetch_hit_rate'] == 1.0
+
+def test_prefetch_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(tmdb, '_fetch', lambda path, params, timeout, priority: b'{}')
+    tmdb.reset_stats()
+    tmdb.get_json('/movie/popular', {'page': 1}, prefetch_next=True)
+    assert tmdb.get_stats()['prefetch_issued'] == 0
+
+
+### Tests for the rate-limit scheduler
+
+def test_scheduler_background_lane_gives_up_when_bucket_is_empty():
+    scheduler = RequestScheduler(rate=20, burst=1, max_waits=(1, 1, 0))
+    scheduler.acquire(INTERACTIVE)
+    with pytest.raises(TMDbThrottled):
+        scheduler.acquire(BACKGROUND)
+    scheduler.acquire(CRITICAL)  # waits ~50ms for the next token
+    stats = scheduler.stats()
+    assert stats['granted'] == {'critical': 1, 'interactive': 1, 'background': 0}
+    assert stats['rejected']['background'] == 1
+
+def test_scheduler_penalize_blocks_all_lanes():
+    scheduler = RequestScheduler(rate=100, burst=10, max_waits=(0.05, 0.05, 0.05))
+    scheduler.penalize(5)
+    with pytest.raises(TMDbThrottled):
+        scheduler.acquire(CRITICAL)
+    assert scheduler.stats()['retry_after_events'] == 1
+
+def test_429_is_retried_after_retry_after(local_tmdb):
+    _Handler.throttled_once = False
+    assert 'path' in tmdb.get_json('/movie/429', priority=CRITICAL)
+    assert tmdb.scheduler.stats()['retry_after_events'] >= 1
+
+def test_5xx_retries_take_a_scheduler_token(local_tmdb, monkeypatch):
+    _Handler.failed_once = False
+    monkeypatch.setattr(tmdb, 'TMDB_RETRIES', 1)
+    monkeypatch.setattr(tmdb, 'RETRY_BACKOFF', 0)
+    monkeypatch.setattr(tmdb, '_session', None)
+    monkeypatch.setattr(tmdb, 'scheduler', RequestScheduler(rate=100, burst=10, max_waits=(1, 1, 1)))
+    assert 'path' in tmdb.get_json('/movie/503', cached=False)
+    assert tmdb.scheduler.stats()['granted']['interactive'] == 2
+    assert tmdb.get_stats()['requests'] == 2
+
+
+### Tests for the circuit breaker and stale fallback
+
+def test_circuit_breaker_opens_and_recovers():
+    from routes.Breaker import CircuitBreaker, OPEN, CLOSED
+    closed_events = []
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=1, open_seconds=0,
+                             on_close=lambda: closed_events.append(True))
+    breaker.record_failure()
+    breaker.record_success(5.0)      # too slow: counts as a failure
+    assert breaker.state == OPEN
+    assert breaker.allow()           # open_seconds elapsed: one half-open probe
+    assert not breaker.allow()       # second caller is short-circuited
+    breaker.record_success(0.01)
+    assert breaker.state == CLOSED
+    assert closed_events == [True]
+
+@pytest.fixture
+def flaky_tmdb(monkeypatch):
+    from routes.Breaker import CircuitBreaker
+    state = {'up': True, 'calls': 0}
+
+    def fake_fetch(path, params, timeout, priority):
+        state['calls'] += 1
+        if not state['up']:
+            raise requests.ConnectionError('TMDb is down')
+        return json.dumps({'results': [{'id': 1, 'title': 'Cached', 'genre_ids': []}]}).encode()
+
+    monkeypatch.setattr(tmdb, '_fetch', fake_fetch)
+    monkeypatch.setattr(tmdb, 'breaker', CircuitBreaker(2, 10, 60))
+    tmdb.last_good.clear()
+    return state
+
+def test_stale_response_served_while_tmdb_is_down(flaky_tmdb):
+    assert tmdb.get_json('/movie/popular', {'page': 1})['results'][0]['title'] == 'Cached'
+    assert not tmdb.last_response_stale()
+
+    flaky_tmdb['up'] = False
+    for _ in range(2):
+        assert tmdb.get_json('/movie/popular', {'page': 1})['results'][0]['title'] == 'Cached'
+        assert tmdb.last_response_stale()
+    assert tmdb.breaker.state == 'open'
+
+    calls = flaky_tmdb['calls']
+    tmdb.get_json('/movie/popular', {'page': 1})   # open circuit: no upstream call at all
+    assert flaky_tmdb['calls'] == calls
+    with pytest.raises(requests.RequestException):
+        tmdb.get_json('/movie/popular', {'page': 2})  # nothing to fall back to
+
+def test_stale_endpoint_response_is_marked(client, flaky_tmdb):
+    client.get('/movies/get_all_movies_API?page=1')
+    flaky_tmdb['up'] = False
+    response = client.get('/movies/get_all_movies_API?page=1')
+    assert response.status_code == 200
+    assert response.headers['X-TMDb-Stale'] == 'true'
+    assert response.get_json()[0]['title'] == 'Cached'
+
+def test_stale_cards_hydrated_on_pool_threads_mark_the_response(client, flaky_tmdb):
+    import routes.Utils as utils
+    client.post('/movies/get_movie_info_by_ids_API?local_first=no', json={'ids': [1, 2]})
+    fresh = client.post('/movies/get_movie_info_by_ids_API?local_first=no', json={'ids': [1, 2]})
+    assert 'X-TMDb-Stale' not in fresh.headers
+
+    flaky_tmdb['up'] = False
+    utils.movie_cache.clear()
+    response = client.post('/movies/get_movie_info_by_ids_API?local_first=no', json={'ids': [1, 2]})
+    assert response.status_code == 200 and len(response.get_json()) == 2
+    assert response.headers['X-TMDb-Stale'] == 'true'
+
+### Tests for the pluggable transports (routes/Transport.py)
+
+def test_record_then_replay_without_network(fake_tmdb, tmp_path, monkeypatch):
+    from routes.Breaker import CLOSED
+    cassette = tmp_path / 'tmdb.jsonl'
+    live_url = tmdb.get_transport().base_url
+    monkeypatch.setattr(tmdb, '_transport', RecordingTransport(live_url, tmdb.get_session, str(cassette)))
+    recorded = tmdb.get_json('/movie/popular', {'page': 2})
+    assert 'api_key' not in cassette.read_text()
+
+    fake_tmdb.stop()
+    tmdb.last_good.clear()
+    monkeypatch.setattr(tmdb, '_transport', ReplayTransport(str(cassette)))
+    assert tmdb.get_json('/movie/popular', {'page': 2}) == recorded
+    for page in range(3, 10):  # never recorded: more misses than the breaker's failure threshold
+        with pytest.raises(CassetteMiss) as miss:
+            tmdb.get_json('/movie/popular', {'page': page})
+        assert miss.value.response.status_code == 404
+    assert tmdb.breaker.state == CLOSED
+    assert tmdb.get_json('/movie/popular', {'page': 2}) == recorded
+
+### Tests for the shared on-disk response cache (routes/DiskCache.py)
+
+@pytest.fixture
+def disk_cached_tmdb(fake_tmdb, tmp_path, monkeypatch):
+    from routes.DiskCache import DiskCache
+    path = str(tmp_path / 'tmdb_cache.sqlite3')
+    monkeypatch.setattr(tmdb, 'disk_cache', DiskCache(path))
+    return fake_tmdb, path
+
+def test_disk_cache_is_shared_and_survives_restart(disk_cached_tmdb):
+    from routes.DiskCache import DiskCache
+    fake, path = disk_cached_tmdb
+    first = tmdb.get_json('/movie/5')
+    assert fake.requests == 1
+
+    # A second worker (or a fresh deploy) opening the same file starts warm
+    tmdb.disk_cache = DiskCache(path)
+    assert tmdb.get_json('/movie/5') == first
+    assert fake.requests == 1
+    assert tmdb.disk_cache.stats()['hits'] == 1
+
+def test_disk_cache_sets_up_the_file_once_per_process(tmp_path, monkeypatch):
+    import threading
+    import routes.DiskCache as disk
+    cache = disk.DiskCache(str(tmp_path / 'tmdb_cache.sqlite3'))
+    cache.set('key', b'body', 60)
+    monkeypatch.setattr(disk, '_SCHEMA', 'not sql')  # would fail if another thread's connection re-ran it
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(cache.get('key')))
+    thread.start()
+    thread.join()
+    assert seen == [(b'body', True)]
+    assert cache.errors == 0
+
+def test_disk_cache_only_one_worker_refreshes_an_expired_entry(disk_cached_tmdb, monkeypatch):
+    from routes.DiskCache import DiskCache
+    fake, path = disk_cached_tmdb
+    monkeypatch.setitem(tmdb.TMDB_DISK_TTLS, '/movie/popular', -1)  # stored already expired
+    tmdb.get_json('/movie/popular', {'page': 1})
+    assert fake.requests == 1
+
+    other_worker = DiskCache(path)
+    assert other_worker.claim(tmdb.json.dumps(tmdb.request_key('/movie/popular', {'page': 1})))
+    tmdb.get_json('/movie/popular', {'page': 1})  # lease held elsewhere: serve the expired copy
+    assert fake.requests == 1
+    assert not tmdb.last_response_stale()
+
+def test_disk_cache_serves_expired_copy_when_tmdb_is_down(disk_cached_tmdb, monkeypatch):
+    fake, _ = disk_cached_tmdb
+    monkeypatch.setitem(tmdb.TMDB_DISK_TTLS, '/search/movie', -1)
+    tmdb.get_json('/search/movie', {'query': 'fake', 'page': 1})
+    fake.error_rate = 1.0
+    tmdb.last_good.clear()
+    assert tmdb.get_json('/search/movie', {'query': 'fake', 'page': 1})['results']
+    assert tmdb.last_response_stale()